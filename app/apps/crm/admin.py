@@ -1,15 +1,35 @@
+import io
 import logging
-from django.contrib import admin
+import uuid
+from django.contrib import admin, messages
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.contrib.admin.views.main import PAGE_VAR
+from django.core.cache import cache
+from django.core.exceptions import PermissionDenied
+from django.http import Http404, HttpResponse
+from django.shortcuts import redirect
+from django.template.response import TemplateResponse
+from django.urls import path, reverse
 from django.utils.translation import gettext_lazy as _
-from django.db.models import Sum, Count
+from django.db.models import BooleanField, Case, Count, Sum, Value, When
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
 from unfold.admin import ModelAdmin
 from unfold.decorators import display
-from .models import Customer
+from core.pagination import CURSOR_VAR, EstimatedCountMixin, KeysetPaginationMixin
+from core.search import SearchIndexMixin
+from . import exports
+from .forms import CustomerImportForm
+from .importers import CustomerImporter, read_rows
+from .models import CLOSED_STAGES, Customer, customer_search
 
 logger = logging.getLogger('apps.crm')
 
+# 匯入結果頁直接列出的錯誤筆數，其餘請下載完整報告
+IMPORT_ERRORS_SHOWN = 200
+
 @admin.register(Customer)
-class CustomerAdmin(ModelAdmin):
+class CustomerAdmin(SearchIndexMixin, KeysetPaginationMixin, EstimatedCountMixin, ModelAdmin):
     # 💡 核心修正：強制覆蓋模板路徑，避開失效的 list_before_canvas 屬性
     change_list_template = "admin/crm/customer/change_list.html"
     
@@ -21,51 +41,165 @@ class CustomerAdmin(ModelAdmin):
         'is_hot_lead_status'
     )
     list_display_links = ('display_customer_info',)
-    list_per_page = 20
+    list_per_page = 20             # 搭配 keyset 分頁：依 (-created_at, -estimated_value, -id) 索引定位下一頁
     list_filter_sheet = True
     list_fullwidth = True    
     list_select_related = ('assigned_to',)
     list_filter = ('stage', 'assigned_to', 'created_at')
     search_fields = ('company', 'name', 'email')
+    search_index = customer_search  # 以全文檢索索引取代三個 ILIKE '%term%'，並依相關度排序
+    actions = ['export_selected_csv']
 
-    def changelist_view(self, request, extra_context=None):
-        extra_context = extra_context or {}
-        
+    def get_urls(self):
+        # 串流匯出：/admin/crm/customer/export/?format=csv&<目前列表的篩選參數>
+        urls = [
+            path('export/', self.admin_site.admin_view(self.export_view), name='crm_customer_export'),
+            path('import/', self.admin_site.admin_view(self.import_view), name='crm_customer_import'),
+            path('import/errors/<str:token>/', self.admin_site.admin_view(self.import_errors_view),
+                 name='crm_customer_import_errors'),
+        ]
+        return urls + super().get_urls()
+
+    def export_view(self, request):
+        if not self.has_view_or_change_permission(request):
+            raise PermissionDenied
+        # format 不是列表篩選條件，先移除再交給 ChangeList 解析其餘參數
+        request.GET = request.GET.copy()
+        fmt = request.GET.pop('format', ['csv'])[-1]
+        if fmt not in exports.available_formats():
+            messages.error(request, f"❌ 不支援的匯出格式：{fmt}")
+            return self._changelist_redirect(request)
         try:
-            # 1. 獲取當前過濾後的 QuerySet（這讓統計圖表能隨搜尋結果連動）
-            cl = self.get_changelist_instance(request)
-            queryset = cl.get_queryset(request)
-            
-            stats = queryset.aggregate(
-                total_val=Sum('estimated_value'),
-                count=Count('id')
-            )
+            queryset = exports.changelist_queryset(self, request)
+        except IncorrectLookupParameters:
+            messages.error(request, "❌ 篩選參數無效，無法匯出")
+            return self._changelist_redirect(request)
+        return exports.export_response(queryset, fmt)
 
-            # 2. 封裝數據
-            dashboard_data = {
-                'custom_dashboard_cards': [
-                    {"title": _("當前篩選客戶"), "value": f"{stats['count'] or 0}", "icon": "groups"},
-                    {"title": _("預估篩選總量"), "value": f"${(stats['total_val'] or 0):,.0f}", "icon": "payments"},
-                    {"title": _("活躍商機"), "value": f"{queryset.exclude(stage__in=['WON', 'LOST']).count()}", "icon": "trending_up"},
-                ],
-                'chart_labels': ["8月", "9月", "10月", "11月", "12月", "1月"],
-                'chart_data': [15, 28, 22, 45, 38, stats['count'] or 0],
-            }
+    def import_view(self, request):
+        if not (self.has_add_permission(request) and self.has_change_permission(request)):
+            raise PermissionDenied
+        form = CustomerImportForm(request.POST or None, request.FILES or None)
+        context = {
+            **self.admin_site.each_context(request),
+            'opts': self.opts,
+            'title': "匯入客戶資料",
+            'form': form,
+        }
+        if request.method == 'POST' and form.is_valid():
+            upload = form.cleaned_data['file']
+            try:
+                result = CustomerImporter().run(read_rows(upload, upload.name))
+            except ValueError as exc:
+                messages.error(request, f"❌ {exc}")
+            else:
+                messages.success(request, f"✅ 匯入完成：{result}")
+                context['result'] = result
+                context['shown_errors'] = result.errors[:IMPORT_ERRORS_SHOWN]
+                if result.errors:
+                    # 完整錯誤報告暫存於快取，供下載
+                    token = uuid.uuid4().hex
+                    report = io.StringIO()
+                    result.write_error_report(report)
+                    cache.set(f'crm:import-errors:{token}', report.getvalue(), timeout=3600)
+                    context['error_report_url'] = reverse('admin:crm_customer_import_errors', args=[token])
+        return TemplateResponse(request, 'admin/crm/customer/import.html', context)
+
+    def import_errors_view(self, request, token):
+        if not self.has_add_permission(request):
+            raise PermissionDenied
+        report = cache.get(f'crm:import-errors:{token}')
+        if report is None:
+            raise Http404("錯誤報告已過期")
+        response = HttpResponse('\ufeff' + report, content_type='text/csv; charset=utf-8')
+        response['Content-Disposition'] = 'attachment; filename="customer-import-errors.csv"'
+        return response
 
-            extra_context.update(dashboard_data)
+    def _changelist_redirect(self, request):
+        url = reverse('admin:crm_customer_changelist')
+        return redirect(f"{url}?{request.GET.urlencode()}" if request.GET else url)
 
-        except Exception as e:
-            logger.error(f"CRM Dashboard Data Error: {str(e)}", exc_info=True)
+    @admin.action(description=_("匯出選取的客戶 (CSV)"), permissions=['view'])
+    def export_selected_csv(self, request, queryset):
+        return exports.export_response(queryset, 'csv')
 
-        # 3. 呼叫父類並執行
+    def changelist_view(self, request, extra_context=None):
+        # 1. 交由父類建立唯一一次的 ChangeList (過濾、計數、分頁只執行一次)
         response = super().changelist_view(request, extra_context=extra_context)
 
-        # 4. 暴力補丁：確保 TemplateResponse 的上下文包含我們的數據
-        if hasattr(response, 'context_data'):
-            response.context_data.update(extra_context)
+        # 2. TemplateResponse 尚未渲染，直接沿用其 ChangeList 的過濾後 QuerySet 注入統計數據
+        #    (重導、權限錯誤等非列表回應不含 cl，原樣回傳)
+        context = getattr(response, 'context_data', None)
+        if context and 'cl' in context:
+            context['export_links'] = self.get_export_links(context['cl'])
+            if self.has_add_permission(request) and self.has_change_permission(request):
+                context['import_url'] = reverse('admin:crm_customer_import')
+            try:
+                context.update(self.get_dashboard_context(context['cl'].queryset))
+            except Exception as e:
+                logger.error(f"CRM Dashboard Data Error: {str(e)}", exc_info=True)
 
         return response
 
+    def get_export_links(self, cl):
+        """匯出連結沿用目前列表的篩選、搜尋與排序參數 (不含分頁)"""
+        query = cl.get_query_string(remove=[CURSOR_VAR, PAGE_VAR])[1:]
+        url = reverse('admin:crm_customer_export')
+        return [
+            {'format': fmt, 'url': f"{url}?format={fmt}{'&' + query if query else ''}"}
+            for fmt in exports.available_formats()
+        ]
+
+    def get_dashboard_context(self, queryset, months=6):
+        """
+        以「單一分組查詢」同時算出統計卡片與近 N 個月的新增客戶趨勢 (隨目前篩選條件連動)
+        分組鍵為 (建立月份, 是否活躍)，結果列數只與月份數相關。
+        """
+        rows = (
+            queryset.order_by()
+            .annotate(
+                month=TruncMonth('created_at'),
+                is_active=Case(
+                    When(stage__in=CLOSED_STAGES, then=Value(False)),
+                    default=Value(True),
+                    output_field=BooleanField(),
+                ),
+            )
+            .values('month', 'is_active')
+            .annotate(count=Count('id'), total=Sum('estimated_value'))
+        )
+
+        # 近 N 個月的月份序列 (含本月)，以 (年, 月) 對齊查詢結果
+        today = timezone.localdate()
+        month_keys = []
+        year, month = today.year, today.month
+        for _i in range(months):
+            month_keys.insert(0, (year, month))
+            year, month = (year, month - 1) if month > 1 else (year - 1, 12)
+        series = dict.fromkeys(month_keys, 0)
+
+        count = active = 0
+        total_val = 0
+        for row in rows:
+            count += row['count']
+            total_val += row['total'] or 0
+            if row['is_active']:
+                active += row['count']
+            if row['month'] is not None:
+                key = (row['month'].year, row['month'].month)
+                if key in series:
+                    series[key] += row['count']
+
+        return {
+            'custom_dashboard_cards': [
+                {"title": _("當前篩選客戶"), "value": f"{count}", "icon": "groups"},
+                {"title": _("預估篩選總量"), "value": f"${total_val:,.0f}", "icon": "payments"},
+                {"title": _("活躍商機"), "value": f"{active}", "icon": "trending_up"},
+            ],
+            'chart_labels': [f"{month}月" for _year, month in month_keys],
+            'chart_data': list(series.values()),
+        }
+
     @display(description=_("客戶資訊"), header=True)
     def display_customer_info(self, instance):
         return instance.company, instance.name
@@ -3,4 +3,8 @@ from django.apps import AppConfig
 class CrmConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.crm'     # 必須加上 apps. 前綴
-    verbose_name = '客戶關係部'
\ No newline at end of file
+    verbose_name = '客戶關係部'
+
+    def ready(self):
+        # 註冊管線統計相關的 signal receivers
+        from . import receivers  # noqa: F401
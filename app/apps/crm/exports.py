@@ -0,0 +1,178 @@
+"""
+客戶資料串流匯出 (CSV / NDJSON / XLSX)
+
+import_export 會先把整個 QuerySet 載入 tablib Dataset 再輸出，大表會撐爆 1G 的 web 容器。
+這裡改為：
+1. values_list() 直接取需要的欄位，負責業務以 JOIN (assigned_to__username) 取得，沒有 N+1
+2. iterator(chunk_size=...) 逐批讀取 (PostgreSQL 使用 server-side cursor)
+3. 每批轉成文字後立即交給 StreamingHttpResponse 送出，記憶體用量與總筆數無關
+4. CSV / XLSX 以 = + - @ 等字元開頭的文字前置單引號，避免試算表把客戶填寫的內容當成公式執行
+"""
+import csv
+import io
+import json
+import tempfile
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+
+from .models import Customer
+
+# 💡 openpyxl 為選用套件：未安裝時不提供 XLSX 格式
+try:
+    from openpyxl import Workbook
+except ImportError:
+    Workbook = None
+
+CHUNK_SIZE = 2000
+
+# (欄位標題, values_list 查詢路徑)
+EXPORT_COLUMNS = (
+    ('ID', 'id'),
+    ('所屬企業', 'company'),
+    ('客戶姓名', 'name'),
+    ('聯繫郵箱', 'email'),
+    ('聯絡電話', 'phone'),
+    ('開發階段', 'stage'),
+    ('預估價值', 'estimated_value'),
+    ('負責業務', 'assigned_to__username'),
+    ('系統建立時間', 'created_at'),
+)
+
+# 試算表會把以這些字元開頭的儲存格當成公式 (CSV / formula injection)
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+FORMATS = {
+    'csv': ('text/csv; charset=utf-8', 'csv'),
+    'ndjson': ('application/x-ndjson; charset=utf-8', 'ndjson'),
+    'xlsx': ('application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', 'xlsx'),
+}
+
+
+def available_formats():
+    return [fmt for fmt in FORMATS if fmt != 'xlsx' or Workbook is not None]
+
+
+def changelist_queryset(model_admin, request):
+    """
+    依請求參數取得與列表頁相同的篩選 / 搜尋 / 排序 QuerySet (參數解析同 get_changelist_instance)，
+    但略過列表頁的分頁與計數查詢。
+    """
+    base = model_admin.get_changelist(request)
+    changelist = type(f'Export{base.__name__}', (base,), {'get_results': lambda self, request: None})
+    list_display = model_admin.get_list_display(request)
+    list_display_links = model_admin.get_list_display_links(request, list_display)
+    if model_admin.get_actions(request):
+        list_display = ['action_checkbox', *list_display]
+    cl = changelist(
+        request,
+        model_admin.model,
+        list_display,
+        list_display_links,
+        model_admin.get_list_filter(request),
+        model_admin.date_hierarchy,
+        model_admin.get_search_fields(request),
+        model_admin.get_list_select_related(request),
+        model_admin.list_per_page,
+        model_admin.list_max_show_all,
+        model_admin.list_editable,
+        model_admin,
+        model_admin.get_sortable_by(request),
+        model_admin.search_help_text,
+    )
+    return cl.queryset
+
+
+def iter_rows(queryset, chunk_size=CHUNK_SIZE):
+    """逐列產生 dict (開發階段轉為顯示名稱、時間轉為當地時間)"""
+    stages = dict(Customer.Stage.choices)
+    lookups = [lookup for _header, lookup in EXPORT_COLUMNS]
+    for values in queryset.values_list(*lookups).iterator(chunk_size=chunk_size):
+        row = dict(zip(lookups, values))
+        row['stage'] = str(stages.get(row['stage'], row['stage']))
+        if row['created_at'] is not None:
+            row['created_at'] = timezone.localtime(row['created_at']).replace(tzinfo=None)
+        yield row
+
+
+def escape_formula(value):
+    """以公式字元開頭的文字前置 ' 使試算表視為純文字；數字、日期等非字串值原樣輸出"""
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return f"'{value}"
+    return value
+
+
+def unescape_formula(value):
+    """escape_formula 的反向：匯出檔再匯入時移除前置的 '"""
+    if isinstance(value, str) and value.startswith("'") and value[1:].startswith(FORMULA_PREFIXES):
+        return value[1:]
+    return value
+
+
+def _drain(buffer):
+    """取出緩衝區內容並清空，每批 (chunk_size 列) 合併成一次 write，減少逐列送出的開銷"""
+    value = buffer.getvalue().encode()
+    buffer.seek(0)
+    buffer.truncate()
+    return value
+
+
+def stream_csv(queryset, chunk_size=CHUNK_SIZE):
+    buffer = io.StringIO()
+    buffer.write('\ufeff')  # UTF-8 BOM：讓 Excel 直接開啟時正確辨識中文
+    writer = csv.writer(buffer)
+    writer.writerow([header for header, _lookup in EXPORT_COLUMNS])
+    for count, row in enumerate(iter_rows(queryset, chunk_size), 1):
+        writer.writerow([escape_formula(value) for value in row.values()])
+        if count % chunk_size == 0:
+            yield _drain(buffer)
+    yield _drain(buffer)
+
+
+def stream_ndjson(queryset, chunk_size=CHUNK_SIZE):
+    buffer = io.StringIO()
+    for count, row in enumerate(iter_rows(queryset, chunk_size), 1):
+        buffer.write(json.dumps(row, cls=DjangoJSONEncoder, ensure_ascii=False))
+        buffer.write('\n')
+        if count % chunk_size == 0:
+            yield _drain(buffer)
+    yield _drain(buffer)
+
+
+def stream_xlsx(queryset, chunk_size=CHUNK_SIZE, block_size=64 * 1024):
+    """
+    openpyxl write-only 模式：每列寫入磁碟暫存檔而非留在記憶體；
+    XLSX 是 zip 格式必須寫完才能封裝，完成後再分段讀出暫存檔送出。
+    """
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet('客戶資料')
+    sheet.append([header for header, _lookup in EXPORT_COLUMNS])
+    for row in iter_rows(queryset, chunk_size):
+        sheet.append([escape_formula(value) for value in row.values()])
+
+    with tempfile.TemporaryFile() as output:
+        workbook.save(output)
+        output.seek(0)
+        while block := output.read(block_size):
+            yield block
+
+
+STREAMS = {
+    'csv': stream_csv,
+    'ndjson': stream_ndjson,
+    'xlsx': stream_xlsx,
+}
+
+
+def export_response(queryset, fmt='csv'):
+    """回傳串流下載回應；fmt 不支援時拋出 ValueError"""
+    if fmt not in available_formats():
+        raise ValueError(f'Unsupported export format: {fmt}')
+    content_type, extension = FORMATS[fmt]
+    filename = f"customers-{timezone.localtime():%Y%m%d-%H%M}.{extension}"
+    response = StreamingHttpResponse(STREAMS[fmt](queryset), content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    # 避免 nginx 緩衝整個回應後才送出
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -0,0 +1,13 @@
+from django import forms
+from django.core.validators import FileExtensionValidator
+from unfold.widgets import UnfoldAdminFileFieldWidget
+
+
+class CustomerImportForm(forms.Form):
+    """客戶資料匯入：CSV 或 XLSX，標題可使用匯出檔的中文標題或欄位名稱"""
+    file = forms.FileField(
+        label="匯入檔案",
+        help_text="必要欄位：所屬企業、客戶姓名；以 (所屬企業, 客戶姓名) 比對既有客戶，存在則更新，否則新增",
+        validators=[FileExtensionValidator(['csv', 'xlsx'])],
+        widget=UnfoldAdminFileFieldWidget,
+    )
@@ -0,0 +1,408 @@
+"""
+客戶資料批量匯入 (CSV / XLSX)
+
+流程：
+1. 逐列讀取檔案 (標題可用匯出檔的中文標題或欄位名稱)，每 batch_size 列驗證一批；
+   負責業務以「帳號 / 員工編號 → 使用者 ID」對照表解析，整個匯入只查詢一次使用者表
+2. 驗證失敗的列記錄在錯誤報告 (列號 + 原因) 後略過，不影響其他資料
+3. 以自然鍵 (所屬企業, 客戶姓名) upsert：
+   - PostgreSQL：COPY 進暫存表，鎖定已存在的客戶後以 INSERT ... ON CONFLICT DO UPDATE 一次合併
+   - 其他資料庫：每批查出已存在的客戶，分別 bulk_update / bulk_create
+   兩條路徑都會同步維護管線統計 (PipelineRollup) 與搜尋文件 (search_document)
+"""
+import csv
+import io
+import tempfile
+from decimal import Decimal, InvalidOperation
+
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import connections, router, transaction
+
+from core.search import build_document
+from .exports import EXPORT_COLUMNS, unescape_formula
+from .models import Customer, PipelineDelta, PipelineRollup
+
+# 💡 openpyxl 為選用套件：未安裝時僅支援 CSV
+try:
+    from openpyxl import load_workbook
+except ImportError:
+    load_workbook = None
+
+BATCH_SIZE = 5000
+
+# PostgreSQL 合併時，與其他交易同時建立同一自然鍵而需要重新鎖定的最多輪數
+MERGE_ATTEMPTS = 5
+
+# 自然鍵：同一企業的同名聯絡人視為同一位客戶
+NATURAL_KEY = ('company', 'name')
+
+# 可寫入的欄位 (assigned_to 於驗證時解析為 assigned_to_id)
+IMPORT_FIELDS = ('company', 'name', 'email', 'phone', 'stage', 'estimated_value', 'assigned_to')
+
+# 檔案標題 → 欄位：接受匯出檔的中文標題與欄位名稱，匯出的檔案可直接再匯入
+HEADER_ALIASES = {
+    **{header: lookup.split('__')[0] for header, lookup in EXPORT_COLUMNS},
+    **{field: field for field in IMPORT_FIELDS},
+    'assigned_to__username': 'assigned_to',
+    'employee_id': 'assigned_to',
+}
+
+MAX_VALUE = Decimal('1e10')  # estimated_value: max_digits=12, decimal_places=2
+
+
+class ImportResult:
+    """匯入結果與逐列錯誤報告"""
+
+    def __init__(self):
+        self.created = 0
+        self.updated = 0
+        self.errors = []  # [(列號, 原因)]
+
+    @property
+    def skipped(self):
+        return len(self.errors)
+
+    def add_error(self, line, message):
+        self.errors.append((line, message))
+
+    def write_error_report(self, fileobj):
+        writer = csv.writer(fileobj)
+        writer.writerow(['列號', '錯誤原因'])
+        writer.writerows(self.errors)
+
+    def __str__(self):
+        return f"新增 {self.created} 筆、更新 {self.updated} 筆、略過 {self.skipped} 筆"
+
+
+# --- 檔案讀取 ---
+
+def _normalize_headers(headers):
+    columns = [HEADER_ALIASES.get(str(header or '').strip()) for header in headers]
+    missing = [field for field in NATURAL_KEY if field not in columns]
+    if missing:
+        raise ValueError(f"缺少必要欄位：{', '.join(missing)}")
+    return columns
+
+
+def _iter_csv(fileobj):
+    text = io.TextIOWrapper(fileobj, encoding='utf-8-sig', newline='')
+    reader = csv.reader(text)
+    try:
+        columns = _normalize_headers(next(reader))
+    except StopIteration:
+        return
+    for line, values in enumerate(reader, start=2):
+        if any(values):
+            yield line, {field: value for field, value in zip(columns, values) if field}
+    text.detach()
+
+
+def _iter_xlsx(fileobj):
+    if load_workbook is None:
+        raise ValueError("未安裝 openpyxl，無法讀取 XLSX 檔案")
+    workbook = load_workbook(fileobj, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        try:
+            columns = _normalize_headers(next(rows))
+        except StopIteration:
+            return
+        for line, values in enumerate(rows, start=2):
+            if any(value not in (None, '') for value in values):
+                yield line, {field: value for field, value in zip(columns, values) if field}
+    finally:
+        workbook.close()
+
+
+def read_rows(fileobj, filename):
+    """依副檔名逐列讀取，產生 (列號, {欄位: 原始值})；標題缺少自然鍵欄位時拋出 ValueError"""
+    if str(filename).lower().endswith('.xlsx'):
+        return _iter_xlsx(fileobj)
+    return _iter_csv(fileobj)
+
+
+# --- 驗證 ---
+
+def _text(value):
+    return '' if value is None else unescape_formula(str(value)).strip()
+
+
+class RowValidator:
+    """逐列驗證並轉換為可寫入的欄位值；錯誤以 ValidationError 拋出"""
+
+    def __init__(self, assignees):
+        self.assignees = assignees
+        self.stages = {code: code for code, _label in Customer.Stage.choices}
+        self.stages.update({str(label): code for code, label in Customer.Stage.choices})
+        self.max_lengths = {
+            field.name: field.max_length
+            for field in Customer._meta.concrete_fields
+            if field.max_length
+        }
+
+    @classmethod
+    def for_database(cls, using):
+        """負責業務對照表：帳號與員工編號都可對應到使用者 ID (只查詢一次)"""
+        assignees = {}
+        for pk, username, employee_id in get_user_model().objects.using(using).values_list(
+            'pk', 'username', 'employee_id'
+        ):
+            assignees[username] = pk
+            if employee_id:
+                assignees.setdefault(employee_id, pk)
+        return cls(assignees)
+
+    def clean(self, raw):
+        data, errors = {}, []
+        for field in ('company', 'name', 'phone'):
+            if field in raw:
+                data[field] = _text(raw[field])
+        for field in NATURAL_KEY:
+            if not data.get(field):
+                errors.append(f"{Customer._meta.get_field(field).verbose_name}不可空白")
+        for field, value in data.items():
+            if len(value) > self.max_lengths[field]:
+                errors.append(f"{Customer._meta.get_field(field).verbose_name}超過 {self.max_lengths[field]} 字")
+
+        if 'email' in raw:
+            email = _text(raw['email']) or None
+            if email:
+                try:
+                    validate_email(email)
+                except ValidationError:
+                    errors.append(f"郵箱格式錯誤：{email}")
+            data['email'] = email
+
+        if 'stage' in raw:
+            stage = _text(raw['stage'])
+            if stage:
+                data['stage'] = self.stages.get(stage) or self.stages.get(stage.upper())
+                if data['stage'] is None:
+                    errors.append(f"未知的開發階段：{stage}")
+
+        if 'estimated_value' in raw:
+            value = _text(raw['estimated_value']).replace(',', '').removeprefix('NT$').removeprefix('$')
+            try:
+                data['estimated_value'] = Decimal(value or '0').quantize(Decimal('0.01'))
+                if not 0 <= data['estimated_value'] < MAX_VALUE:
+                    errors.append(f"預估價值超出範圍：{value}")
+            except InvalidOperation:
+                errors.append(f"預估價值不是數字：{value}")
+
+        if 'assigned_to' in raw:
+            assignee = _text(raw['assigned_to'])
+            data['assigned_to_id'] = self.assignees.get(assignee) if assignee else None
+            if assignee and data['assigned_to_id'] is None:
+                errors.append(f"找不到負責業務：{assignee}")
+
+        if errors:
+            raise ValidationError(errors)
+        return data
+
+
+# --- 寫入 ---
+
+class CustomerImporter:
+    """
+    用法：
+        result = CustomerImporter().run(read_rows(fileobj, filename))
+    """
+    STAGING_COLUMNS = (
+        'line', 'company', 'name', 'email', 'phone', 'stage', 'estimated_value', 'assigned_to_id', 'search_document',
+    )
+
+    def __init__(self, batch_size=BATCH_SIZE, using=None):
+        self.batch_size = batch_size
+        self.using = using or router.db_for_write(Customer)
+        self.connection = connections[self.using]
+
+    def run(self, rows):
+        result = ImportResult()
+        validator = RowValidator.for_database(self.using)
+        if self.connection.vendor == 'postgresql':
+            self._copy_merge(self._validated(rows, validator, result), result)
+        else:
+            self._chunked_upsert(self._validated(rows, validator, result), result)
+        return result
+
+    def _validated(self, rows, validator, result):
+        """逐批驗證，產生 (列號, 欄位值)；失敗的列寫入錯誤報告"""
+        batch = []
+        for line, raw in rows:
+            batch.append((line, raw))
+            if len(batch) >= self.batch_size:
+                yield from self._validate_batch(batch, validator, result)
+                batch = []
+        yield from self._validate_batch(batch, validator, result)
+
+    @staticmethod
+    def _validate_batch(batch, validator, result):
+        for line, raw in batch:
+            try:
+                data = validator.clean(raw)
+            except ValidationError as exc:
+                result.add_error(line, '；'.join(exc.messages))
+                continue
+            yield line, data
+
+    # PostgreSQL：COPY + 集合運算合併
+
+    def _copy_merge(self, rows, result):
+        table = Customer._meta.db_table
+        staging = f'{table}_import'
+        columns = set()
+
+        # 先把驗證後的資料寫入磁碟暫存檔 (記憶體用量與列數無關)，再一次 COPY
+        with tempfile.TemporaryFile('w+', encoding='utf-8', newline='') as buffer:
+            writer = csv.writer(buffer)
+            for line, data in rows:
+                columns.update(data)
+                writer.writerow([
+                    line, data['company'], data['name'], data.get('email'), data.get('phone'),
+                    data.get('stage'), data.get('estimated_value'), data.get('assigned_to_id'),
+                    build_document(data['company'], data['name'], data.get('email')),
+                ])
+            buffer.seek(0)
+
+            with transaction.atomic(using=self.using), self.connection.cursor() as cursor:
+                cursor.execute(
+                    f'CREATE TEMP TABLE {staging} (line integer, company varchar(100), name varchar(100), '
+                    f'email varchar(254), phone varchar(20), stage varchar(20), estimated_value numeric(12, 2), '
+                    f'assigned_to_id bigint, search_document text, '
+                    f'customer_id bigint, created boolean NOT NULL DEFAULT false, merged boolean NOT NULL DEFAULT false) '
+                    f'ON COMMIT DROP'
+                )
+                self._copy(cursor, f"COPY {staging} ({', '.join(self.STAGING_COLUMNS)}) FROM STDIN WITH (FORMAT csv)", buffer)
+                self._merge(cursor, table, staging, columns, result)
+
+    @staticmethod
+    def _copy(cursor, sql, fileobj):
+        raw = cursor.cursor
+        if hasattr(raw, 'copy_expert'):  # psycopg2
+            raw.copy_expert(sql, fileobj)
+        else:  # psycopg 3
+            with raw.copy(sql) as copy:
+                while data := fileobj.read(1024 * 1024):
+                    copy.write(data)
+
+    def _merge(self, cursor, table, staging, columns, result):
+        # 1. 同一檔案內自然鍵重複時，以最後一列為準
+        cursor.execute(
+            f'DELETE FROM {staging} s USING {staging} t '
+            f'WHERE s.company = t.company AND s.name = t.name AND s.line < t.line'
+        )
+        cursor.execute(f'CREATE INDEX ON {staging} (company, name)')
+        cursor.execute(f'CREATE INDEX ON {staging} (customer_id)')
+        cursor.execute(f'ANALYZE {staging}')
+
+        # 已存在的客戶：只覆寫檔案中有提供的欄位
+        assignments = ['updated_at = now()']
+        updates = {
+            'email': 'EXCLUDED.email',
+            'phone': 'EXCLUDED.phone',
+            # 空白的開發階段不覆寫 (EXCLUDED.stage 已補上新增時的預設值，因此回頭讀暫存表的原值)
+            'stage': f'COALESCE((SELECT t.stage FROM {staging} t '
+                     f'WHERE t.company = EXCLUDED.company AND t.name = EXCLUDED.name), c.stage)',
+            'estimated_value': 'EXCLUDED.estimated_value',
+            'assigned_to_id': 'EXCLUDED.assigned_to_id',
+        }
+        assignments += [f'{field} = {value}' for field, value in updates.items() if field in columns]
+        if 'email' in columns:
+            # 💡 暫存表的搜尋文件以檔案中的郵箱產生；檔案沒有郵箱欄時郵箱不覆寫，
+            # 而企業名稱與姓名即自然鍵，合併後的文件與原本相同，不可用少了郵箱的文件覆蓋
+            assignments.append('search_document = EXCLUDED.search_document')
+
+        pipeline_sql = (
+            f'SELECT c.stage, c.assigned_to_id, count(*), sum(c.estimated_value) FROM {table} c '
+            f'JOIN {staging} s ON c.id = s.customer_id WHERE {{}} GROUP BY 1, 2'
+        )
+        deltas = PipelineDelta()
+        for _attempt in range(MERGE_ATTEMPTS):
+            # 2. 以 SELECT ... FOR UPDATE 鎖定檔案中已存在的客戶 (依主鍵順序，避免與其他匯入互相死結)，
+            #    鎖定後讀取的舊值在合併前不會再被其他交易修改
+            cursor.execute(
+                f'UPDATE {staging} s SET customer_id = c.id FROM ('
+                f'SELECT c.id, c.company, c.name FROM {table} c '
+                f'JOIN {staging} t ON c.company = t.company AND c.name = t.name '
+                f'WHERE t.customer_id IS NULL ORDER BY c.id FOR UPDATE OF c) c '
+                f'WHERE s.customer_id IS NULL AND s.company = c.company AND s.name = c.name'
+            )
+            # 3. 管線統計增量 = 合併後 - 合併前：先扣除這一輪鎖定的客戶
+            cursor.execute(pipeline_sql.format('s.customer_id IS NOT NULL AND NOT s.merged'))
+            for stage, assignee_id, count, total in cursor.fetchall():
+                deltas.remove(stage, assignee_id, total, count=count)
+
+            # 4. 新增不存在的客戶，已鎖定的客戶改為更新 (唯一限制 crm_customer_natural_key)；
+            #    與鎖定之後才由其他交易建立的客戶衝突時不更新 (WHERE)，留到下一輪鎖定後再合併
+            cursor.execute(
+                f'WITH merged AS ('
+                f'INSERT INTO {table} AS c (company, name, email, phone, stage, estimated_value, assigned_to_id, '
+                f'search_document, created_at, updated_at) '
+                f"SELECT s.company, s.name, s.email, COALESCE(s.phone, ''), COALESCE(s.stage, %s), "
+                f'COALESCE(s.estimated_value, 0), s.assigned_to_id, s.search_document, now(), now() '
+                f'FROM {staging} s WHERE NOT s.merged '
+                f"ON CONFLICT (company, name) DO UPDATE SET {', '.join(assignments)} "
+                f'WHERE EXISTS (SELECT 1 FROM {staging} t WHERE t.customer_id = c.id) '
+                f'RETURNING c.id, c.company, c.name, (c.xmax = 0) AS inserted) '
+                f'UPDATE {staging} s SET customer_id = m.id, created = m.inserted, merged = true '
+                f'FROM merged m WHERE s.company = m.company AND s.name = m.name',
+                [Customer.Stage.LEAD],
+            )
+            cursor.execute(f'SELECT EXISTS (SELECT 1 FROM {staging} WHERE NOT merged)')
+            if not cursor.fetchone()[0]:
+                break
+        else:
+            raise RuntimeError(f"客戶匯入合併重試 {MERGE_ATTEMPTS} 次仍有資料被其他交易同時寫入")
+
+        cursor.execute(pipeline_sql.format('true'))
+        for stage, assignee_id, count, total in cursor.fetchall():
+            deltas.add(stage, assignee_id, total, count=count)
+        PipelineRollup.objects.using(self.using).apply_deltas(deltas)
+
+        cursor.execute(f'SELECT count(*) FILTER (WHERE created), count(*) FILTER (WHERE NOT created) FROM {staging}')
+        result.created, result.updated = cursor.fetchone()
+
+    # 其他資料庫：分批 bulk_create / bulk_update
+
+    def _chunked_upsert(self, rows, result):
+        created_keys = set()  # 本次新增的客戶在後續批次再出現時只更新資料，不重複計入「更新」
+        batch = {}
+        for line, data in rows:
+            # 同一批內自然鍵重複時以最後一列為準；跨批的重複會在下一批被視為「已存在」而更新
+            batch[(data['company'], data['name'])] = data
+            if len(batch) >= self.batch_size:
+                self._upsert_batch(batch, result, created_keys)
+                batch = {}
+        if batch:
+            self._upsert_batch(batch, result, created_keys)
+
+    def _upsert_batch(self, batch, result, created_keys):
+        manager = Customer.objects.db_manager(self.using)
+        with transaction.atomic(using=self.using):
+            candidates = manager.filter(
+                company__in={company for company, _name in batch},
+                name__in={name for _company, name in batch},
+            )
+            existing = {(customer.company, customer.name): customer for customer in candidates}
+
+            to_create, to_update, fields, updated = [], [], set(), 0
+            for key, data in batch.items():
+                if key in existing:
+                    customer = existing[key]
+                    for field, value in data.items():
+                        setattr(customer, field, value)
+                    to_update.append(customer)
+                    fields.update(field for field in data if field not in NATURAL_KEY)
+                    if key not in created_keys:
+                        updated += 1
+                else:
+                    to_create.append(Customer(**data))
+                    created_keys.add(key)
+
+            if to_update and fields:
+                manager.bulk_update(to_update, sorted(fields), batch_size=1000)
+            manager.bulk_create(to_create, batch_size=1000)
+        result.updated += updated
+        result.created += len(to_create)
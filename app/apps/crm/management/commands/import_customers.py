@@ -0,0 +1,43 @@
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.crm.importers import BATCH_SIZE, CustomerImporter, read_rows
+
+
+class Command(BaseCommand):
+    help = "從 CSV / XLSX 批量匯入客戶資料 (以 所屬企業 + 客戶姓名 比對，存在則更新)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="匯入檔案路徑 (.csv 或 .xlsx)")
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help="每批驗證/寫入的列數")
+        parser.add_argument('--errors', help="錯誤報告輸出路徑 (CSV)；未指定時只列出前 20 筆")
+
+    def handle(self, *args, **options):
+        path = Path(options['path'])
+        if not path.exists():
+            raise CommandError(f"❌ 找不到檔案：{path}")
+
+        self.stdout.write(self.style.WARNING(f"📥 開始匯入 {path.name}..."))
+        started = time.monotonic()
+        try:
+            with path.open('rb') as fileobj:
+                result = CustomerImporter(batch_size=options['batch_size']).run(read_rows(fileobj, path.name))
+        except ValueError as exc:
+            raise CommandError(f"❌ {exc}")
+        elapsed = time.monotonic() - started
+
+        self.stdout.write(self.style.SUCCESS(f"✅ 匯入完成：{result}，耗時 {elapsed:.1f} 秒"))
+        if not result.errors:
+            return
+
+        if options['errors']:
+            with open(options['errors'], 'w', encoding='utf-8-sig', newline='') as report:
+                result.write_error_report(report)
+            self.stdout.write(self.style.WARNING(f"⚠️ 錯誤報告已寫入 {options['errors']}"))
+        else:
+            for line, message in result.errors[:20]:
+                self.stdout.write(f"  第 {line} 列：{message}")
+            if result.skipped > 20:
+                self.stdout.write(f"  ...其餘 {result.skipped - 20} 筆請加上 --errors 輸出完整報告")
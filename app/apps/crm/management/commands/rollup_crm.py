@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.crm.models import PipelineRollup
+
+
+class Command(BaseCommand):
+    help = "檢查或重建 CRM 管線統計表 (PipelineRollup)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rebuild',
+            action='store_true',
+            help="清空並依 Customer 表重新計算全部分組",
+        )
+
+    def handle(self, *args, **options):
+        if options['rebuild']:
+            self.stdout.write(self.style.WARNING("🔄 正在重建 CRM 管線統計表..."))
+            PipelineRollup.objects.rebuild()
+            self.stdout.write(self.style.SUCCESS(f"✅ 重建完成，共 {PipelineRollup.objects.count()} 個分組"))
+            return
+
+        self.stdout.write("🔍 正在比對統計表與 Customer 實際數據...")
+        mismatches = PipelineRollup.objects.drift()
+        if not mismatches:
+            self.stdout.write(self.style.SUCCESS("✅ 統計表與實際數據一致"))
+            return
+
+        for (stage, assignee_id), expected, stored in mismatches:
+            self.stdout.write(
+                f"  {stage} / 業務 {assignee_id}: 預期 {expected[0]} 筆 ${expected[1]:,.2f}，"
+                f"統計表 {stored[0]} 筆 ${stored[1]:,.2f}"
+            )
+        # 以非零結束碼回報，方便排程監控
+        raise CommandError(f"❌ 發現 {len(mismatches)} 個分組數據漂移，請執行 rollup_crm --rebuild")
@@ -0,0 +1,50 @@
+# Generated by Django 6.0.1 on 2026-10-18 09:57
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def build_pipeline_rollup(apps, schema_editor):
+    """依既有客戶資料建立初始統計"""
+    Customer = apps.get_model('crm', 'Customer')
+    PipelineRollup = apps.get_model('crm', 'PipelineRollup')
+    rows = Customer.objects.order_by().values('stage', 'assigned_to').annotate(
+        count=Count('id'),
+        total=Sum('estimated_value'),
+    )
+    PipelineRollup.objects.bulk_create(
+        PipelineRollup(
+            stage=row['stage'],
+            assignee_id=row['assigned_to'] or 0,
+            customer_count=row['count'],
+            total_value=row['total'] or 0,
+        )
+        for row in rows
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0003_alter_customer_assigned_to'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PipelineRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('stage', models.CharField(choices=[('LEAD', '潛在客戶'), ('DISCOVERY', '需求確認'), ('PROPOSAL', '方案報價'), ('NEGOTIATION', '商議談判'), ('WON', '成功結案'), ('LOST', '開發失敗')], max_length=20, verbose_name='開發階段')),
+                ('assignee_id', models.BigIntegerField(default=0, help_text='0 代表未指派', verbose_name='負責業務 ID')),
+                ('customer_count', models.BigIntegerField(default=0, verbose_name='客戶數')),
+                ('total_value', models.DecimalField(decimal_places=2, default=0, max_digits=20, verbose_name='預估總價值')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='最後更新時間')),
+            ],
+            options={
+                'verbose_name': '管線統計',
+                'verbose_name_plural': '管線統計',
+                'constraints': [models.UniqueConstraint(fields=('stage', 'assignee_id'), name='crm_pipeline_rollup_key')],
+            },
+        ),
+        migrations.RunPython(build_pipeline_rollup, migrations.RunPython.noop),
+    ]
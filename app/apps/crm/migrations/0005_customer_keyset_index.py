@@ -0,0 +1,19 @@
+# Generated by Django 6.0.1 on 2026-10-18 10:02
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0004_pipelinerollup'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='customer',
+            index=models.Index(fields=['-created_at', '-estimated_value', '-id'], name='crm_custome_created_9fcda7_idx'),
+        ),
+    ]
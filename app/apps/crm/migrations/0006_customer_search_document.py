@@ -0,0 +1,44 @@
+# Generated by Django 6.0.1 on 2026-10-18 10:07
+
+from django.db import migrations, models
+
+from core.search import SearchIndex, build_document
+
+
+def fill_search_documents(apps, schema_editor):
+    """依既有客戶資料產生搜尋文件"""
+    Customer = apps.get_model('crm', 'Customer')
+    batch = []
+    for customer in Customer.objects.only('company', 'name', 'email').iterator(chunk_size=2000):
+        customer.search_document = build_document(customer.company, customer.name, customer.email)
+        batch.append(customer)
+        if len(batch) >= 2000:
+            Customer.objects.bulk_update(batch, ['search_document'])
+            batch = []
+    Customer.objects.bulk_update(batch, ['search_document'])
+
+
+def install_search_index(apps, schema_editor):
+    # PostgreSQL：GIN (tsvector) + pg_trgm 索引；SQLite：FTS5 影子表與同步 trigger
+    SearchIndex('crm_customer').install(schema_editor.connection)
+
+
+def uninstall_search_index(apps, schema_editor):
+    SearchIndex('crm_customer').uninstall(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0005_customer_keyset_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customer',
+            name='search_document',
+            field=models.TextField(blank=True, default='', editable=False, verbose_name='搜尋索引文件'),
+        ),
+        migrations.RunPython(fill_search_documents, migrations.RunPython.noop),
+        migrations.RunPython(install_search_index, uninstall_search_index),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 6.0.1 on 2026-10-18 10:13
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0006_customer_search_document'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='customer',
+            index=models.Index(fields=['company', 'name'], name='crm_custome_company_c41aeb_idx'),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 6.0.1 on 2026-10-18 16:40
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+from core.search import build_document
+
+
+def rename_duplicates(apps, schema_editor):
+    """
+    建立唯一限制前處理既有的重複自然鍵：保留最早建立 (主鍵最小) 的客戶，
+    其餘在姓名後加上「(#主鍵)」區分，資料不刪除，之後可由人工合併
+    """
+    Customer = apps.get_model('crm', 'Customer')
+    max_length = Customer._meta.get_field('name').max_length
+    duplicates = (
+        Customer.objects.values('company', 'name')
+        .annotate(count=Count('id'), keep=Min('id'))
+        .filter(count__gt=1)
+    )
+    for row in duplicates.iterator():
+        others = Customer.objects.filter(company=row['company'], name=row['name']).exclude(pk=row['keep'])
+        for customer in others.only('company', 'name', 'email'):
+            suffix = f' (#{customer.pk})'
+            customer.name = customer.name[:max_length - len(suffix)] + suffix
+            customer.search_document = build_document(customer.company, customer.name, customer.email)
+            customer.save(update_fields=['name', 'search_document'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0007_customer_natural_key_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(rename_duplicates, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='customer',
+            name='crm_custome_company_c41aeb_idx',
+        ),
+        migrations.AddConstraint(
+            model_name='customer',
+            constraint=models.UniqueConstraint(
+                fields=('company', 'name'), name='crm_customer_natural_key',
+                violation_error_message='同一企業已有同名客戶',
+            ),
+        ),
+    ]
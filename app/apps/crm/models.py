@@ -1,7 +1,176 @@
-from django.db import models
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import models, transaction, IntegrityError
+from django.db.models import Count, F, Sum
 from django.conf import settings
 from django.utils.translation import gettext_lazy as _
 
+from core.search import SearchIndex, build_document
+from .signals import pipeline_changed
+
+# 會影響管線統計 (PipelineRollup) 的欄位
+ROLLUP_FIELDS = ('stage', 'estimated_value', 'assigned_to_id')
+
+# 已結案 (成交/流失) 的階段，不列入「活躍商機」
+CLOSED_STAGES = ('WON', 'LOST')
+
+CENT = Decimal('0.01')
+
+# 組成全文檢索文件 (search_document) 的欄位
+SEARCH_FIELDS = ('company', 'name', 'email')
+
+
+def lock_rows(queryset):
+    """在目前交易中以 SELECT ... FOR UPDATE 鎖定查詢到的列 (只讀取主鍵，分批串流)"""
+    for _pk in queryset.select_for_update().values_list('pk', flat=True).iterator(chunk_size=5000):
+        pass
+
+
+class PipelineDelta(defaultdict):
+    """
+    管線統計的增量累加器：{(stage, assignee_id): [客戶數, 金額]}
+    未指派業務的客戶以 assignee_id = 0 表示。
+    """
+    def __init__(self):
+        super().__init__(lambda: [0, Decimal('0')])
+
+    def add(self, stage, assignee_id, value, count=1):
+        entry = self[(stage, assignee_id or 0)]
+        entry[0] += count
+        entry[1] += Decimal(str(value or 0))
+
+    def remove(self, stage, assignee_id, value, count=1):
+        self.add(stage, assignee_id, -Decimal(str(value or 0)), count=-count)
+
+    def add_groups(self, rows, sign=1):
+        """累加 values('stage', 'assigned_to').annotate(count, total) 的分組結果"""
+        for row in rows:
+            self.add(row['stage'], row['assigned_to'], sign * (row['total'] or 0), count=sign * row['count'])
+
+
+class CustomerQuerySet(models.QuerySet):
+    """
+    所有批量寫入路徑 (bulk_create / update / delete，bulk_update 經由 update) 都會同步維護 PipelineRollup
+    與搜尋文件 (search_document)，避免繞過 Model.save() 時統計表或搜尋結果失準。
+    """
+
+    def _pipeline_groups(self):
+        return self.order_by().values('stage', 'assigned_to').annotate(
+            count=Count('id'),
+            total=Sum('estimated_value'),
+        )
+
+    def refresh_search_documents(self, batch_size=1000):
+        """依目前欄位值重新產生搜尋文件"""
+        objs = [
+            self.model(pk=pk, search_document=build_document(*values))
+            for pk, *values in self.values_list('pk', *SEARCH_FIELDS).iterator(chunk_size=batch_size)
+        ]
+        return self.bulk_update(objs, ['search_document'], batch_size=batch_size)
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        for obj in objs:
+            obj.update_search_document()
+        with transaction.atomic(using=self.db):
+            created = super().bulk_create(objs, *args, **kwargs)
+            if kwargs.get('ignore_conflicts') or kwargs.get('update_conflicts'):
+                # 衝突模式下無法得知哪些列實際寫入，直接重建最保險
+                PipelineRollup.objects.rebuild()
+            else:
+                deltas = PipelineDelta()
+                for obj in created:
+                    deltas.add(obj.stage, obj.assigned_to_id, obj.estimated_value)
+                PipelineRollup.objects.apply_deltas(deltas)
+        return created
+
+    def bulk_update(self, objs, fields, *args, **kwargs):
+        # Django 的 bulk_update 內部走 update()，統計增量已在 update() 處理，這裡只需補上搜尋文件
+        objs = list(objs)
+        if set(fields) & set(SEARCH_FIELDS) and 'search_document' not in fields:
+            for obj in objs:
+                obj.update_search_document()
+            fields = [*fields, 'search_document']
+        return super().bulk_update(objs, fields, *args, **kwargs)
+
+    def update(self, **kwargs):
+        if self.query.is_sliced:
+            # 交由 Django 拋出原本的錯誤訊息
+            return super().update(**kwargs)
+        if set(kwargs) & set(SEARCH_FIELDS) and 'search_document' not in kwargs:
+            with transaction.atomic(using=self.db):
+                affected = self._rollup_targets(kwargs)
+                rows = affected._update_rollup(**kwargs)
+                affected.refresh_search_documents()
+            return rows
+        return self._update_rollup(**kwargs)
+    update.alters_data = True
+
+    def _rollup_targets(self, fields):
+        """
+        update() 影響的列，以主鍵子查詢表示 (不把主鍵載入 Python，也不受資料庫參數數量上限影響)。
+        💡 篩選條件若引用了本次更新的欄位 (例如 filter(stage=A).update(stage=B))，
+        子查詢在更新後會選到另一組列，此時才先取出主鍵
+        """
+        opts = self.model._meta
+        updated = {opts.get_field(name).name for name in fields}
+        filtered = {col.target.name for col in self.query.where.get_group_by_cols() if col.alias == opts.db_table}
+        targets = self.values('pk')
+        if filtered & updated:
+            targets = list(targets.values_list('pk', flat=True))
+        return type(self)(self.model, using=self.db).filter(pk__in=targets)
+
+    def _update_rollup(self, **kwargs):
+        tracked = {'assigned_to_id' if f == 'assigned_to' else f for f in kwargs} & set(ROLLUP_FIELDS)
+        if not tracked:
+            return super().update(**kwargs)
+
+        expressions = any(hasattr(value, 'resolve_expression') for value in kwargs.values())
+        with transaction.atomic(using=self.db):
+            # 💡 先以 SELECT ... FOR UPDATE 鎖定受影響的列，讀取舊分組到更新完成之間其他交易無法修改或刪除它們；
+            # 更新本身與前後分組都針對同一組已鎖定的列
+            affected = self._rollup_targets(kwargs if expressions else ())
+            lock_rows(affected)
+            deltas = PipelineDelta()
+            groups = list(affected._pipeline_groups())
+            deltas.add_groups(groups, sign=-1)
+            rows = super(CustomerQuerySet, affected).update(**kwargs)
+            if expressions:
+                # 含 F() 等表達式時無法推算新值：更新後依同一組列重新分組
+                deltas.add_groups(affected._pipeline_groups())
+            else:
+                new_stage = kwargs.get('stage')
+                new_value = kwargs.get('estimated_value')
+                if 'assigned_to' in kwargs:
+                    owner = kwargs['assigned_to']
+                    new_owner = getattr(owner, 'pk', owner)
+                else:
+                    new_owner = kwargs.get('assigned_to_id', ...)
+                for row in groups:
+                    total = row['total'] if new_value is None else Decimal(str(new_value)) * row['count']
+                    deltas.add(
+                        new_stage or row['stage'],
+                        row['assigned_to'] if new_owner is ... else new_owner,
+                        total,
+                        count=row['count'],
+                    )
+            PipelineRollup.objects.apply_deltas(deltas)
+        return rows
+
+    def delete(self):
+        if self.query.is_sliced or self.query.distinct or self.query.distinct_fields:
+            # 交由 Django 拋出原本的錯誤訊息
+            return super().delete()
+        with transaction.atomic(using=self.db):
+            deltas = PipelineDelta()
+            deltas.add_groups(self._pipeline_groups(), sign=-1)
+            result = super().delete()
+            PipelineRollup.objects.apply_deltas(deltas)
+        return result
+    delete.alters_data = True
+    delete.queryset_only = True
+
 class Customer(models.Model):
     """
     CRM 客戶資料模型
@@ -52,6 +221,11 @@ class Customer(models.Model):
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="系統建立時間", null=True)
     updated_at = models.DateTimeField(auto_now=True, verbose_name="最後更新時間", null=True)
 
+    # 全文檢索：企業名稱、姓名、郵箱斷詞後的 token (由 save / 批量寫入維護，索引建立於 migration)
+    search_document = models.TextField(editable=False, blank=True, default='', verbose_name="搜尋索引文件")
+
+    objects = CustomerQuerySet.as_manager()
+
     class Meta:
         verbose_name = "客戶"
         verbose_name_plural = "客戶資料庫"
@@ -59,12 +233,205 @@ class Customer(models.Model):
         ordering = ['-created_at', '-estimated_value']
         indexes = [
             models.Index(fields=['stage', 'company']),
+            # 對應預設排序 (含 ChangeList 補上的 -id)，供 keyset 分頁直接做索引範圍掃描
+            models.Index(fields=['-created_at', '-estimated_value', '-id']),
+        ]
+        constraints = [
+            # 自然鍵 (所屬企業, 客戶姓名)：批量匯入以 INSERT ... ON CONFLICT 合併，併發匯入也不會產生重複客戶
+            models.UniqueConstraint(
+                fields=['company', 'name'], name='crm_customer_natural_key',
+                violation_error_message="同一企業已有同名客戶",
+            ),
         ]
 
     def __str__(self):
         return f"{self.company} - {self.name} ({self.get_stage_display()})"
 
+    # --- 管線統計 (PipelineRollup) 增量維護 ---
+
+    def _locked_rollup_state(self):
+        """
+        在目前交易中鎖定並讀取資料庫裡的統計欄位值 (尚無主鍵或該列已不存在時為 None)。
+        💡 不能沿用讀取實例當下的值：同一筆客戶的其他實例或請求可能已先修改，鎖定後重新讀取才是這次寫入覆蓋的舊值
+        """
+        if self.pk is None:
+            return None
+        return type(self)._base_manager.select_for_update().filter(pk=self.pk).values_list(*ROLLUP_FIELDS).first()
+
+    def update_search_document(self):
+        self.search_document = build_document(*(getattr(self, field) for field in SEARCH_FIELDS))
+
+    def _saved_rollup_fields(self, update_fields):
+        """本次 save() 實際寫入的統計欄位 (指定 update_fields 或以 only()/defer() 載入時只寫入部分欄位)"""
+        if update_fields is None:
+            return [field for field in ROLLUP_FIELDS if field not in self.get_deferred_fields()]
+        # update_fields 可用欄位名稱 (assigned_to) 或 attname (assigned_to_id)
+        saved = {self._meta.get_field(name).attname for name in update_fields}
+        return [field for field in ROLLUP_FIELDS if field in saved]
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or set(update_fields) & set(SEARCH_FIELDS):
+            self.update_search_document()
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'search_document'}
+        saved = self._saved_rollup_fields(update_fields)
+        if not saved and not self._state.adding:
+            # 💡 未寫入任何統計欄位 (例如 save(update_fields=['phone']))：統計不變
+            return super().save(*args, **kwargs)
+        with transaction.atomic():
+            previous = self._locked_rollup_state()
+            super().save(*args, **kwargs)
+            current = tuple(getattr(self, field) for field in ROLLUP_FIELDS) if previous is None else tuple(
+                # 未寫入的欄位沿用資料庫中的舊值，記憶體中未存檔的修改不計入統計
+                getattr(self, field) if field in saved else value
+                for field, value in zip(ROLLUP_FIELDS, previous)
+            )
+            deltas = PipelineDelta()
+            if previous:
+                deltas.remove(previous[0], previous[2], previous[1])
+            deltas.add(current[0], current[2], current[1])
+            PipelineRollup.objects.apply_deltas(deltas)
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            previous = self._locked_rollup_state()
+            result = super().delete(*args, **kwargs)
+            # 其他請求已先刪除該列時 (刪除 0 筆) 不再扣除
+            if previous and result[1].get(self._meta.label):
+                deltas = PipelineDelta()
+                deltas.remove(previous[0], previous[2], previous[1])
+                PipelineRollup.objects.apply_deltas(deltas)
+        return result
+
     @property
     def is_hot_lead(self):
         """判斷是否為高價值潛在客戶（金額大於 100 萬）"""
-        return self.estimated_value >= 1000000
\ No newline at end of file
+        return self.estimated_value >= 1000000
+
+
+class PipelineRollupQuerySet(models.QuerySet):
+
+    def apply_deltas(self, deltas):
+        """以 F() 原子遞增套用增量，不存在的分組才新建；交易提交後發出 pipeline_changed"""
+        changed = {}
+        for (stage, assignee_id), (count, value) in deltas.items():
+            if not count and not value:
+                continue
+            changed[(stage, assignee_id)] = (count, value)
+            lookup = self.filter(stage=stage, assignee_id=assignee_id)
+            changes = {
+                'customer_count': F('customer_count') + count,
+                'total_value': F('total_value') + value,
+            }
+            if lookup.update(**changes):
+                continue
+            try:
+                with transaction.atomic(using=self.db):
+                    self.create(stage=stage, assignee_id=assignee_id, customer_count=count, total_value=value)
+            except IntegrityError:
+                # 併發情境下另一個請求已先建立該分組
+                lookup.update(**changes)
+        if changed:
+            self._notify(changed)
+
+    def _notify(self, deltas):
+        transaction.on_commit(
+            lambda: pipeline_changed.send(sender=PipelineRollup, deltas=deltas),
+            using=self.db,
+        )
+
+    def expected(self):
+        """直接掃描 Customer 表得到的正確統計：{(stage, assignee_id): (客戶數, 金額)}"""
+        rows = Customer._base_manager.using(self.db).order_by().values('stage', 'assigned_to').annotate(
+            count=Count('id'),
+            total=Sum('estimated_value'),
+        )
+        # SQLite 以浮點數加總 Decimal，大量資料時會有尾差，統一取到分位再比較
+        return {
+            (row['stage'], row['assigned_to'] or 0): (row['count'], (row['total'] or Decimal('0')).quantize(CENT))
+            for row in rows
+        }
+
+    def rebuild(self):
+        """清空後依 Customer 表重新計算全部分組"""
+        with transaction.atomic(using=self.db):
+            self.all().delete()
+            self.bulk_create(
+                PipelineRollup(stage=stage, assignee_id=assignee_id, customer_count=count, total_value=total)
+                for (stage, assignee_id), (count, total) in self.expected().items()
+            )
+            self._notify(None)
+
+    def drift(self):
+        """比對統計表與實際數據，回傳不一致的分組：[(key, 預期值, 統計表值), ...]"""
+        expected = self.expected()
+        stored = {
+            (row.stage, row.assignee_id): (row.customer_count, row.total_value)
+            for row in self.all()
+        }
+        mismatches = []
+        for key in sorted(set(expected) | set(stored)):
+            want = expected.get(key, (0, Decimal('0')))
+            have = stored.get(key, (0, Decimal('0')))
+            if want != have:
+                mismatches.append((key, want, have))
+        return mismatches
+
+    def summary(self):
+        """
+        看板所需的管線總覽，成本只與「階段 x 業務」的分組數相關，不隨客戶數成長。
+        回傳：{'stages': {stage: {'count', 'total'}}, 'count', 'total', 'active'}
+        """
+        rows = self.order_by().values('stage').annotate(
+            count=Sum('customer_count'),
+            total=Sum('total_value'),
+        )
+        stages = {
+            row['stage']: {'count': row['count'] or 0, 'total': row['total'] or Decimal('0')}
+            for row in rows
+        }
+        return {
+            'stages': stages,
+            'count': sum(item['count'] for item in stages.values()),
+            'total': sum((item['total'] for item in stages.values()), Decimal('0')),
+            'active': sum(item['count'] for stage, item in stages.items() if stage not in CLOSED_STAGES),
+        }
+
+    def by_assignee(self):
+        """各業務專員的管線統計：{assignee_id: {stage: {'count', 'total'}}}，0 代表未指派"""
+        result = defaultdict(dict)
+        for row in self.exclude(customer_count=0).order_by().values('assignee_id', 'stage', 'customer_count', 'total_value'):
+            result[row['assignee_id']][row['stage']] = {
+                'count': row['customer_count'],
+                'total': row['total_value'],
+            }
+        return dict(result)
+
+
+class PipelineRollup(models.Model):
+    """
+    CRM 管線統計表 (依「階段 x 負責業務」分組)
+    於客戶新增、修改、刪除時增量維護，讓看板不必每次全表掃描 Customer。
+    """
+    stage = models.CharField(max_length=20, choices=Customer.Stage.choices, verbose_name="開發階段")
+    assignee_id = models.BigIntegerField(default=0, verbose_name="負責業務 ID", help_text="0 代表未指派")
+    customer_count = models.BigIntegerField(default=0, verbose_name="客戶數")
+    total_value = models.DecimalField(max_digits=20, decimal_places=2, default=0, verbose_name="預估總價值")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="最後更新時間")
+
+    objects = PipelineRollupQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = "管線統計"
+        verbose_name_plural = "管線統計"
+        constraints = [
+            models.UniqueConstraint(fields=['stage', 'assignee_id'], name='crm_pipeline_rollup_key'),
+        ]
+
+    def __str__(self):
+        return f"{self.stage} / {self.assignee_id}: {self.customer_count}"
+
+
+# 客戶全文檢索索引 (PostgreSQL GIN / SQLite FTS5)，供 CustomerAdmin 及其他查詢共用
+customer_search = SearchIndex(Customer._meta.db_table)
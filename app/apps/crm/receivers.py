@@ -0,0 +1,55 @@
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import connections
+from django.db.models.signals import post_migrate, pre_delete
+from django.dispatch import receiver
+
+from core import events
+from core.cache import bump_version
+from .models import PipelineDelta, PipelineRollup, customer_search
+from .signals import PIPELINE_CACHE_NAMESPACE, pipeline_changed
+
+
+@receiver(pre_delete, sender=settings.AUTH_USER_MODEL)
+def fold_deleted_assignee(sender, instance, **kwargs):
+    """
+    刪除使用者時，Customer.assigned_to 會被 SET_NULL (批量 UPDATE，不經過 save)，
+    這裡同步把該業務的管線統計併入「未指派」分組。
+    """
+    deltas = PipelineDelta()
+    for row in PipelineRollup.objects.filter(assignee_id=instance.pk):
+        deltas.remove(row.stage, instance.pk, row.total_value, count=row.customer_count)
+        deltas.add(row.stage, None, row.total_value, count=row.customer_count)
+    PipelineRollup.objects.apply_deltas(deltas)
+
+
+@receiver(pipeline_changed)
+def invalidate_pipeline_cache(sender, **kwargs):
+    """統計異動後遞增快取版本，crm_stats_api 的 ETag 與快取 payload 隨之失效"""
+    bump_version(PIPELINE_CACHE_NAMESPACE)
+
+
+@receiver(pipeline_changed)
+def publish_pipeline_event(sender, deltas=None, **kwargs):
+    """推送各階段的客戶數 / 金額增量給看板 (SSE)；整表重建時送 reset，前端重新讀取"""
+    events.publish(PIPELINE_CACHE_NAMESPACE, pipeline_event(deltas))
+
+
+def pipeline_event(deltas):
+    if deltas is None:
+        return events.RESET
+    stages = {}
+    for (stage, _assignee_id), (count, value) in deltas.items():
+        item = stages.setdefault(stage, {'count': 0, 'value': Decimal('0')})
+        item['count'] += count
+        item['value'] += value
+    # 只換負責業務時各階段淨增量為 0，不必推送
+    return {'type': 'delta', 'stages': {stage: item for stage, item in stages.items() if item['count'] or item['value']}}
+
+
+@receiver(post_migrate)
+def ensure_customer_search_index(sender, using, **kwargs):
+    """SQLite 重建資料表後 FTS5 trigger 會遺失，migrate 完成後補建"""
+    if sender.name == 'apps.crm':
+        customer_search.ensure_installed(connections[using])
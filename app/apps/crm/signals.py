@@ -0,0 +1,8 @@
+from django.dispatch import Signal
+
+# 管線統計的快取命名空間 (crm_stats_api 等看板共用)
+PIPELINE_CACHE_NAMESPACE = 'crm.pipeline'
+
+# 管線統計表異動並提交後發出
+# 參數 deltas: {(stage, assignee_id): (客戶數增量, 金額增量)}；整表重建時為 None
+pipeline_changed = Signal()
@@ -1,3 +1,374 @@
+import csv
+import io
+import json
+from decimal import Decimal
+from unittest import skipUnless
+
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F
+from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core.pagination import KeysetPaginator
+from core.search import build_document, query_terms, tokenize
+from . import exports
+from .importers import CustomerImporter, read_rows
+from .models import Customer, PipelineRollup, customer_search
+
+User = get_user_model()
+
+
+class PipelineRollupTests(TestCase):
+    """管線統計表必須在各種寫入路徑後與 Customer 表保持一致"""
+
+    def setUp(self):
+        self.rep = User.objects.create_user(username='rep', password='x', role='CRM', employee_id='EMP900')
+
+    def assertNoDrift(self):
+        self.assertEqual(PipelineRollup.objects.drift(), [])
+
+    def test_save_update_and_delete(self):
+        customer = Customer.objects.create(name='王大明', company='宏達科技', estimated_value=1000, assigned_to=self.rep)
+        self.assertNoDrift()
+
+        customer.stage = Customer.Stage.WON
+        customer.estimated_value = Decimal('2500.50')
+        customer.save()
+        self.assertNoDrift()
+
+        # 只載入部分欄位的實例 (only) 也要能正確計算舊值
+        partial = Customer.objects.only('id', 'name').get(pk=customer.pk)
+        partial.stage = Customer.Stage.LOST
+        partial.save()
+        self.assertNoDrift()
+
+        # update_fields 只寫入部分欄位：未寫入的修改不計入統計，之後完整存檔時才計入
+        customer = Customer.objects.get(pk=customer.pk)
+        customer.stage = Customer.Stage.PROPOSAL
+        customer.estimated_value = 9000
+        customer.assigned_to = None
+        customer.save(update_fields=['stage', 'assigned_to'])
+        self.assertNoDrift()
+        customer.phone = '02-1234-5678'
+        customer.save(update_fields=['phone'])
+        self.assertNoDrift()
+        customer.save()
+        self.assertNoDrift()
+        self.assertEqual(PipelineRollup.objects.summary()['total'], 9000)
+
+        Customer.objects.get(pk=customer.pk).delete()
+        self.assertNoDrift()
+        self.assertEqual(PipelineRollup.objects.summary()['count'], 0)
+
+    def test_stale_instances(self):
+        # 同一筆客戶的多個實例 (例如兩個請求同時編輯)：舊值一律以存檔當下資料庫中的值為準
+        customer = Customer.objects.create(name='王大明', company='宏達科技', estimated_value=100)
+        first, second = Customer.objects.get(pk=customer.pk), Customer.objects.get(pk=customer.pk)
+        first.stage = Customer.Stage.WON
+        first.save()
+        second.stage = Customer.Stage.LOST
+        second.save()
+        self.assertNoDrift()
+
+        customer.refresh_from_db()
+        customer.estimated_value = 300
+        customer.save()
+        self.assertNoDrift()
+
+        first.delete()
+        second.delete()
+        self.assertNoDrift()
+        self.assertEqual(PipelineRollup.objects.summary()['count'], 0)
+
+    def test_bulk_paths(self):
+        Customer.objects.bulk_create([
+            Customer(name=f'客戶{i}', company=f'遠東物流 ({i})', stage='LEAD', estimated_value=100 * i,
+                     assigned_to=self.rep if i % 2 else None)
+            for i in range(10)
+        ])
+        self.assertNoDrift()
+
+        Customer.objects.filter(stage='LEAD', assigned_to__isnull=True).update(stage='PROPOSAL', assigned_to=self.rep)
+        self.assertNoDrift()
+
+        Customer.objects.filter(stage='PROPOSAL').update(estimated_value=F('estimated_value') * 2)
+        self.assertNoDrift()
+        # 篩選條件與更新欄位相同：更新後的分組仍須對應原本那一組列
+        Customer.objects.filter(estimated_value__lt=500).update(estimated_value=F('estimated_value') + 1000)
+        self.assertNoDrift()
+        Customer.objects.filter(company='遠東物流 (1)').update(company='遠東國際')
+        renamed = Customer.objects.get(company='遠東國際')
+        self.assertEqual(renamed.search_document, build_document(renamed.company, renamed.name, renamed.email))
+
+        customers = list(Customer.objects.all()[:3])
+        for customer in customers:
+            customer.stage = 'NEGOTIATION'
+        Customer.objects.bulk_update(customers, ['stage'])
+        self.assertNoDrift()
+
+        Customer.objects.filter(stage='NEGOTIATION').delete()
+        self.assertNoDrift()
+
+        summary = PipelineRollup.objects.summary()
+        self.assertEqual(summary['count'], Customer.objects.count())
+        self.assertEqual(summary['active'], Customer.objects.exclude(stage__in=['WON', 'LOST']).count())
+
+    def test_deleting_assignee_moves_pipeline_to_unassigned(self):
+        Customer.objects.create(name='趙敏', company='國泰顧問', estimated_value=500, assigned_to=self.rep)
+        self.rep.delete()
+        self.assertNoDrift()
+        self.assertEqual(list(PipelineRollup.objects.by_assignee()), [0])
+
+
+class StatsApiCacheTests(TestCase):
+    """crm_stats_api 的版本化快取與 ETag/304 行為"""
+
+    def setUp(self):
+        self.staff = User.objects.create_user(username='staff', password='x', is_staff=True, employee_id='EMP901')
+        self.client.force_login(self.staff)
+        self.url = reverse('crm:stats_api')
+
+    def test_etag_round_trip_and_invalidation(self):
+        first = self.client.get(self.url)
+        self.assertEqual(first.status_code, 200)
+        etag = first['ETag']
+
+        with CaptureQueriesContext(connection) as ctx:
+            cached = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(cached.status_code, 304)
+        self.assertFalse([q for q in ctx.captured_queries if 'crm_' in q['sql']])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Customer.objects.create(name='李小龍', company='富邦媒體', stage='WON', estimated_value=10)
+
+        refreshed = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(refreshed.status_code, 200)
+        self.assertNotEqual(refreshed['ETag'], etag)
+        self.assertIn(1, refreshed.json()['counts'])
+
+
+class CustomerChangelistTests(TestCase):
+    """客戶列表頁：ChangeList 只建立一次，統計卡片與趨勢圖來自單一分組查詢"""
+
+    def setUp(self):
+        self.admin = User.objects.create_superuser(username='boss', password='x', email='boss@example.com')
+        self.client.force_login(self.admin)
+        Customer.objects.bulk_create([
+            Customer(name=f'客戶{i}', company=f'台塑實業 ({i})', stage='WON' if i % 3 == 0 else 'LEAD',
+                     estimated_value=1000, assigned_to=self.admin)
+            for i in range(12)
+        ])
+        self.url = reverse('admin:crm_customer_changelist')
+
+    def test_dashboard_context_follows_filters(self):
+        response = self.client.get(self.url, {'stage__exact': 'LEAD'})
+        self.assertEqual(response.status_code, 200)
+        cards = response.context['custom_dashboard_cards']
+        self.assertEqual(cards[0]['value'], '8')
+        self.assertEqual(cards[2]['value'], '8')
+        self.assertEqual(len(response.context['chart_data']), 6)
+        self.assertEqual(response.context['chart_data'][-1], 8)
+
+    def test_query_count_is_pinned(self):
+        # session、使用者、業務篩選器選項、列表結果 (keyset：非 NULL 區段 + 不足一頁時的 created_at NULL 區段)、
+        # 分頁計數 (未篩選時與全表計數共用)、統計分組
+        with self.assertNumQueries(7):
+            self.client.get(self.url).render()
+
+
+class CustomerKeysetPaginationTests(TestCase):
+    """created_at 可為 NULL：NULL 區段需依資料庫排序慣例銜接在非 NULL 區段前後"""
+
+    def test_pages_cover_null_segment(self):
+        Customer.objects.bulk_create([
+            Customer(name=f'客戶{i}', company=f'遠東資訊 ({i})', estimated_value=i % 4 * 100)
+            for i in range(23)
+        ])
+        Customer.objects.filter(pk__in=Customer.objects.order_by('pk').values('pk')[:7]).update(created_at=None)
+
+        queryset = Customer.objects.order_by('-created_at', '-estimated_value', '-pk')
+        expected = list(queryset.values_list('pk', flat=True))
+        paginator = KeysetPaginator.from_queryset(queryset, 5)
+        self.assertIsNotNone(paginator)
+
+        seen, cursor = [], None
+        while True:
+            page = paginator.page(cursor)
+            seen.extend(obj.pk for obj in page)
+            if not page.next_cursor:
+                break
+            cursor = page.next_cursor
+        self.assertEqual(seen, expected)
+
+        previous = paginator.page(page.previous_cursor)
+        self.assertEqual([obj.pk for obj in previous], expected[15:20])
+
+
+class CustomerSearchTests(TestCase):
+    """全文檢索：中文以單字 + bigram 斷詞，各種寫入路徑都要同步搜尋文件與索引"""
+
+    def setUp(self):
+        Customer.objects.bulk_create([
+            Customer(name='王大明', company='宏達科技 (01)', email='wang@htc.com'),
+            Customer(name='李小龍', company='宏達物流 (02)', email='lee@logistics.tw'),
+            Customer(name='張華', company='富邦科技 (03)', email='chang@fubon.com'),
+        ])
+
+    def search(self, text):
+        return list(customer_search.search(Customer.objects.all(), text).values_list('company', flat=True))
+
+    def test_tokenizer(self):
+        self.assertEqual(tokenize('宏達科技 (01)'), ['宏', '達', '科', '技', '宏達', '達科', '科技', '01'])
+        self.assertEqual(query_terms('Ｈtc 宏達科'), [('htc', True), ('宏達', False), ('達科', False)])
+
+    def test_search_and_sync(self):
+        self.assertEqual(sorted(self.search('宏達')), ['宏達物流 (02)', '宏達科技 (01)'])
+        self.assertEqual(self.search('宏達科技'), ['宏達科技 (01)'])
+        self.assertEqual(self.search('FUB'), ['富邦科技 (03)'])
+        self.assertEqual(self.search('!!'), [])
+
+        Customer.objects.filter(company__startswith='富邦').update(company='遠東資訊 (03)')
+        self.assertEqual(self.search('富邦'), [])
+        self.assertEqual(self.search('遠東'), ['遠東資訊 (03)'])
+
+        customer = Customer.objects.get(name='王大明')
+        customer.name = '趙敏'
+        customer.save(update_fields=['name'])
+        self.assertEqual(self.search('趙敏'), ['宏達科技 (01)'])
+
+        customer.delete()
+        self.assertEqual(self.search('宏達'), ['宏達物流 (02)'])
+
+    def test_admin_search_orders_by_rank(self):
+        admin = User.objects.create_superuser(username='boss', password='x', email='boss@example.com')
+        self.client.force_login(admin)
+        Customer.objects.create(name='宏達', company='宏達宏達顧問 (04)')
+        response = self.client.get(reverse('admin:crm_customer_changelist'), {'q': '宏達'})
+        self.assertEqual(response.status_code, 200)
+        results = list(response.context['cl'].result_list)
+        self.assertEqual(len(results), 3)
+        self.assertEqual(results[0].company, '宏達宏達顧問 (04)')
+        self.assertEqual(response.context['custom_dashboard_cards'][0]['value'], '3')
+
+
+class CustomerExportTests(TestCase):
+    """串流匯出沿用列表篩選條件，查詢數與筆數無關 (負責業務以 JOIN 取得)"""
+
+    def setUp(self):
+        self.admin = User.objects.create_superuser(username='boss', password='x', email='boss@example.com')
+        self.client.force_login(self.admin)
+        reps = [User.objects.create_user(username=f'rep{i}', password='x', employee_id=f'EMP7{i:02d}') for i in range(3)]
+        Customer.objects.bulk_create([
+            Customer(name=f'客戶{i}', company=f'國泰顧問 ({i})', stage='WON' if i % 2 else 'LEAD',
+                     estimated_value=1000 + i, assigned_to=reps[i % 3])
+            for i in range(30)
+        ])
+        self.url = reverse('admin:crm_customer_export')
+
+    def download(self, **params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content)
+
+    def test_csv_respects_filters(self):
+        body = self.download(format='csv', stage__exact='WON').decode('utf-8-sig')
+        rows = list(csv.reader(io.StringIO(body)))
+        self.assertEqual(rows[0][:3], ['ID', '所屬企業', '客戶姓名'])
+        self.assertEqual(len(rows), 16)
+        self.assertEqual({row[5] for row in rows[1:]}, {'成功結案'})
+        self.assertTrue(all(row[7].startswith('rep') for row in rows[1:]))
+
+    def test_ndjson_query_count_is_flat(self):
+        with self.assertNumQueries(4):  # session、使用者、業務篩選器選項、單一匯出查詢 (含 JOIN)
+            body = self.download(format='ndjson')
+        lines = body.decode().splitlines()
+        self.assertEqual(len(lines), 30)
+        self.assertEqual(json.loads(lines[0])['company'][:4], '國泰顧問')
+
+    def test_csv_escapes_formulas(self):
+        """客戶填寫的 =HYPERLINK(...)、+886 等內容前置 '，試算表不會當成公式執行；數字欄位不受影響"""
+        Customer.objects.all().delete()
+        Customer.objects.create(name='=HYPERLINK("http://evil.example","點我")', company='@惡意企業',
+                                phone='+886 2 1234', email='-x@example.com', estimated_value=-5)
+        body = self.download(format='csv').decode('utf-8-sig')
+        row = list(csv.reader(io.StringIO(body)))[1]
+        self.assertEqual(row[1:5], ["'@惡意企業", '\'=HYPERLINK("http://evil.example","點我")', "'-x@example.com", "'+886 2 1234"])
+        self.assertEqual(row[6], '-5.00')
+
+    @skipUnless(exports.Workbook is not None, 'openpyxl not installed')
+    def test_xlsx(self):
+        self.assertEqual(self.download(format='xlsx')[:2], b'PK')
+
+    def test_unknown_format_redirects(self):
+        response = self.client.get(self.url, {'format': 'pdf'})
+        self.assertEqual(response.status_code, 302)
+
+
+class CustomerImportTests(TestCase):
+    """批量匯入：自然鍵 upsert、業務以帳號或員工編號解析、錯誤列略過且不中斷整批"""
+
+    def setUp(self):
+        self.rep = User.objects.create_user(username='rep', password='x', role='CRM', employee_id='EMP321')
+        Customer.objects.create(name='王大明', company='宏達科技 (01)', stage='LEAD', estimated_value=100)
+
+    def run_import(self, text, batch_size=2):
+        return CustomerImporter(batch_size=batch_size).run(read_rows(io.BytesIO(text.encode('utf-8-sig')), 'a.csv'))
+
+    def test_upsert_and_error_report(self):
+        result = self.run_import(
+            '所屬企業,客戶姓名,聯繫郵箱,開發階段,預估價值,負責業務\n'
+            '宏達科技 (01),王大明,wang@htc.com,成功結案,"1,500",rep\n'
+            '富邦媒體 (02),李小龍,,PROPOSAL,300,EMP321\n'
+            ',無企業,,,,\n'
+            '國泰顧問 (03),張華,not-an-email,LEAD,abc,nobody\n'
+            '富邦媒體 (02),李小龍,lee@fubon.com,NEGOTIATION,400,\n'
+        )
+        self.assertEqual((result.created, result.updated, result.skipped), (1, 1, 2))
+        self.assertEqual([line for line, _message in result.errors], [4, 5])
+        self.assertIn('找不到負責業務：nobody', result.errors[1][1])
+
+        updated = Customer.objects.get(company='宏達科技 (01)')
+        self.assertEqual((updated.stage, updated.estimated_value, updated.assigned_to), ('WON', 1500, self.rep))
+        created = Customer.objects.get(company='富邦媒體 (02)')
+        self.assertEqual((created.stage, created.email, created.assigned_to), ('NEGOTIATION', 'lee@fubon.com', None))
+        self.assertEqual(PipelineRollup.objects.drift(), [])
+        self.assertEqual(list(customer_search.search(Customer.objects.all(), '富邦')), [created])
+
+    def test_file_without_email_keeps_search_document(self):
+        customer = Customer.objects.get(company='宏達科技 (01)')
+        customer.email = 'wang@htc.com'
+        customer.save()
+        result = self.run_import('所屬企業,客戶姓名,開發階段\n宏達科技 (01),王大明,PROPOSAL\n')
+        self.assertEqual((result.created, result.updated), (0, 1))
+
+        customer.refresh_from_db()
+        self.assertEqual((customer.stage, customer.email), ('PROPOSAL', 'wang@htc.com'))
+        self.assertEqual(list(customer_search.search(Customer.objects.all(), 'wang@htc.com')), [customer])
+
+    def test_natural_key_is_unique(self):
+        # 併發匯入或後台同時新增時由資料庫擋下重複客戶 (PostgreSQL 匯入以 ON CONFLICT 合併)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Customer.objects.create(name='王大明', company='宏達科技 (01)')
+        self.assertEqual(PipelineRollup.objects.drift(), [])
+
+    def test_export_round_trip(self):
+        Customer.objects.update(phone='+886 2 1234')
+        exported = b''.join(exports.stream_csv(Customer.objects.all())).decode('utf-8')
+        result = self.run_import(exported.lstrip('\ufeff'))
+        self.assertEqual((result.created, result.updated, result.skipped), (0, 1, 0))
+        self.assertEqual(Customer.objects.get().phone, '+886 2 1234')
 
-# Create your tests here.
+    def test_admin_import(self):
+        admin = User.objects.create_superuser(username='boss', password='x', email='boss@example.com')
+        self.client.force_login(admin)
+        upload = SimpleUploadedFile('customers.csv', 'company,name,stage\n遠東物流 (09),趙敏,LOST\n,,\n宏達,,\n'.encode())
+        response = self.client.post(reverse('admin:crm_customer_import'), {'file': upload})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['result'].created, 1)
+        self.assertEqual(response.context['shown_errors'][0][0], 4)
+        report = self.client.get(response.context['error_report_url'])
+        self.assertIn('客戶姓名不可空白', report.content.decode())
@@ -1,10 +1,12 @@
+from decimal import Decimal
+
 from django.views.generic import TemplateView
-from django.db.models import Sum, Count
-from django.http import JsonResponse
 from django.contrib.admin.views.decorators import staff_member_required
 from django.utils.decorators import method_decorator
 from django.utils.translation import gettext_lazy as _
-from .models import Customer
+from core.cache import versioned_json_response
+from .models import PipelineRollup
+from .signals import PIPELINE_CACHE_NAMESPACE
 
 # 1. 數據看板頁面渲染
 @method_decorator(staff_member_required, name='dispatch')
@@ -17,27 +19,23 @@ class CRMDashboardView(TemplateView):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         
-        # 取得所有客戶數據進行匯總
-        queryset = Customer.objects.all()
-        stats = queryset.aggregate(
-            total_val=Sum('estimated_value'),
-            count=Count('id')
-        )
-        
+        # 從管線統計表讀取匯總 (不掃描 Customer 全表)
+        summary = PipelineRollup.objects.summary()
+
         # 排除已結案與流失的作為「活躍商機」
-        active_deals = queryset.exclude(stage__in=['WON', 'LOST']).count()
+        active_deals = summary['active']
 
         context.update({
             "title": _("CRM 數據戰情室"),
             "cards": [
                 {
                     "title": _("總客戶數"),
-                    "value": f"{stats['count'] or 0:,}",
+                    "value": f"{summary['count']:,}",
                     "icon": "groups",
                 },
                 {
                     "title": _("預估總案量"),
-                    "value": f"${(stats['total_val'] or 0):,.0f}",
+                    "value": f"${summary['total']:,.0f}",
                     "icon": "payments",
                 },
                 {
@@ -54,7 +52,13 @@ class CRMDashboardView(TemplateView):
 def crm_stats_api(request):
     """
     提供給前端 Chart.js 使用的格式化 JSON 數據
+    以管線統計版本號作為 ETag 並快取序列化結果，前端輪詢時數據未變即回 304
     """
+    return versioned_json_response(request, PIPELINE_CACHE_NAMESPACE, build_stats_payload)
+
+
+def build_stats_payload():
+    """計算 crm_stats_api 的回應內容 (僅在快取未命中時執行)"""
     # 💡 核心修正：手動定義映射表，確保與資料庫中的大寫 Key 完全匹配
     STAGE_DISPLAY_MAP = {
         'LEAD': '潛在客戶',
@@ -67,14 +71,8 @@ def crm_stats_api(request):
     # 💡 定義圖表顯示的邏輯順序（由淺入深）
     SORT_ORDER = ['LEAD', 'NEGOTIATION', 'PROPOSAL', 'WON', 'LOST']
     
-    # 從資料庫抓取原始聚合數據
-    raw_stats = Customer.objects.values('stage').annotate(
-        count=Count('id'),
-        total_value=Sum('estimated_value')
-    )
-    
-    # 將查詢結果轉為字典以利查找：{ 'WON': {'count': 5, ...}, ... }
-    data_map = {item['stage']: item for item in raw_stats}
+    # 從管線統計表取得各階段匯總：{ 'WON': {'count': 5, 'total': ...}, ... }
+    data_map = PipelineRollup.objects.summary()['stages']
 
     labels, counts, values = [], [], []
 
@@ -84,13 +82,14 @@ def crm_stats_api(request):
         labels.append(STAGE_DISPLAY_MAP.get(key, key))
         
         # 取得統計數值，若該階段無資料則補 0
-        data = data_map.get(key, {'count': 0, 'total_value': 0})
+        data = data_map.get(key, {'count': 0, 'total': 0})
         counts.append(data['count'])
-        values.append(float(data['total_value'] or 0))
+        values.append(data['total'] or Decimal('0'))  # 以字串輸出，不經 float 失去精度
 
-    return JsonResponse({
+    return {
         "status": "success",
+        "stages": SORT_ORDER,  # 與 labels 對應的階段代碼，前端依此套用即時事件的增量
         "labels": labels,
         "counts": counts,
         "values": values
-    })
\ No newline at end of file
+    }
\ No newline at end of file
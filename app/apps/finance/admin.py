@@ -1,15 +1,29 @@
+import logging
+
 from django.contrib import admin
+from django.db.models import Count, Sum
 from django.utils.translation import gettext_lazy as _
 from unfold.admin import ModelAdmin
 from unfold.decorators import display
-from .models import Transaction
+from core.pagination import EstimatedCountMixin, KeysetPaginationMixin
+from .models import EXPENSE, INCOME, BalanceCheckpoint, CashFlowDaily, Transaction, summarize
+
+logger = logging.getLogger(__name__)
+
+# 可由 CashFlowDaily 直接回答的篩選參數 (分類、日期區間)，其他條件需回到 Transaction 表彙總
+ROLLUP_FILTER_PARAMS = {
+    'category__exact': 'category',
+    'date__gte': 'date__gte',
+    'date__lt': 'date__lt',
+}
 
 @admin.register(Transaction)
-class TransactionAdmin(ModelAdmin):
+class TransactionAdmin(KeysetPaginationMixin, EstimatedCountMixin, ModelAdmin):
     # 1. 列表顯示優化
     list_display = (
         'display_header',      # 標題 + 分類
         'display_amount',      # 金額 (帶顏色)
+        'display_balance',     # 入帳後累計餘額
         'get_category_label',  # 類別 (標籤)
         'date', 
         'created_by'
@@ -21,6 +35,7 @@ class TransactionAdmin(ModelAdmin):
     show_full_result_count = False  # 大數據優化：不跑 COUNT(*) SQL，大幅提升翻頁速度
     
     # 💡 3. 穩定排序：分頁系統必備，確保翻頁時資料一致
+    # 同時作為 keyset 分頁的游標欄位，由 (-date, -id) 複合索引支撐
     ordering = ('-date', '-id')
     
     # 4. 佈局與過濾器優化
@@ -31,6 +46,9 @@ class TransactionAdmin(ModelAdmin):
     
     # 預防 N+1 查詢
     list_select_related = ('created_by',)
+
+    # 列表上方的收支摘要卡片
+    change_list_template = "admin/finance/transaction/change_list.html"
     
     # 5. 自動關聯當前使用者
     def save_model(self, request, obj, form, change):
@@ -50,6 +68,11 @@ class TransactionAdmin(ModelAdmin):
         formatted_amount = f"{instance.amount:+,.2f}"
         return formatted_amount, color
 
+    @display(description=_("累計餘額"))
+    def display_balance(self, instance):
+        balance = getattr(instance, 'running_balance', None)
+        return "-" if balance is None else f"{balance:,.2f}"
+
     @display(description=_("收支類型"), label=True)
     def get_category_label(self, instance):
         colors = {
@@ -59,10 +82,65 @@ class TransactionAdmin(ModelAdmin):
         }
         return instance.get_category_display(), colors.get(instance.category, 'primary')
 
-    # 6. 底部摘要統計
-    def get_list_display_summary(self, request, queryset):
-        from django.db.models import Sum
-        total = queryset.aggregate(Sum('amount'))['amount__sum'] or 0
+    # 6. 收支摘要統計 (隨目前篩選條件連動)
+    def changelist_view(self, request, extra_context=None):
+        response = super().changelist_view(request, extra_context=extra_context)
+
+        # 沿用父類已建立的 ChangeList，重導等非列表回應不含 cl，原樣回傳
+        context = getattr(response, 'context_data', None)
+        if context and 'cl' in context:
+            self.attach_running_balances(context['cl'].result_list)
+            try:
+                context.update(self.get_cashflow_context(context['cl']))
+            except Exception as e:
+                logger.error(f"Finance Summary Data Error: {str(e)}", exc_info=True)
+        return response
+
+    def attach_running_balances(self, result_list):
+        """整頁一次計算累計餘額 (月結檢查點 + 月內視窗函式)，欄位渲染時不再查詢"""
+        balances = BalanceCheckpoint.objects.running_balances(result_list)
+        for obj in result_list:
+            obj.running_balance = balances.get(obj.pk)
+
+    def get_cashflow_context(self, cl):
+        """
+        只有分類 / 日期區間篩選時，由 CashFlowDaily 日統計表彙總 (成本只與天數 x 分類數相關)；
+        有關鍵字搜尋或其他篩選條件時，才回到 Transaction 表依篩選結果彙總。
+        """
+        lookups = self.get_rollup_lookups(cl)
+        if lookups is not None:
+            # 已封存 (分割區已卸離) 期間的交易不在列表中，統計表也需排除，兩種來源的合計才一致
+            totals = CashFlowDaily.objects.live().filter(**lookups).totals()
+            source = 'rollup'
+        else:
+            totals = summarize(cl.queryset.order_by().aggregate(
+                income_count=Count('id', filter=INCOME),
+                income=Sum('amount', filter=INCOME),
+                expense_count=Count('id', filter=EXPENSE),
+                expense=Sum('amount', filter=EXPENSE),
+            ))
+            totals['expense'] = -totals['expense']
+            totals['net'] = totals['income'] - totals['expense']
+            source = 'table'
+
         return {
-            'display_amount': f"本頁/篩選總計: {total:+,.2f}"
-        }
\ No newline at end of file
+            'cashflow_source': source,
+            'cashflow_cards': [
+                {"title": _("篩選收入"), "value": f"{totals['income']:,.2f}", "icon": "trending_up"},
+                {"title": _("篩選支出"), "value": f"{totals['expense']:,.2f}", "icon": "trending_down"},
+                {"title": _("淨現金流"), "value": f"{totals['net']:+,.2f}", "icon": "account_balance"},
+                {"title": _("交易筆數"), "value": f"{totals['count']:,}", "icon": "receipt_long"},
+            ],
+        }
+
+    def get_rollup_lookups(self, cl):
+        """把目前的篩選參數轉成 CashFlowDaily 的查詢條件；無法由統計表回答時回傳 None"""
+        if cl.query or not set(cl.filter_params) <= set(ROLLUP_FILTER_PARAMS):
+            return None
+        lookups = {}
+        for param, value in cl.filter_params.items():
+            # Django 5 起篩選參數值為串列，取最後一個 (與 QueryDict.__getitem__ 相同)
+            if isinstance(value, list):
+                value = value[-1]
+            lookups[ROLLUP_FILTER_PARAMS[param]] = value
+        return lookups
@@ -3,4 +3,8 @@ from django.apps import AppConfig
 class FinanceConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.finance'  # 必須加上 apps. 前綴
-    verbose_name = '財務管理部'
\ No newline at end of file
+    verbose_name = '財務管理部'
+
+    def ready(self):
+        # 註冊現金流統計相關的 signal receivers
+        from . import receivers  # noqa: F401
@@ -0,0 +1,88 @@
+from datetime import date
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from apps.finance import partitions
+from apps.finance.models import ArchivedPartition
+
+
+class Command(BaseCommand):
+    help = "財務流水帳分割維運：轉換為分割表、建立未來分割區、卸離並封存過期分割區、查詢封存檔"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'action',
+            choices=['status', 'convert', 'create', 'detach', 'archive', 'audit'],
+            help="status 顯示現況 / convert 轉為分割表 / create 建立未來分割區 / "
+                 "detach 卸離過期分割區 / archive 匯出 Parquet / audit 查詢封存檔",
+        )
+        parser.add_argument(
+            '--interval', choices=partitions.INTERVALS, default=settings.FINANCE_PARTITION_INTERVAL,
+            help="分割區間 (預設 FINANCE_PARTITION_INTERVAL)",
+        )
+        parser.add_argument(
+            '--ahead', type=int, default=settings.FINANCE_PARTITION_AHEAD,
+            help="預先建立未來幾個區間的分割區",
+        )
+        parser.add_argument(
+            '--retention-months', type=int, default=settings.FINANCE_RETENTION_MONTHS,
+            help="detach：保留最近幾個月的分割區，更早的一律卸離",
+        )
+        parser.add_argument('--drop', action='store_true', help="archive：匯出並驗證筆數後刪除資料表")
+        parser.add_argument('--start', type=date.fromisoformat, help="audit：起始日 (YYYY-MM-DD)")
+        parser.add_argument('--end', type=date.fromisoformat, help="audit：結束日 (含)")
+        parser.add_argument('--category', action='append', help="audit：分類，可重複指定")
+        parser.add_argument('--limit', type=int, default=20, help="audit：最多列出幾筆明細")
+
+    def handle(self, *args, **options):
+        try:
+            getattr(self, f"handle_{options['action']}")(options)
+        except partitions.PartitionError as exc:
+            raise CommandError(f"❌ {exc}")
+
+    def handle_status(self, options):
+        if not partitions.is_partitioned():
+            self.stdout.write(self.style.WARNING(f"⚠️ {partitions.PARENT} 尚未分割，請執行 partition_finance convert"))
+        else:
+            for partition in partitions.list_partitions():
+                span = "DEFAULT" if partition['start'] is None else f"{partition['start']} ~ {partition['end']}"
+                self.stdout.write(f"  {partition['name']}: {span}，約 {partition['rows']:,} 筆")
+        for archive in ArchivedPartition.objects.all():
+            state = "已刪除資料表" if archive.dropped else ("已封存" if archive.archive_path else "已卸離，待封存")
+            self.stdout.write(f"  🗄️ {archive}: {archive.row_count:,} 筆，淨額 {archive.net_amount:,.2f}，{state}")
+
+    def handle_convert(self, options):
+        self.stdout.write(self.style.WARNING(f"🔄 正在把 {partitions.PARENT} 轉為依 {options['interval']} 分割的資料表 (期間鎖表)..."))
+        partitions.convert(options['interval'], ahead=options['ahead'])
+        self.stdout.write(self.style.SUCCESS(f"✅ 轉換完成，共 {len(partitions.list_partitions())} 個分割區"))
+
+    def handle_create(self, options):
+        created = partitions.create_partitions(options['interval'], options['ahead'])
+        for name in created:
+            self.stdout.write(f"  + {name}")
+        self.stdout.write(self.style.SUCCESS(f"✅ 新增 {len(created)} 個分割區"))
+
+    def handle_detach(self, options):
+        before = partitions.months_before(timezone.localdate(), options['retention_months'])
+        detached = partitions.detach_partitions(before)
+        for archive in detached:
+            self.stdout.write(f"  - {archive.name}: {archive.row_count:,} 筆")
+        self.stdout.write(self.style.SUCCESS(f"✅ 卸離 {len(detached)} 個 {before} 以前的分割區，請接著執行 archive"))
+
+    def handle_archive(self, options):
+        pending = ArchivedPartition.objects.filter(dropped=False)
+        if not options['drop']:
+            pending = pending.filter(archived_at__isnull=True)
+        for archive in pending:
+            path = partitions.archive_partition(archive, drop=options['drop'])
+            self.stdout.write(f"  🗄️ {archive.name} → {path}")
+        self.stdout.write(self.style.SUCCESS("✅ 封存完成"))
+
+    def handle_audit(self, options):
+        table = partitions.read_archive(options['start'], options['end'], options['category'])
+        amounts = table.column('amount').to_pylist()
+        self.stdout.write(f"🔍 封存檔共 {table.num_rows:,} 筆，淨額 {sum(amounts, 0):,.2f}")
+        for row in table.slice(0, options['limit']).to_pylist():
+            self.stdout.write(f"  [{row['date']}] #{row['id']} {row['category']} {row['title']} {row['amount']:+,.2f}")
@@ -0,0 +1,53 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.finance.models import BalanceCheckpoint, CashFlowDaily
+
+
+class Command(BaseCommand):
+    help = "檢查或重建財務現金流統計表 (CashFlowDaily) 與月結餘額檢查點 (BalanceCheckpoint)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rebuild',
+            action='store_true',
+            help="清空並依 Transaction 表重新計算全部分組與檢查點",
+        )
+        parser.add_argument(
+            '--close-months',
+            action='store_true',
+            help="為已結束但尚無檢查點的月份建立餘額檢查點 (建議每月初排程執行)",
+        )
+
+    def handle(self, *args, **options):
+        if options['rebuild']:
+            self.stdout.write(self.style.WARNING("🔄 正在重建現金流統計表..."))
+            CashFlowDaily.objects.rebuild()
+            BalanceCheckpoint.objects.rebuild()
+            self.stdout.write(self.style.SUCCESS(
+                f"✅ 重建完成，共 {CashFlowDaily.objects.count()} 個分組、{BalanceCheckpoint.objects.count()} 個月結檢查點"
+            ))
+            return
+
+        if options['close_months']:
+            created = BalanceCheckpoint.objects.close_months()
+            self.stdout.write(self.style.SUCCESS(f"✅ 新增 {created} 個月結檢查點"))
+            return
+
+        self.stdout.write("🔍 正在比對統計表與 Transaction 實際數據...")
+        mismatches = CashFlowDaily.objects.drift()
+        checkpoint_mismatches = BalanceCheckpoint.objects.drift()
+        if not mismatches and not checkpoint_mismatches:
+            self.stdout.write(self.style.SUCCESS("✅ 統計表與實際數據一致"))
+            return
+
+        for (date, category), expected, stored in mismatches:
+            self.stdout.write(
+                f"  {date} / {category}: 預期收入 {expected[0]} 筆 ${expected[1]:,.2f}、支出 {expected[2]} 筆 ${expected[3]:,.2f}，"
+                f"統計表收入 {stored[0]} 筆 ${stored[1]:,.2f}、支出 {stored[2]} 筆 ${stored[3]:,.2f}"
+            )
+        for month, expected, stored in checkpoint_mismatches:
+            self.stdout.write(f"  {month:%Y-%m} 月底餘額: 預期 ${expected:,.2f}，檢查點 ${stored:,.2f}")
+        # 以非零結束碼回報，方便排程監控
+        raise CommandError(
+            f"❌ 發現 {len(mismatches)} 個分組、{len(checkpoint_mismatches)} 個檢查點數據漂移，請執行 rollup_finance --rebuild"
+        )
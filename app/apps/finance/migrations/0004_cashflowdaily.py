@@ -0,0 +1,60 @@
+# Generated by Django 6.0.1 on 2026-10-18 10:34
+
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+
+
+def build_cashflow_daily(apps, schema_editor):
+    """依既有交易資料建立初始統計"""
+    Transaction = apps.get_model('finance', 'Transaction')
+    CashFlowDaily = apps.get_model('finance', 'CashFlowDaily')
+    income, expense = Q(amount__gte=0), Q(amount__lt=0)
+    rows = Transaction.objects.order_by().values('date', 'category').annotate(
+        income_count=Count('id', filter=income),
+        income_total=Sum('amount', filter=income),
+        expense_count=Count('id', filter=expense),
+        expense_total=Sum('amount', filter=expense),
+    )
+    CashFlowDaily.objects.bulk_create(
+        (
+            CashFlowDaily(
+                date=row['date'],
+                category=row['category'],
+                income_count=row['income_count'],
+                income_total=row['income_total'] or 0,
+                expense_count=row['expense_count'],
+                expense_total=-(row['expense_total'] or 0),
+            )
+            for row in rows
+        ),
+        batch_size=5000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0003_transaction_keyset_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CashFlowDaily',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='交易日期')),
+                ('category', models.CharField(choices=[('SALARY', '薪資支出'), ('EQUIPMENT', '設備採購'), ('REVENUE', '專案收入'), ('OFFICE', '行政雜支')], max_length=20, verbose_name='費用分類')),
+                ('income_count', models.BigIntegerField(default=0, verbose_name='收入筆數')),
+                ('income_total', models.DecimalField(decimal_places=2, default=0, max_digits=20, verbose_name='收入金額')),
+                ('expense_count', models.BigIntegerField(default=0, verbose_name='支出筆數')),
+                ('expense_total', models.DecimalField(decimal_places=2, default=0, help_text='以正數表示', max_digits=20, verbose_name='支出金額')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='最後更新時間')),
+            ],
+            options={
+                'verbose_name': '現金流統計',
+                'verbose_name_plural': '現金流統計',
+                'constraints': [models.UniqueConstraint(fields=('date', 'category'), name='finance_cashflow_daily_key')],
+            },
+        ),
+        migrations.RunPython(build_cashflow_daily, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 6.0.1 on 2026-10-18 10:37
+
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import Sum
+from django.db.models.functions import TruncMonth
+
+
+def build_checkpoints(apps, schema_editor):
+    """為本月以前已結束的月份建立初始餘額檢查點 (由現金流日統計推算)"""
+    CashFlowDaily = apps.get_model('finance', 'CashFlowDaily')
+    BalanceCheckpoint = apps.get_model('finance', 'BalanceCheckpoint')
+    rows = CashFlowDaily.objects.order_by().annotate(month=TruncMonth('date')).values('month').annotate(
+        income=Sum('income_total'),
+        expense=Sum('expense_total'),
+    )
+    nets = {row['month']: (row['income'] or 0) - (row['expense'] or 0) for row in rows}
+    if not nets:
+        return
+
+    until = date.today().replace(day=1)
+    month, balance, checkpoints = min(nets), Decimal('0'), []
+    while month < until:
+        balance += nets.get(month, 0)
+        checkpoints.append(BalanceCheckpoint(month=month, balance=balance))
+        month = (month.replace(day=28) + timedelta(days=4)).replace(day=1)
+    BalanceCheckpoint.objects.bulk_create(checkpoints)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0004_cashflowdaily'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BalanceCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(unique=True, verbose_name='月份')),
+                ('balance', models.DecimalField(decimal_places=2, default=0, max_digits=20, verbose_name='月底餘額')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='最後更新時間')),
+            ],
+            options={
+                'verbose_name': '餘額檢查點',
+                'verbose_name_plural': '餘額檢查點',
+                'ordering': ['-month'],
+            },
+        ),
+        migrations.RunPython(build_checkpoints, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 6.0.1 on 2026-10-18 10:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0005_balancecheckpoint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedPartition',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=63, unique=True, verbose_name='分割區名稱')),
+                ('start', models.DateField(verbose_name='起始日')),
+                ('end', models.DateField(help_text='不含當天', verbose_name='結束日')),
+                ('row_count', models.BigIntegerField(default=0, verbose_name='交易筆數')),
+                ('net_amount', models.DecimalField(decimal_places=2, default=0, max_digits=20, verbose_name='淨額')),
+                ('archive_path', models.CharField(blank=True, max_length=500, verbose_name='封存檔案')),
+                ('dropped', models.BooleanField(default=False, verbose_name='已刪除資料表')),
+                ('detached_at', models.DateTimeField(auto_now_add=True, verbose_name='卸離時間')),
+                ('archived_at', models.DateTimeField(blank=True, null=True, verbose_name='封存時間')),
+            ],
+            options={
+                'verbose_name': '封存分割區',
+                'verbose_name_plural': '封存分割區',
+                'ordering': ['start'],
+            },
+        ),
+    ]
@@ -1,7 +1,157 @@
-from django.db import models
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import connections, models, transaction, IntegrityError
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import Trunc, TruncMonth
 from django.conf import settings
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
+from .signals import cashflow_changed
+
+# 會影響現金流統計 (CashFlowDaily) 的欄位
+ROLLUP_FIELDS = ('date', 'category', 'amount')
+
+CENT = Decimal('0.01')
+INCOME = Q(amount__gte=0)
+EXPENSE = Q(amount__lt=0)
+
+
+class CashFlowDelta(defaultdict):
+    """
+    現金流統計的增量累加器：{(date, category): [收入筆數, 收入金額, 支出筆數, 支出金額]}
+    金額 >= 0 為收入；支出金額以正數累計。
+    """
+    def __init__(self):
+        super().__init__(lambda: [0, Decimal('0'), 0, Decimal('0')])
+
+    def add(self, date, category, amount, sign=1):
+        entry = self[(date, category)]
+        amount = Decimal(str(amount or 0))
+        if amount >= 0:
+            entry[0] += sign
+            entry[1] += sign * amount
+        else:
+            entry[2] += sign
+            entry[3] -= sign * amount
+
+    def remove(self, date, category, amount):
+        self.add(date, category, amount, sign=-1)
+
+    def add_groups(self, rows, sign=1):
+        """累加 _cashflow_groups() 的分組結果"""
+        for row in rows:
+            entry = self[(row['date'], row['category'])]
+            entry[0] += sign * row['income_count']
+            entry[1] += sign * (row['income_total'] or 0)
+            entry[2] += sign * row['expense_count']
+            entry[3] -= sign * (row['expense_total'] or 0)
+
+
+def month_start(day):
+    return day.replace(day=1)
+
+
+def next_month(day):
+    return (day.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def apply_ledger_deltas(deltas):
+    """同一份增量同時更新現金流日統計，以及交易月份之後的餘額檢查點"""
+    CashFlowDaily.objects.apply_deltas(deltas)
+    BalanceCheckpoint.objects.shift(deltas)
+
+
+def live_transactions(using=None):
+    """仍在線上 (未封存) 的交易；分割區卸離後若有補登到已封存期間的交易，也一併排除以免統計重複"""
+    queryset = Transaction._base_manager.using(using)
+    archived = ArchivedPartition.objects.using(using).date_filter()
+    return queryset if archived is None else queryset.exclude(archived)
+
+
+def lock_rows(queryset):
+    """在目前交易中以 SELECT ... FOR UPDATE 鎖定查詢到的列 (只讀取主鍵，分批串流)"""
+    for _pk in queryset.select_for_update().values_list('pk', flat=True).iterator(chunk_size=5000):
+        pass
+
+
+def cashflow_groups(queryset):
+    """依 (日期, 分類) 分組的收入 / 支出筆數與金額 (支出金額為負數加總)"""
+    return queryset.order_by().values('date', 'category').annotate(
+        income_count=Count('id', filter=INCOME),
+        income_total=Sum('amount', filter=INCOME),
+        expense_count=Count('id', filter=EXPENSE),
+        expense_total=Sum('amount', filter=EXPENSE),
+    )
+
+
+class TransactionQuerySet(models.QuerySet):
+    """
+    所有批量寫入路徑 (bulk_create / update / delete，bulk_update 經由 update) 都會同步維護 CashFlowDaily，
+    避免繞過 Model.save() 時統計表失準。
+    """
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        with transaction.atomic(using=self.db):
+            created = super().bulk_create(objs, *args, **kwargs)
+            if kwargs.get('ignore_conflicts') or kwargs.get('update_conflicts'):
+                # 衝突模式下無法得知哪些列實際寫入，直接重建最保險
+                CashFlowDaily.objects.rebuild()
+                BalanceCheckpoint.objects.rebuild()
+            else:
+                deltas = CashFlowDelta()
+                for obj in created:
+                    deltas.add(obj.date, obj.category, obj.amount)
+                apply_ledger_deltas(deltas)
+        return created
+
+    def update(self, **kwargs):
+        if self.query.is_sliced or not set(kwargs) & set(ROLLUP_FIELDS):
+            return super().update(**kwargs)
+
+        with transaction.atomic(using=self.db):
+            # 💡 先以 SELECT ... FOR UPDATE 鎖定受影響的列，更新前後兩次分組之間其他交易無法修改或刪除它們；
+            # 更新本身與前後分組都針對同一組已鎖定的列 (支援 F() 與 Case 等表達式，例如 bulk_update)
+            affected = self._rollup_targets(kwargs)
+            lock_rows(affected)
+            deltas = CashFlowDelta()
+            deltas.add_groups(cashflow_groups(affected), sign=-1)
+            rows = super(TransactionQuerySet, affected).update(**kwargs)
+            deltas.add_groups(cashflow_groups(affected))
+            apply_ledger_deltas(deltas)
+        return rows
+    update.alters_data = True
+
+    def _rollup_targets(self, fields):
+        """
+        update() 影響的列，以主鍵子查詢表示 (不把主鍵載入 Python，也不受資料庫參數數量上限影響)。
+        💡 篩選條件若引用了本次更新的欄位 (例如 filter(category=A).update(category=B))，
+        子查詢在更新後會選到另一組列，此時才先取出主鍵
+        """
+        table = self.model._meta.db_table
+        filtered = {col.target.name for col in self.query.where.get_group_by_cols() if col.alias == table}
+        targets = self.values('pk')
+        if filtered & set(fields):
+            targets = list(targets.values_list('pk', flat=True))
+        return type(self)(self.model, using=self.db).filter(pk__in=targets)
+
+    def delete(self):
+        if self.query.is_sliced or self.query.distinct or self.query.distinct_fields:
+            # 交由 Django 拋出原本的錯誤訊息
+            return super().delete()
+        with transaction.atomic(using=self.db):
+            deltas = CashFlowDelta()
+            deltas.add_groups(cashflow_groups(self), sign=-1)
+            result = super().delete()
+            apply_ledger_deltas(deltas)
+        return result
+    delete.alters_data = True
+    delete.queryset_only = True
+
+
 class Transaction(models.Model):
     """
     財務交易流水帳模型
@@ -47,6 +197,8 @@ class Transaction(models.Model):
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="系統建立時間", null=True)
     updated_at = models.DateTimeField(auto_now=True, verbose_name="最後更新時間", null=True)
 
+    objects = TransactionQuerySet.as_manager()
+
     class Meta:
         verbose_name = "財務單據"
         verbose_name_plural = "財務流水帳"
@@ -54,6 +206,8 @@ class Transaction(models.Model):
         # 建立聯合索引，優化按日期與分類的篩選速度
         indexes = [
             models.Index(fields=['date', 'category']),
+            # 對應 Admin 排序 (-date, -id)，供 keyset 分頁直接做索引範圍掃描
+            models.Index(fields=['-date', '-id']),
         ]
 
     def __str__(self):
@@ -63,4 +217,405 @@ class Transaction(models.Model):
     @property
     def is_income(self):
         """判斷是否為收入，方便前端渲染顏色"""
-        return self.amount > 0
\ No newline at end of file
+        return self.amount > 0
+
+    # --- 現金流統計 (CashFlowDaily) 增量維護 ---
+
+    def _locked_rollup_state(self):
+        """
+        在目前交易中鎖定並讀取資料庫裡的統計欄位值 (尚無主鍵或該列已不存在時為 None)。
+        💡 不能沿用讀取實例當下的值：同一筆交易的其他實例或請求可能已先修改，鎖定後重新讀取才是這次寫入覆蓋的舊值
+        """
+        if self.pk is None:
+            return None
+        return type(self)._base_manager.select_for_update().filter(pk=self.pk).values_list(*ROLLUP_FIELDS).first()
+
+    def _saved_rollup_fields(self, update_fields):
+        """本次 save() 實際寫入的統計欄位 (指定 update_fields 或以 only()/defer() 載入時只寫入部分欄位)"""
+        if update_fields is None:
+            update_fields = set(ROLLUP_FIELDS) - self.get_deferred_fields()
+        return [field for field in ROLLUP_FIELDS if field in set(update_fields)]
+
+    def save(self, *args, **kwargs):
+        saved = self._saved_rollup_fields(kwargs.get('update_fields'))
+        if not saved and not self._state.adding:
+            # 💡 未寫入任何統計欄位 (例如 save(update_fields=['title']))：統計不變
+            return super().save(*args, **kwargs)
+        with transaction.atomic():
+            previous = self._locked_rollup_state()
+            super().save(*args, **kwargs)
+            current = tuple(getattr(self, field) for field in ROLLUP_FIELDS) if previous is None else tuple(
+                # 未寫入的欄位沿用資料庫中的舊值，記憶體中未存檔的修改不計入統計
+                getattr(self, field) if field in saved else value
+                for field, value in zip(ROLLUP_FIELDS, previous)
+            )
+            deltas = CashFlowDelta()
+            if previous:
+                deltas.remove(*previous)
+            deltas.add(*current)
+            apply_ledger_deltas(deltas)
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            previous = self._locked_rollup_state()
+            result = super().delete(*args, **kwargs)
+            # 其他請求已先刪除該列時 (刪除 0 筆) 不再扣除
+            if previous and result[1].get(self._meta.label):
+                deltas = CashFlowDelta()
+                deltas.remove(*previous)
+                apply_ledger_deltas(deltas)
+        return result
+
+
+class CashFlowDailyQuerySet(models.QuerySet):
+
+    def apply_deltas(self, deltas):
+        """以 F() 原子遞增套用增量，不存在的分組才新建；交易提交後發出 cashflow_changed"""
+        changed = {}
+        for (date, category), (income_count, income_total, expense_count, expense_total) in deltas.items():
+            if not (income_count or income_total or expense_count or expense_total):
+                continue
+            changed[(date, category)] = (income_count, income_total, expense_count, expense_total)
+            lookup = self.filter(date=date, category=category)
+            changes = {
+                'income_count': F('income_count') + income_count,
+                'income_total': F('income_total') + income_total,
+                'expense_count': F('expense_count') + expense_count,
+                'expense_total': F('expense_total') + expense_total,
+            }
+            if lookup.update(**changes):
+                continue
+            try:
+                with transaction.atomic(using=self.db):
+                    self.create(
+                        date=date, category=category,
+                        income_count=income_count, income_total=income_total,
+                        expense_count=expense_count, expense_total=expense_total,
+                    )
+            except IntegrityError:
+                # 併發情境下另一個請求已先建立該分組
+                lookup.update(**changes)
+        if changed:
+            self._notify(changed)
+
+    def _notify(self, deltas):
+        transaction.on_commit(
+            lambda: cashflow_changed.send(sender=CashFlowDaily, deltas=deltas),
+            using=self.db,
+        )
+
+    def expected(self):
+        """直接掃描 Transaction 表得到的正確統計：{(date, category): (收入筆數, 收入金額, 支出筆數, 支出金額)}"""
+        rows = cashflow_groups(live_transactions(self.db))
+        # SQLite 以浮點數加總 Decimal，大量資料時會有尾差，統一取到分位再比較
+        return {
+            (row['date'], row['category']): (
+                row['income_count'],
+                (row['income_total'] or Decimal('0')).quantize(CENT),
+                row['expense_count'],
+                -(row['expense_total'] or Decimal('0')).quantize(CENT),
+            )
+            for row in rows
+        }
+
+    def rebuild(self):
+        """清空後依 Transaction 表重新計算全部分組 (已封存期間的統計保留，不重算)"""
+        with transaction.atomic(using=self.db):
+            self.live().delete()
+            self.bulk_create(
+                (
+                    CashFlowDaily(
+                        date=date, category=category,
+                        income_count=income_count, income_total=income_total,
+                        expense_count=expense_count, expense_total=expense_total,
+                    )
+                    for (date, category), (income_count, income_total, expense_count, expense_total)
+                    in self.expected().items()
+                ),
+                batch_size=5000,
+            )
+            self._notify(None)
+
+    def drift(self):
+        """比對統計表與實際數據，回傳不一致的分組：[(key, 預期值, 統計表值), ...]"""
+        empty = (0, Decimal('0'), 0, Decimal('0'))
+        expected = self.expected()
+        stored = {
+            (row.date, row.category): (row.income_count, row.income_total, row.expense_count, row.expense_total)
+            for row in self.live()
+        }
+        mismatches = []
+        for key in sorted(set(expected) | set(stored)):
+            want = expected.get(key, empty)
+            have = stored.get(key, empty)
+            if want != have:
+                mismatches.append((key, want, have))
+        return mismatches
+
+    def live(self):
+        """排除已封存 (分割區已卸離) 期間的統計列；這些日期的交易已不在 Transaction 表中"""
+        archived = ArchivedPartition.objects.using(self.db).date_filter()
+        return self.all() if archived is None else self.exclude(archived)
+
+    def totals(self):
+        """目前篩選範圍的收支合計：{'income', 'expense', 'net', 'income_count', 'expense_count', 'count'}"""
+        row = self.aggregate(
+            income_count=Sum('income_count'),
+            income=Sum('income_total'),
+            expense_count=Sum('expense_count'),
+            expense=Sum('expense_total'),
+        )
+        return summarize(row)
+
+    def by_month(self):
+        """每月收支：[{'month', 'income', 'expense', 'net', ...}]，成本只與天數 x 分類數相關"""
+        rows = self.order_by().annotate(month=TruncMonth('date')).values('month').annotate(
+            income_count=Sum('income_count'),
+            income=Sum('income_total'),
+            expense_count=Sum('expense_count'),
+            expense=Sum('expense_total'),
+        ).order_by('month')
+        return [{'month': row['month'], **summarize(row)} for row in rows]
+
+    def series(self, bucket):
+        """
+        依時間區間 x 分類彙總：[{'bucket': 區間起始日, 'category', 'income', 'expense'}]
+        bucket 為 day / week / month / quarter；資料來源為日統計，不掃描 Transaction
+        """
+        rows = self.order_by().annotate(bucket=Trunc('date', bucket)).values('bucket', 'category').annotate(
+            income=Sum('income_total'),
+            expense=Sum('expense_total'),
+        )
+        return list(rows.order_by('bucket', 'category'))
+
+
+def summarize(row):
+    """把聚合結果 (可能為 None) 整理成收支合計"""
+    income = row['income'] or Decimal('0')
+    expense = row['expense'] or Decimal('0')
+    income_count = row['income_count'] or 0
+    expense_count = row['expense_count'] or 0
+    return {
+        'income': income,
+        'expense': expense,
+        'net': income - expense,
+        'income_count': income_count,
+        'expense_count': expense_count,
+        'count': income_count + expense_count,
+    }
+
+
+class CashFlowDaily(models.Model):
+    """
+    現金流日統計表 (依「交易日期 x 分類」分組)
+    於交易新增、修改、刪除時增量維護，列表摘要與財務看板不必每次全表掃描 Transaction；
+    月統計由日統計彙總 (by_month)。
+    """
+    date = models.DateField(verbose_name="交易日期")
+    category = models.CharField(max_length=20, choices=Transaction.Category.choices, verbose_name="費用分類")
+    income_count = models.BigIntegerField(default=0, verbose_name="收入筆數")
+    income_total = models.DecimalField(max_digits=20, decimal_places=2, default=0, verbose_name="收入金額")
+    expense_count = models.BigIntegerField(default=0, verbose_name="支出筆數")
+    expense_total = models.DecimalField(
+        max_digits=20, decimal_places=2, default=0, verbose_name="支出金額", help_text="以正數表示",
+    )
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="最後更新時間")
+
+    objects = CashFlowDailyQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = "現金流統計"
+        verbose_name_plural = "現金流統計"
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'category'], name='finance_cashflow_daily_key'),
+        ]
+
+    def __str__(self):
+        return f"{self.date} / {self.category}: +{self.income_total} -{self.expense_total}"
+
+
+class BalanceCheckpointQuerySet(models.QuerySet):
+    """
+    月結餘額檢查點：任一日期的餘額 = 前一個檢查點 + 檢查點之後到該日的淨額，
+    查詢成本只與「距離最近檢查點的天數」相關，不隨流水帳長度成長。
+    """
+
+    def shift(self, deltas):
+        """補登 / 修改 / 刪除交易後，把淨額增量加到交易月份 (含) 之後的所有檢查點"""
+        by_month = defaultdict(Decimal)
+        for (date, _category), (_income_count, income_total, _expense_count, expense_total) in deltas.items():
+            by_month[month_start(date)] += income_total - expense_total
+        # 由早到晚累加，同一批增量跨多個月份時每個檢查點只更新一次
+        running = Decimal('0')
+        months = sorted(month for month, net in by_month.items() if net)
+        for index, month in enumerate(months):
+            running += by_month[month]
+            later = self.filter(month__gte=month)
+            if index + 1 < len(months):
+                later = later.filter(month__lt=months[index + 1])
+            later.update(balance=F('balance') + running, updated_at=timezone.now())
+
+    def balance_before(self, day):
+        """day 當天開始前 (不含當天) 的累計餘額：最近的檢查點 + 之後的日統計淨額"""
+        checkpoint = self.filter(month__lt=month_start(day)).order_by('-month').first()
+        days = CashFlowDaily.objects.filter(date__lt=day)
+        balance = Decimal('0')
+        if checkpoint is not None:
+            days = days.filter(date__gte=next_month(checkpoint.month))
+            balance = checkpoint.balance
+        return balance + days.totals()['net']
+
+    def balance_as_of(self, day):
+        """day 當天結束時的餘額 (含當天所有交易)"""
+        return self.balance_before(day + timedelta(days=1))
+
+    def running_balances(self, transactions):
+        """
+        列表上每筆交易入帳後的累計餘額：{pk: balance}
+        以頁面最早月份的起始餘額 (檢查點) 為基準，月份範圍內再用視窗函式依 (date, id) 累加，
+        只掃描頁面涵蓋月份的交易，由 (date, category) 與 (-date, -id) 索引支撐。
+        """
+        transactions = list(transactions)
+        if not transactions:
+            return {}
+        start = month_start(min(obj.date for obj in transactions))
+        end = next_month(max(obj.date for obj in transactions))
+        opening = self.balance_before(start)
+
+        # 視窗函式需先在完整月份範圍內累加，再挑出頁面上的交易 (WHERE pk IN 會在視窗計算前套用，故以子查詢包一層)
+        connection = connections[self.db]
+        table = connection.ops.quote_name(Transaction._meta.db_table)
+        pks = [obj.pk for obj in transactions]
+        sql = (
+            f"SELECT id, running FROM ("
+            f"SELECT id, SUM(amount) OVER (ORDER BY date, id) AS running FROM {table} WHERE date >= %s AND date < %s"
+            f") ledger WHERE id IN ({', '.join(['%s'] * len(pks))})"
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [start, end, *pks])
+            rows = cursor.fetchall()
+        return {pk: (opening + Decimal(str(running))).quantize(CENT) for pk, running in rows}
+
+    def close_months(self, until=None):
+        """
+        為 until (預設今天) 之前已結束、尚無檢查點的月份建立檢查點，
+        由上一個檢查點加上該月的日統計淨額推算，不掃描 Transaction。
+        """
+        until = month_start(until or timezone.localdate())
+        last = self.order_by('-month').first()
+        if last is not None:
+            month, balance = next_month(last.month), last.balance
+        else:
+            first = CashFlowDaily.objects.order_by('date').first()
+            if first is None:
+                return 0
+            month, balance = month_start(first.date), Decimal('0')
+
+        checkpoints = []
+        nets = {
+            row['month']: row['net']
+            for row in CashFlowDaily.objects.filter(date__gte=month, date__lt=until).by_month()
+        }
+        while month < until:
+            balance += nets.get(month, Decimal('0'))
+            checkpoints.append(BalanceCheckpoint(month=month, balance=balance))
+            month = next_month(month)
+        self.bulk_create(checkpoints)
+        return len(checkpoints)
+
+    def expected(self):
+        """依 Transaction 表 (加上已封存分割區的淨額) 重新計算每個既有檢查點應有的餘額：{month: balance}"""
+        months = list(self.order_by('month').values_list('month', flat=True))
+        rows = (
+            live_transactions(self.db).order_by()
+            .annotate(month=TruncMonth('date')).values('month').annotate(net=Sum('amount'))
+        )
+        nets = defaultdict(Decimal)
+        for row in rows:
+            nets[row['month']] += row['net'] or Decimal('0')
+        for archive in ArchivedPartition.objects.using(self.db):
+            nets[month_start(archive.start)] += archive.net_amount
+        expected, balance, index = {}, Decimal('0'), 0
+        for month in sorted(nets):
+            while index < len(months) and months[index] < month:
+                expected[months[index]] = balance.quantize(CENT)
+                index += 1
+            balance += nets[month]
+        for month in months[index:]:
+            expected[month] = balance.quantize(CENT)
+        return expected
+
+    def rebuild(self):
+        """清空後依日統計重新建立所有已結束月份的檢查點"""
+        with transaction.atomic(using=self.db):
+            self.all().delete()
+            self.close_months()
+
+    def drift(self):
+        """比對檢查點與實際數據：[(month, 預期餘額, 檢查點餘額), ...]；已封存期間內的月份無從比對，略過"""
+        expected = self.expected()
+        archived = list(ArchivedPartition.objects.using(self.db).values_list('start', 'end'))
+        return [
+            (row.month, expected[row.month], row.balance)
+            for row in self.order_by('month')
+            if expected[row.month] != row.balance
+            and not any(start <= row.month < end for start, end in archived)
+        ]
+
+
+class BalanceCheckpoint(models.Model):
+    """
+    月結餘額檢查點：month 為月份第一天，balance 為該月結束時 (含當月全部交易) 的累計餘額
+    由 rollup_finance --close-months 排程建立；補登舊日期的交易時由 shift() 增量修正。
+    """
+    month = models.DateField(unique=True, verbose_name="月份")
+    balance = models.DecimalField(max_digits=20, decimal_places=2, default=0, verbose_name="月底餘額")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="最後更新時間")
+
+    objects = BalanceCheckpointQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = "餘額檢查點"
+        verbose_name_plural = "餘額檢查點"
+        ordering = ['-month']
+
+    def __str__(self):
+        return f"{self.month:%Y-%m}: {self.balance}"
+
+
+
+class ArchivedPartitionQuerySet(models.QuerySet):
+
+    def date_filter(self, field='date'):
+        """所有已封存期間的查詢條件 (Q)；尚未封存任何分割區時回傳 None"""
+        condition = None
+        for start, end in self.values_list('start', 'end'):
+            part = Q(**{f'{field}__gte': start, f'{field}__lt': end})
+            condition = part if condition is None else condition | part
+        return condition
+
+
+class ArchivedPartition(models.Model):
+    """
+    已從 finance_transaction 卸離的分割區 (PostgreSQL)
+    卸離前記錄筆數與淨額，統計表與餘額檢查點據此保留歷史；匯出 Parquet 後記錄檔案位置供稽核查詢。
+    """
+    name = models.CharField(max_length=63, unique=True, verbose_name="分割區名稱")
+    start = models.DateField(verbose_name="起始日")
+    end = models.DateField(verbose_name="結束日", help_text="不含當天")
+    row_count = models.BigIntegerField(default=0, verbose_name="交易筆數")
+    net_amount = models.DecimalField(max_digits=20, decimal_places=2, default=0, verbose_name="淨額")
+    archive_path = models.CharField(max_length=500, blank=True, verbose_name="封存檔案")
+    dropped = models.BooleanField(default=False, verbose_name="已刪除資料表")
+    detached_at = models.DateTimeField(auto_now_add=True, verbose_name="卸離時間")
+    archived_at = models.DateTimeField(null=True, blank=True, verbose_name="封存時間")
+
+    objects = ArchivedPartitionQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = "封存分割區"
+        verbose_name_plural = "封存分割區"
+        ordering = ['start']
+
+    def __str__(self):
+        return f"{self.name} ({self.start} ~ {self.end})"
@@ -0,0 +1,355 @@
+"""
+財務流水帳 (finance_transaction) 的日期範圍分割與冷資料封存
+
+PostgreSQL 宣告式分割 (PARTITION BY RANGE (date))：
+- 依月 (month) 或年 (year) 分割，另有 DEFAULT 分割區承接尚未建立區間的資料
+- 帶日期條件的查詢 (後台日期篩選、keyset 分頁、統計) 由規劃器自動略過無關分割區 (partition pruning)
+- 主鍵改為 (id, date)：分割表的唯一約束必須包含分割鍵；id 仍由序列產生，ORM 照常以 id 作為主鍵
+
+超過保留期限的分割區可卸離 (detach) 後匯出為 Parquet (zstd 壓縮、欄式儲存)，
+稽核時以 read_archive() 依日期 / 分類唯讀查詢，不需還原回資料庫。
+"""
+import re
+from datetime import date, datetime, timezone as dt_timezone
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.utils import timezone
+
+from .models import ArchivedPartition, Transaction, next_month
+
+# 💡 pyarrow 為選用套件：未安裝時無法匯出 / 查詢 Parquet 封存檔，其餘分割功能不受影響
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+PARENT = Transaction._meta.db_table
+DEFAULT_PARTITION = f'{PARENT}_default'
+INTERVALS = ('month', 'year')
+BOUND = re.compile(r"FROM \('(\d{4}-\d{2}-\d{2})'\) TO \('(\d{4}-\d{2}-\d{2})'\)")
+EXPORT_BATCH_SIZE = 50_000
+
+
+class PartitionError(Exception):
+    pass
+
+
+# --- 區間計算 ---
+
+def period_start(day, interval):
+    return day.replace(day=1) if interval == 'month' else day.replace(month=1, day=1)
+
+
+def period_end(start, interval):
+    return next_month(start) if interval == 'month' else start.replace(year=start.year + 1)
+
+
+def partition_name(start, interval):
+    if interval == 'month':
+        return f'{PARENT}_y{start:%Y}m{start:%m}'
+    return f'{PARENT}_y{start:%Y}'
+
+
+def periods(first, last, interval):
+    """first ~ last 涵蓋的所有區間：[(start, end)]"""
+    start, result = period_start(first, interval), []
+    while start <= last:
+        end = period_end(start, interval)
+        result.append((start, end))
+        start = end
+    return result
+
+
+def months_before(day, months):
+    """day 所在月份往前推 months 個月的第一天"""
+    index = day.year * 12 + day.month - 1 - months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+# --- 資料庫狀態 ---
+
+def _connection(using=None):
+    connection = connections[using or 'default']
+    if connection.vendor != 'postgresql':
+        raise PartitionError("資料表分割僅支援 PostgreSQL")
+    return connection
+
+
+def _quote(connection, name):
+    return connection.ops.quote_name(name)
+
+
+def is_partitioned(using=None):
+    connection = _connection(using)
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)", [_quote(connection, PARENT)])
+        row = cursor.fetchone()
+    return bool(row) and row[0] == 'p'
+
+
+def list_partitions(using=None):
+    """目前掛在父表下的分割區：[{'name', 'start', 'end', 'rows'}]，DEFAULT 分割區的 start / end 為 None"""
+    connection = _connection(using)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT child.relname, pg_get_expr(child.relpartbound, child.oid), child.reltuples::bigint
+            FROM pg_inherits
+            JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+            WHERE pg_inherits.inhparent = to_regclass(%s)
+            ORDER BY child.relname
+            """,
+            [_quote(connection, PARENT)],
+        )
+        rows = cursor.fetchall()
+
+    partitions = []
+    for name, bound, estimate in rows:
+        match = BOUND.search(bound or '')
+        partitions.append({
+            'name': name,
+            'start': date.fromisoformat(match.group(1)) if match else None,
+            'end': date.fromisoformat(match.group(2)) if match else None,
+            'rows': max(estimate, 0),
+        })
+    return partitions
+
+
+# --- 轉換與建立 ---
+
+def convert(interval, using=None, ahead=None):
+    """
+    把一般資料表轉為分割表 (一次性維運作業，期間鎖定整張表)：
+    1. 原表改名，依相同欄位建立分割父表，主鍵改為 (id, date)，id 改由獨立序列產生
+    2. 依既有資料的日期範圍與未來 ahead 個區間建立分割區 (含 DEFAULT)，搬移資料
+    3. 刪除原表後以原名稱重建索引與外鍵，Django 的 migration 狀態不受影響
+    """
+    if interval not in INTERVALS:
+        raise PartitionError(f"interval 須為 {' / '.join(INTERVALS)}")
+    connection = _connection(using)
+    if is_partitioned(using):
+        raise PartitionError(f"{PARENT} 已是分割表")
+
+    heap = f'{PARENT}_heap'
+    sequence = f'{PARENT}_id_seq'
+    parent, heap_q, sequence_q = _quote(connection, PARENT), _quote(connection, heap), _quote(connection, sequence)
+    with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+        cursor.execute(f"LOCK TABLE {parent} IN ACCESS EXCLUSIVE MODE")
+        cursor.execute(f"SELECT MIN(date), MAX(date), MAX(id) FROM {parent}")
+        first, last, max_id = cursor.fetchone()
+
+        # 記下原表的索引與外鍵定義 (不含主鍵)，稍後以相同名稱重建
+        cursor.execute(
+            "SELECT indexdef FROM pg_indexes WHERE schemaname = current_schema() AND tablename = %s "
+            "AND indexname NOT IN (SELECT conname FROM pg_constraint WHERE conrelid = to_regclass(%s) AND contype = 'p')",
+            [PARENT, parent],
+        )
+        indexes = [row[0] for row in cursor.fetchall()]
+        cursor.execute(
+            "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint WHERE conrelid = to_regclass(%s) AND contype = 'f'",
+            [parent],
+        )
+        foreign_keys = cursor.fetchall()
+
+        cursor.execute(f"ALTER TABLE {parent} RENAME TO {heap_q}")
+        cursor.execute(f"ALTER TABLE {heap_q} ALTER COLUMN id DROP IDENTITY IF EXISTS")
+        cursor.execute(f"ALTER TABLE {heap_q} ALTER COLUMN id DROP DEFAULT")
+        cursor.execute(f"DROP SEQUENCE IF EXISTS {sequence_q}")
+        cursor.execute(
+            f"CREATE TABLE {parent} (LIKE {heap_q} INCLUDING DEFAULTS INCLUDING CONSTRAINTS INCLUDING STORAGE) "
+            f"PARTITION BY RANGE (date)"
+        )
+        # PostgreSQL 17 之前分割表不支援 IDENTITY 欄位，改用序列預設值
+        cursor.execute(f"CREATE SEQUENCE {sequence_q} AS bigint OWNED BY {parent}.id")
+        cursor.execute(f"ALTER TABLE {parent} ALTER COLUMN id SET DEFAULT nextval('{sequence}')")
+        cursor.execute("SELECT setval(%s, %s, false)", [sequence, (max_id or 0) + 1])
+        cursor.execute(f"ALTER TABLE {parent} ADD PRIMARY KEY (id, date)")
+        cursor.execute(f"CREATE TABLE {_quote(connection, DEFAULT_PARTITION)} PARTITION OF {parent} DEFAULT")
+
+        today = timezone.localdate()
+        horizon = today if ahead is None else _ahead(today, interval, ahead)
+        for start, end in periods(first or today, max(last or today, horizon), interval):
+            cursor.execute(
+                f"CREATE TABLE {_quote(connection, partition_name(start, interval))} PARTITION OF {parent} "
+                f"FOR VALUES FROM (%s) TO (%s)",
+                [start, end],
+            )
+        cursor.execute(f"INSERT INTO {parent} SELECT * FROM {heap_q}")
+        cursor.execute(f"DROP TABLE {heap_q}")
+
+        # 建在父表上的索引會自動套用到每個分割區 (含日後新增的分割區)
+        for definition in indexes:
+            cursor.execute(definition)
+        for name, definition in foreign_keys:
+            cursor.execute(f"ALTER TABLE {parent} ADD CONSTRAINT {_quote(connection, name)} {definition}")
+        cursor.execute(f"ANALYZE {parent}")
+
+
+def _ahead(today, interval, count):
+    start = period_start(today, interval)
+    for _i in range(count):
+        start = period_end(start, interval)
+    return start
+
+
+def create_partitions(interval, ahead, using=None):
+    """
+    建立從本期到未來 ahead 個區間的分割區，回傳新建的名稱。
+    若 DEFAULT 分割區已有落在新區間的資料，先搬到新表再掛上，避免 ATTACH 因資料衝突失敗。
+    """
+    connection = _connection(using)
+    if not is_partitioned(using):
+        raise PartitionError(f"{PARENT} 尚未分割，請先執行 partition_finance convert")
+    existing = {partition['name'] for partition in list_partitions(using)}
+    today = timezone.localdate()
+    parent, default = _quote(connection, PARENT), _quote(connection, DEFAULT_PARTITION)
+
+    created = []
+    for start, end in periods(today, _ahead(today, interval, ahead), interval):
+        name = partition_name(start, interval)
+        if name in existing:
+            continue
+        table = _quote(connection, name)
+        with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+            cursor.execute(f"CREATE TABLE {table} (LIKE {parent} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)")
+            cursor.execute(
+                f"WITH moved AS (DELETE FROM {default} WHERE date >= %s AND date < %s RETURNING *) "
+                f"INSERT INTO {table} SELECT * FROM moved",
+                [start, end],
+            )
+            cursor.execute(f"ALTER TABLE {parent} ATTACH PARTITION {table} FOR VALUES FROM (%s) TO (%s)", [start, end])
+        created.append(name)
+    return created
+
+
+def detach_partitions(before, using=None):
+    """
+    卸離結束日早於等於 before 的分割區，回傳建立的 ArchivedPartition。
+    卸離前記錄筆數與淨額，現金流統計與餘額檢查點保留歷史數值，不需重算。
+    """
+    connection = _connection(using)
+    parent = _quote(connection, PARENT)
+    detached = []
+    for partition in list_partitions(using):
+        if partition['end'] is None or partition['end'] > before:
+            continue
+        table = _quote(connection, partition['name'])
+        with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+            cursor.execute(f"SELECT COUNT(*), COALESCE(SUM(amount), 0) FROM {table}")
+            row_count, net_amount = cursor.fetchone()
+            cursor.execute(f"ALTER TABLE {parent} DETACH PARTITION {table}")
+            detached.append(ArchivedPartition.objects.using(connection.alias).create(
+                name=partition['name'],
+                start=partition['start'],
+                end=partition['end'],
+                row_count=row_count,
+                net_amount=net_amount,
+            ))
+    return detached
+
+
+# --- Parquet 封存 ---
+
+def _require_pyarrow():
+    if pa is None:
+        raise PartitionError("需要安裝 pyarrow 才能匯出 / 查詢 Parquet 封存檔")
+
+
+def archive_schema():
+    _require_pyarrow()
+    types = {
+        'BigAutoField': pa.int64(),
+        'CharField': pa.string(),
+        'DecimalField': pa.decimal128(12, 2),
+        'DateField': pa.date32(),
+        'ForeignKey': pa.int64(),
+        'DateTimeField': pa.timestamp('us', tz='UTC'),
+    }
+    return pa.schema([
+        (field.column, types[field.get_internal_type()])
+        for field in Transaction._meta.concrete_fields
+    ])
+
+
+def _to_python(field, value):
+    """各資料庫的原始值 (SQLite 為字串 / 浮點數) 統一轉成 Parquet 欄位型別"""
+    if value is None:
+        return None
+    if field.get_internal_type() == 'DecimalField':
+        return Decimal(str(value)).quantize(Decimal('0.01'))
+    value = field.to_python(value)
+    if isinstance(value, datetime) and timezone.is_naive(value):
+        value = value.replace(tzinfo=dt_timezone.utc)
+    return value
+
+
+def export_table(table, path, using=None, batch_size=EXPORT_BATCH_SIZE):
+    """以伺服器端游標分批讀出資料表並寫入 Parquet (zstd)，回傳寫入筆數"""
+    _require_pyarrow()
+    connection = connections[using or 'default']
+    fields = Transaction._meta.concrete_fields
+    schema = archive_schema()
+    columns = ', '.join(_quote(connection, field.column) for field in fields)
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    written = 0
+    with pq.ParquetWriter(path, schema, compression='zstd') as writer, connection.chunked_cursor() as cursor:
+        cursor.execute(f"SELECT {columns} FROM {_quote(connection, table)} ORDER BY date, id")
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            data = {
+                field.column: [_to_python(field, row[index]) for row in rows]
+                for index, field in enumerate(fields)
+            }
+            writer.write_table(pa.table(data, schema=schema))
+            written += len(rows)
+    return written
+
+
+def archive_partition(archive, drop=False, using=None):
+    """
+    把已卸離的分割區匯出到 FINANCE_ARCHIVE_DIR/<名稱>.parquet；
+    drop=True 時確認檔案筆數與卸離時一致後才刪除資料表
+    """
+    connection = _connection(using)
+    path = settings.FINANCE_ARCHIVE_DIR / f'{archive.name}.parquet'
+    written = export_table(archive.name, path, using=using)
+    if pq.ParquetFile(path).metadata.num_rows != archive.row_count or written != archive.row_count:
+        raise PartitionError(f"{archive.name} 匯出筆數 {written} 與卸離時 {archive.row_count} 不符，保留資料表")
+
+    archive.archive_path = str(path)
+    archive.archived_at = timezone.now()
+    if drop:
+        with connection.cursor() as cursor:
+            cursor.execute(f"DROP TABLE {_quote(connection, archive.name)}")
+        archive.dropped = True
+    archive.save(update_fields=['archive_path', 'archived_at', 'dropped'])
+    return path
+
+
+def read_archive(start=None, end=None, categories=None, directory=None):
+    """
+    唯讀查詢 Parquet 封存檔 (稽核用)，回傳 pyarrow.Table；
+    日期與分類條件會下推到檔案的 row group 統計值，只讀取相關區塊
+    """
+    _require_pyarrow()
+    directory = directory or settings.FINANCE_ARCHIVE_DIR
+    files = sorted(str(path) for path in directory.glob('*.parquet'))
+    if not files:
+        return archive_schema().empty_table()
+    dataset = ds.dataset(files, schema=archive_schema(), format='parquet')
+    condition = None
+    for part in (
+        ds.field('date') >= start if start else None,
+        ds.field('date') <= end if end else None,
+        ds.field('category').isin(categories) if categories else None,
+    ):
+        if part is not None:
+            condition = part if condition is None else condition & part
+    return dataset.to_table(filter=condition).sort_by([('date', 'ascending'), ('id', 'ascending')])
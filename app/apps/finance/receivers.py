@@ -0,0 +1,33 @@
+from django.dispatch import receiver
+
+from core import events
+from core.cache import bump_version
+from .signals import CASHFLOW_CACHE_NAMESPACE, cashflow_changed
+
+
+@receiver(cashflow_changed)
+def invalidate_cashflow_cache(sender, **kwargs):
+    """統計異動後遞增快取版本，財務看板的 ETag 與快取 payload 隨之失效"""
+    bump_version(CASHFLOW_CACHE_NAMESPACE)
+
+
+@receiver(cashflow_changed)
+def publish_cashflow_event(sender, deltas=None, **kwargs):
+    """推送各日期 x 分類的收支增量給看板 (SSE)；整表重建時送 reset，前端重新讀取"""
+    if deltas is None:
+        events.publish(CASHFLOW_CACHE_NAMESPACE, events.RESET)
+        return
+    events.publish(CASHFLOW_CACHE_NAMESPACE, {
+        'type': 'delta',
+        'days': [
+            {
+                'date': day,
+                'category': category,
+                'income_count': income_count,
+                'income': income,
+                'expense_count': expense_count,
+                'expense': expense,
+            }
+            for (day, category), (income_count, income, expense_count, expense) in sorted(deltas.items())
+        ],
+    })
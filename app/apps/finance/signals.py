@@ -0,0 +1,8 @@
+from django.dispatch import Signal
+
+# 現金流統計的快取命名空間 (財務看板、API 共用)
+CASHFLOW_CACHE_NAMESPACE = 'finance.cashflow'
+
+# 現金流統計表異動並提交後發出
+# 參數 deltas: {(date, category): (收入筆數, 收入金額, 支出筆數, 支出金額) 增量}；整表重建時為 None
+cashflow_changed = Signal()
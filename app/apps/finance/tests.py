@@ -1,3 +1,390 @@
-from django.test import TestCase
+import io
+import re
+import tempfile
+import unittest
+from pathlib import Path
+from datetime import date, timedelta
+from html import unescape
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.db.models import F
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from . import partitions
+from .models import ArchivedPartition, BalanceCheckpoint, CashFlowDaily, Transaction
+
+User = get_user_model()
+
+
+class TransactionKeysetPaginationTests(TestCase):
+    """財務流水帳列表以 keyset 分頁，逐頁往後、往前都要與完整排序一致"""
+
+    def setUp(self):
+        self.admin = User.objects.create_superuser(username='boss', password='x', email='boss@example.com')
+        self.client.force_login(self.admin)
+        start = date(2025, 1, 1)
+        Transaction.objects.bulk_create([
+            # 每 3 筆同一天，驗證同日期時以 id 作為次要排序
+            Transaction(title=f'日常支出 {i}', amount=-100, category='OFFICE', date=start + timedelta(days=i // 3))
+            for i in range(45)
+        ])
+        self.url = reverse('admin:finance_transaction_changelist')
+        self.expected = list(Transaction.objects.order_by('-date', '-id').values_list('id', flat=True))
+
+    def _page(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        cl = response.context['cl']
+        return [obj.pk for obj in cl.result_list], cl
+
+    def _follow(self, link):
+        return self.url + unescape(link)
+
+    def test_walk_forward_and_back(self):
+        seen, pages = [], []
+        url = self.url
+        while url:
+            ids, cl = self._page(url)
+            seen.extend(ids)
+            pages.append(ids)
+            url = cl.keyset_next_url and self._follow(cl.keyset_next_url)
+        self.assertEqual(seen, self.expected)
+        self.assertEqual([len(ids) for ids in pages], [20, 20, 5])
+
+        # 從最後一頁往前翻
+        ids, cl = self._page(self._follow(cl.keyset_previous_url))
+        self.assertEqual(ids, pages[1])
+        ids, cl = self._page(self._follow(cl.keyset_previous_url))
+        self.assertEqual(ids, pages[0])
+        self.assertIsNone(cl.keyset_previous_url)
+
+    def test_invalid_cursor_is_rejected(self):
+        response = self.client.get(self.url, {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(re.search(r'[?&]e=1', response['Location']))
+
+
+class CashFlowDailyTests(TestCase):
+    """現金流統計表：單筆與批量寫入後都必須與 Transaction 實際數據一致"""
+
+    def setUp(self):
+        self.day = date(2026, 3, 1)
+
+    def assertNoDrift(self):
+        self.assertEqual(CashFlowDaily.objects.drift(), [])
+
+    def test_save_update_and_delete(self):
+        tx = Transaction.objects.create(title='顧問收入', amount=1000, category='REVENUE', date=self.day)
+        Transaction.objects.create(title='文具', amount=-50, category='OFFICE', date=self.day)
+        self.assertNoDrift()
+
+        # 由收入改為支出、換日期：舊分組扣除、新分組加入
+        tx.amount = -300
+        tx.date = self.day + timedelta(days=1)
+        tx.save()
+        self.assertNoDrift()
+
+        # update_fields 只寫入部分欄位：未寫入的修改不計入統計，之後完整存檔時才計入
+        tx.amount = 500
+        tx.category = 'REVENUE'
+        tx.save(update_fields=['category'])
+        self.assertNoDrift()
+        tx.title = '顧問收入 (修正)'
+        tx.save(update_fields=['title'])
+        self.assertNoDrift()
+        tx.save()
+        self.assertNoDrift()
+        deferred = Transaction.objects.defer('amount').get(pk=tx.pk)
+        deferred.date = self.day
+        deferred.save()
+        self.assertNoDrift()
+
+        Transaction.objects.get(pk=tx.pk).delete()
+        self.assertNoDrift()
+        totals = CashFlowDaily.objects.totals()
+        self.assertEqual((totals['income'], totals['expense'], totals['count']), (0, 50, 1))
+
+    def test_stale_instances(self):
+        # 同一筆交易的多個實例 (例如兩個請求同時編輯)：舊值一律以存檔當下資料庫中的值為準
+        tx = Transaction.objects.create(title='顧問收入', amount=50, category='REVENUE', date=self.day)
+        first, second = Transaction.objects.get(pk=tx.pk), Transaction.objects.get(pk=tx.pk)
+        first.amount = -80
+        first.save()
+        second.category = 'OFFICE'
+        second.save()
+        self.assertNoDrift()
+        self.assertEqual(BalanceCheckpoint.objects.drift(), [])
+
+        first.delete()
+        second.delete()
+        self.assertNoDrift()
+        self.assertEqual(BalanceCheckpoint.objects.drift(), [])
+        self.assertEqual(CashFlowDaily.objects.totals()['count'], 0)
+
+    def test_bulk_paths(self):
+        objs = Transaction.objects.bulk_create([
+            Transaction(title=f'交易 {i}', amount=(i - 5) * 10, category='OFFICE', date=self.day + timedelta(days=i % 3))
+            for i in range(12)
+        ])
+        self.assertNoDrift()
+
+        Transaction.objects.filter(amount__lt=0).update(category='SALARY')
+        self.assertNoDrift()
+        Transaction.objects.filter(category='SALARY').update(amount=F('amount') * -1)
+        self.assertNoDrift()
+        # 篩選條件與更新欄位相同：更新後的分組仍須對應原本那一組列
+        Transaction.objects.filter(category='SALARY').update(category='EQUIPMENT')
+        self.assertNoDrift()
+        Transaction.objects.filter(amount__gt=0, category='EQUIPMENT').update(amount=F('amount') * -1)
+        self.assertNoDrift()
+
+        for obj in objs[:4]:
+            obj.date = self.day + timedelta(days=10)
+        Transaction.objects.bulk_update(objs[:4], ['date'])
+        self.assertNoDrift()
+
+        Transaction.objects.filter(date=self.day).delete()
+        self.assertNoDrift()
+
+        CashFlowDaily.objects.update(income_total=0)
+        self.assertNotEqual(CashFlowDaily.objects.drift(), [])
+        with self.assertRaises(CommandError):
+            call_command('rollup_finance', stdout=io.StringIO())
+        call_command('rollup_finance', rebuild=True, stdout=io.StringIO())
+        self.assertNoDrift()
+
+    def test_admin_summary_source(self):
+        self.client.force_login(User.objects.create_superuser(username='boss', password='x'))
+        Transaction.objects.bulk_create([
+            Transaction(title='專案尾款', amount=5000, category='REVENUE', date=self.day),
+            Transaction(title='伺服器', amount=-1200, category='EQUIPMENT', date=self.day),
+            Transaction(title='專案訂金', amount=800, category='REVENUE', date=self.day - timedelta(days=40)),
+        ])
+        url = reverse('admin:finance_transaction_changelist')
+
+        def summary(params):
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, 200)
+            return response.context['cashflow_source'], [card['value'] for card in response.context['cashflow_cards']]
+
+        # 分類與日期區間：直接由統計表彙總
+        self.assertEqual(summary({}), ('rollup', ['5,800.00', '1,200.00', '+4,600.00', '3']))
+        self.assertEqual(
+            summary({'category__exact': 'REVENUE', 'date__gte': str(self.day)}),
+            ('rollup', ['5,000.00', '0.00', '+5,000.00', '1']),
+        )
+        # 關鍵字搜尋無法由統計表回答，回到 Transaction 表
+        self.assertEqual(summary({'q': '專案'}), ('table', ['5,800.00', '0.00', '+5,800.00', '2']))
+
+
+class BalanceCheckpointTests(TestCase):
+    """月結檢查點：任一日期的餘額與逐筆加總一致，補登舊日期交易後檢查點同步修正"""
+
+    def setUp(self):
+        start = date(2025, 10, 1)
+        Transaction.objects.bulk_create([
+            Transaction(title=f'交易 {i}', amount=(i % 7 - 3) * 100, category='OFFICE', date=start + timedelta(days=i * 3))
+            for i in range(40)
+        ])
+        self.created = BalanceCheckpoint.objects.close_months(until=date(2026, 1, 15))
+
+    def naive_balance(self, day):
+        return sum(Transaction.objects.filter(date__lte=day).values_list('amount', flat=True), 0)
+
+    def test_balance_as_of_and_backdated_insert(self):
+        self.assertEqual(self.created, 3)  # 2025-10 ~ 2025-12
+        for day in (date(2025, 9, 30), date(2025, 11, 15), date(2025, 12, 31), date(2026, 1, 10)):
+            self.assertEqual(BalanceCheckpoint.objects.balance_as_of(day), self.naive_balance(day))
+
+        # 補登 10 月的交易：10 月之後的檢查點全部修正，其餘查詢只讀檢查點與日統計
+        Transaction.objects.create(title='補登收入', amount=999, category='REVENUE', date=date(2025, 10, 20))
+        self.assertEqual(BalanceCheckpoint.objects.drift(), [])
+        with self.assertNumQueries(2):
+            balance = BalanceCheckpoint.objects.balance_as_of(date(2026, 1, 10))
+        self.assertEqual(balance, self.naive_balance(date(2026, 1, 10)))
+
+        BalanceCheckpoint.objects.update(balance=0)
+        call_command('rollup_finance', rebuild=True, stdout=io.StringIO())
+        self.assertEqual(BalanceCheckpoint.objects.drift(), [])
+
+    def test_running_balance_column_and_api(self):
+        self.client.force_login(User.objects.create_superuser(username='boss', password='x'))
+        response = self.client.get(reverse('admin:finance_transaction_changelist'))
+        self.assertEqual(response.status_code, 200)
+        for obj in response.context['cl'].result_list:
+            before = Transaction.objects.filter(date__lt=obj.date).values_list('amount', flat=True)
+            same_day = Transaction.objects.filter(date=obj.date, pk__lte=obj.pk).values_list('amount', flat=True)
+            self.assertEqual(obj.running_balance, sum(before, 0) + sum(same_day, 0))
+
+        url = reverse('finance:balance_api')
+        response = self.client.get(url, {'date': '2025-11-15'})
+        self.assertEqual(response.json()['balance'], f"{self.naive_balance(date(2025, 11, 15)):.2f}")
+        self.assertEqual(self.client.get(url, {'date': 'yesterday'}).status_code, 400)
+
+
+class CashFlowSeriesApiTests(TestCase):
+    """收支時間序列：自動選擇區間粒度、補齊空白區間，並依查詢參數分別快取"""
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(User.objects.create_superuser(username='boss', password='x'))
+        Transaction.objects.bulk_create([
+            Transaction(title='一月收入', amount=1000, category='REVENUE', date=date(2025, 1, 15)),
+            Transaction(title='一月薪資', amount=-400, category='SALARY', date=date(2025, 1, 31)),
+            Transaction(title='三月收入', amount=300, category='REVENUE', date=date(2025, 3, 2)),
+        ])
+        self.url = reverse('finance:series_api')
+
+    def test_auto_bucket_and_payload(self):
+        body = self.client.get(self.url, {'start': '2025-01-01', 'end': '2025-03-31'}).json()
+        self.assertEqual(body['bucket'], 'day')
+        self.assertEqual(len(body['labels']), 90)
+
+        body = self.client.get(self.url, {'start': '2025-01-01', 'end': '2025-12-31'}).json()
+        self.assertEqual(body['bucket'], 'week')
+        body = self.client.get(self.url, {'start': '2024-01-01', 'end': '2025-12-31', 'bucket': 'month'}).json()
+        self.assertEqual(body['labels'][12:15], ['2025-01', '2025-02', '2025-03'])
+        self.assertEqual((body['income'][12:15], body['expense'][12:15], body['net'][12:15]),
+                         ([1000.0, 0.0, 300.0], [400.0, 0.0, 0.0], [600.0, 0.0, 300.0]))
+        self.assertEqual([item['category'] for item in body['categories']], ['REVENUE', 'SALARY'])
+
+        body = self.client.get(self.url, {'start': '2015-01-01', 'end': '2025-12-31'}).json()
+        self.assertEqual((body['bucket'], body['labels'][-1]), ('quarter', '2025Q4'))
+        self.assertEqual(self.client.get(self.url, {'start': '2015-01-01', 'end': '2025-12-31', 'bucket': 'day'}).status_code, 400)
+
+    def test_cached_per_query_and_invalidated_on_write(self):
+        params = {'start': '2025-01-01', 'end': '2025-03-31', 'bucket': 'month', 'category': 'REVENUE'}
+        self.assertEqual(self.client.get(self.url, params).json()['income'], [1000.0, 0.0, 300.0])
+        with self.assertNumQueries(2):  # 只有 session 與登入使用者；payload 來自快取
+            self.assertEqual(self.client.get(self.url, params).json()['income'], [1000.0, 0.0, 300.0])
+        self.assertEqual(self.client.get(self.url, {**params, 'category': 'SALARY'}).json()['income'], [0.0, 0.0, 0.0])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Transaction.objects.create(title='二月收入', amount=50, category='REVENUE', date=date(2025, 2, 1))
+        self.assertEqual(self.client.get(self.url, params).json()['income'], [1000.0, 50.0, 300.0])
+
+
+class TransactionApiTests(TestCase):
+    """財務 API：keyset 分頁走完全部資料、篩選與 ?fields=，列表快速路徑與單筆 serializer 輸出一致"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='bi', password='x', role='FINANCE')
+        self.client.force_login(self.user)
+        start = date(2025, 1, 1)
+        Transaction.objects.bulk_create([
+            Transaction(title=f'交易 {i}', amount=i * 10 - 150, category=('OFFICE', 'SALARY', 'REVENUE')[i % 3],
+                        date=start + timedelta(days=i // 4), created_by=self.user if i % 2 else None)
+            for i in range(50)
+        ])
+        self.url = reverse('finance:transaction-list')
+
+    def test_walk_pages_with_flat_query_count(self):
+        expected = list(Transaction.objects.order_by('-date', '-id').values_list('id', flat=True))
+        seen, url, params = [], self.url, {'page_size': 15}
+        while url:
+            with self.assertNumQueries(3):  # session、登入使用者、該頁資料
+                body = self.client.get(url, params).json()
+            seen.extend(row['id'] for row in body['results'])
+            url, params = body['next'], None
+        self.assertEqual(seen, expected)
+        self.assertEqual(self.client.get(self.url, {'cursor': 'broken'}).status_code, 404)
+
+    def test_values_path_matches_serializer(self):
+        rows = self.client.get(self.url, {'page_size': 5}).json()['results']
+        for row in rows:
+            detail = self.client.get(reverse('finance:transaction-detail', args=[row['id']])).json()
+            self.assertEqual(row, detail)
+
+    def test_filters_and_sparse_fields(self):
+        params = {'date_from': '2025-01-03', 'date_to': '2025-01-05', 'category': ['OFFICE', 'REVENUE'], 'fields': 'id,amount'}
+        rows = self.client.get(self.url, params).json()['results']
+        expected = Transaction.objects.filter(
+            date__range=(date(2025, 1, 3), date(2025, 1, 5)), category__in=['OFFICE', 'REVENUE'],
+        ).order_by('-date', '-id')
+        self.assertEqual([row['id'] for row in rows], [obj.pk for obj in expected])
+        self.assertEqual(set(rows[0]), {'id', 'amount'})
+        self.assertEqual(self.client.get(self.url, {'fields': 'id,secret'}).status_code, 400)
+
+    def test_requires_finance_role(self):
+        self.client.force_login(User.objects.create_user(username='sales', password='x', role='CRM'))
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+
+
+class PartitionArchiveTests(TestCase):
+    """分割區卸離後：統計與餘額保留歷史不視為漂移；Parquet 封存檔可依日期 / 分類唯讀查詢"""
+
+    def setUp(self):
+        Transaction.objects.bulk_create([
+            Transaction(title=f'交易 {i}', amount=(i % 5 - 2) * 100, category=('OFFICE', 'REVENUE')[i % 2],
+                        date=date(2020, 1, 1) + timedelta(days=i * 2))
+            for i in range(60)
+        ])
+        BalanceCheckpoint.objects.close_months(until=date(2020, 5, 1))
+        self.archive_table = partitions.partition_name(date(2020, 1, 1), 'month')
+
+    def detach_january(self):
+        """SQLite 沒有宣告式分割：以「複製到獨立資料表 + 直接刪除」模擬 DETACH PARTITION"""
+        january = Transaction.objects.filter(date__lt=date(2020, 2, 1))
+        total = sum(january.values_list('amount', flat=True), 0)
+        with connection.cursor() as cursor:
+            cursor.execute(f"CREATE TABLE {self.archive_table} AS SELECT * FROM finance_transaction WHERE date < '2020-02-01'")
+            cursor.execute("DELETE FROM finance_transaction WHERE date < '2020-02-01'")
+        return ArchivedPartition.objects.create(
+            name=self.archive_table, start=date(2020, 1, 1), end=date(2020, 2, 1),
+            row_count=16, net_amount=total,
+        )
+
+    def test_periods_and_names(self):
+        self.assertEqual(partitions.periods(date(2025, 11, 15), date(2026, 1, 3), 'month'), [
+            (date(2025, 11, 1), date(2025, 12, 1)),
+            (date(2025, 12, 1), date(2026, 1, 1)),
+            (date(2026, 1, 1), date(2026, 2, 1)),
+        ])
+        self.assertEqual(partitions.partition_name(date(2025, 3, 1), 'year'), 'finance_transaction_y2025')
+        self.assertEqual(partitions.months_before(date(2026, 3, 18), 36), date(2023, 3, 1))
+        with self.assertRaises(CommandError):
+            call_command('partition_finance', 'status', stdout=io.StringIO())
+
+    def test_detached_history_is_not_drift(self):
+        before = BalanceCheckpoint.objects.balance_as_of(date(2020, 3, 31))
+        self.detach_january()
+        self.assertEqual(CashFlowDaily.objects.drift(), [])
+        self.assertEqual(BalanceCheckpoint.objects.drift(), [])
+        self.assertEqual(BalanceCheckpoint.objects.balance_as_of(date(2020, 3, 31)), before)
+
+        call_command('rollup_finance', rebuild=True, stdout=io.StringIO())
+        self.assertTrue(CashFlowDaily.objects.filter(date=date(2020, 1, 1)).exists())
+        self.assertEqual(BalanceCheckpoint.objects.balance_as_of(date(2020, 3, 31)), before)
+
+    def test_admin_summary_excludes_archived_days(self):
+        # 統計表保留已封存期間的歷史，但列表已不含這些交易：兩種來源的合計須一致
+        self.detach_january()
+        self.client.force_login(User.objects.create_superuser(username='boss', password='x'))
+        url = reverse('admin:finance_transaction_changelist')
+        params = {'date__gte': '2020-01-01', 'date__lt': '2020-03-01'}
+        rollup = self.client.get(url, params).context
+        table = self.client.get(url, {**params, 'q': '交易'}).context
+        self.assertEqual((rollup['cashflow_source'], table['cashflow_source']), ('rollup', 'table'))
+        self.assertEqual(rollup['cashflow_cards'], table['cashflow_cards'])
+
+    @unittest.skipIf(partitions.pa is None, "pyarrow 未安裝")
+    def test_export_and_audit(self):
+        expected = list(
+            Transaction.objects.filter(date__lt=date(2020, 2, 1), category='REVENUE')
+            .order_by('date', 'id').values_list('id', 'amount')
+        )
+        archive = self.detach_january()
+        with tempfile.TemporaryDirectory() as directory, override_settings(FINANCE_ARCHIVE_DIR=Path(directory)):
+            path = Path(directory) / f'{archive.name}.parquet'
+            self.assertEqual(partitions.export_table(archive.name, path), 16)
+            table = partitions.read_archive(date(2020, 1, 1), date(2020, 1, 31), ['REVENUE'])
+            self.assertEqual(list(zip(table.column('id').to_pylist(), table.column('amount').to_pylist())), expected)
+
+            output = io.StringIO()
+            call_command('partition_finance', 'audit', '--category', 'REVENUE', stdout=output)
+            self.assertIn(f"封存檔共 {len(expected)} 筆", output.getvalue())
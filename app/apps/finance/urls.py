@@ -1,3 +1,18 @@
-from django.urls import path
+from django.urls import path, include
+from rest_framework.routers import DefaultRouter
+from .views import TransactionViewSet, balance_api, cashflow_series_api
+
 app_name = 'finance'
-urlpatterns = []
+
+router = DefaultRouter()
+router.register(r'transactions', TransactionViewSet, basename='transaction')
+
+urlpatterns = [
+    # 指定日期的帳戶餘額
+    # 網址：/api/finance/balance/?date=YYYY-MM-DD
+    path('balance/', balance_api, name='balance_api'),
+    # 收支時間序列 (Chart.js)
+    # 網址：/api/finance/series/?start=YYYY-MM-DD&end=YYYY-MM-DD[&bucket=month][&category=SALARY]
+    path('series/', cashflow_series_api, name='series_api'),
+    path('', include(router.urls)),
+]
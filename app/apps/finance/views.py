@@ -1,3 +1,201 @@
-from django.shortcuts import render
+from datetime import date, timedelta
 
-# Create your views here.
+import django_filters
+from django.contrib.admin.views.decorators import staff_member_required
+from django.utils import timezone
+from rest_framework import permissions, serializers, viewsets
+
+from core.api import KeysetCursorPagination, SparseFieldsMixin, ValuesListMixin
+from core.cache import versioned_json_response
+from core.json import FastJsonResponse
+from .models import CENT, BalanceCheckpoint, CashFlowDaily, Transaction, next_month
+from .signals import CASHFLOW_CACHE_NAMESPACE
+
+# 圖表最多回傳的時間點數；依查詢區間長度自動選擇最細且不超過此上限的區間
+MAX_SERIES_POINTS = 120
+
+# 區間大小 (由細到粗) 與每個區間的約略天數
+SERIES_BUCKETS = {
+    'day': 1,
+    'week': 7,
+    'month': 30.44,
+    'quarter': 91.31,
+}
+
+
+@staff_member_required
+def balance_api(request):
+    """
+    指定日期結束時的帳戶餘額：GET /api/finance/balance/?date=2026-03-31 (預設今天)
+    由最近的月結檢查點加上之後的日統計淨額算出，不加總整個流水帳
+    """
+    raw = request.GET.get('date')
+    try:
+        day = date.fromisoformat(raw) if raw else timezone.localdate()
+    except ValueError:
+        return FastJsonResponse({'error': "date 格式應為 YYYY-MM-DD"}, status=400)
+
+    return FastJsonResponse({
+        'date': day.isoformat(),
+        'balance': BalanceCheckpoint.objects.balance_as_of(day).quantize(CENT),
+    })
+
+
+def bucket_start(day, bucket):
+    """day 所屬區間的第一天 (與資料庫 Trunc 的結果一致，週以星期一起算)"""
+    if bucket == 'week':
+        return day - timedelta(days=day.weekday())
+    if bucket == 'month':
+        return day.replace(day=1)
+    if bucket == 'quarter':
+        return day.replace(month=(day.month - 1) // 3 * 3 + 1, day=1)
+    return day
+
+
+def bucket_label(start, bucket):
+    if bucket == 'month':
+        return f"{start:%Y-%m}"
+    if bucket == 'quarter':
+        return f"{start.year}Q{(start.month - 1) // 3 + 1}"
+    return start.isoformat()
+
+
+def series_buckets(start, end, bucket):
+    """start ~ end 之間所有區間的起始日 (含沒有交易的區間，圖表 X 軸才連續)"""
+    current, buckets = bucket_start(start, bucket), []
+    while current <= end:
+        buckets.append(current)
+        if bucket == 'day':
+            current += timedelta(days=1)
+        elif bucket == 'week':
+            current += timedelta(days=7)
+        elif bucket == 'month':
+            current = next_month(current)
+        else:
+            current = next_month(next_month(next_month(current)))
+    return buckets
+
+
+def choose_bucket(start, end):
+    """依區間長度選擇最細、且點數不超過 MAX_SERIES_POINTS 的區間大小"""
+    days = (end - start).days + 1
+    for bucket, size in SERIES_BUCKETS.items():
+        if days / size <= MAX_SERIES_POINTS:
+            return bucket
+    return 'quarter'
+
+
+@staff_member_required
+def cashflow_series_api(request):
+    """
+    收支時間序列 (提供給 Chart.js)：GET /api/finance/series/?start=2024-01-01&end=2025-12-31&category=SALARY
+    - bucket 未指定時依區間長度自動選擇 (day / week / month / quarter)，點數上限 MAX_SERIES_POINTS
+    - 由現金流日統計彙總，並依 (區間, 粒度, 分類) 版本化快取；交易異動時版本遞增自動失效
+    """
+    today = timezone.localdate()
+    try:
+        end = date.fromisoformat(request.GET['end']) if request.GET.get('end') else today
+        start = date.fromisoformat(request.GET['start']) if request.GET.get('start') else end - timedelta(days=364)
+    except ValueError:
+        return FastJsonResponse({'status': 'error', 'error': "start / end 格式應為 YYYY-MM-DD"}, status=400)
+    if start > end:
+        return FastJsonResponse({'status': 'error', 'error': "start 不可晚於 end"}, status=400)
+
+    bucket = request.GET.get('bucket') or choose_bucket(start, end)
+    if bucket not in SERIES_BUCKETS:
+        return FastJsonResponse({'status': 'error', 'error': f"bucket 須為 {' / '.join(SERIES_BUCKETS)}"}, status=400)
+    if ((end - start).days + 1) / SERIES_BUCKETS[bucket] > MAX_SERIES_POINTS:
+        return FastJsonResponse({'status': 'error', 'error': f"資料點超過 {MAX_SERIES_POINTS}，請縮小區間或改用較粗的 bucket"}, status=400)
+
+    valid = set(Transaction.Category.values)
+    categories = sorted(set(request.GET.getlist('category')))
+    if not set(categories) <= valid:
+        return FastJsonResponse({'status': 'error', 'error': "未知的分類"}, status=400)
+
+    variant = f"{start}:{end}:{bucket}:{','.join(categories)}"
+    return versioned_json_response(
+        request, CASHFLOW_CACHE_NAMESPACE,
+        lambda: build_series_payload(start, end, bucket, categories),
+        variant=variant,
+    )
+
+
+def build_series_payload(start, end, bucket, categories):
+    """計算 cashflow_series_api 的回應內容 (僅在快取未命中時執行)"""
+    buckets = series_buckets(start, end, bucket)
+    index = {value: position for position, value in enumerate(buckets)}
+    rows = CashFlowDaily.objects.filter(date__range=(start, end))
+    if categories:
+        rows = rows.filter(category__in=categories)
+
+    def empty():
+        return {'income': [0.0] * len(buckets), 'expense': [0.0] * len(buckets), 'net': [0.0] * len(buckets)}
+
+    totals, by_category = empty(), {}
+    for row in rows.series(bucket):
+        position = index[row['bucket']]
+        income, expense = float(row['income'] or 0), float(row['expense'] or 0)
+        series = by_category.setdefault(row['category'], empty())
+        for target in (totals, series):
+            target['income'][position] += income
+            target['expense'][position] += expense
+            target['net'][position] += income - expense
+
+    labels = dict(Transaction.Category.choices)
+    return {
+        "status": "success",
+        "bucket": bucket,
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "labels": [bucket_label(value, bucket) for value in buckets],
+        **{key: [round(value, 2) for value in values] for key, values in totals.items()},
+        "categories": [
+            {
+                "category": category,
+                "label": str(labels.get(category, category)),
+                **{key: [round(value, 2) for value in values] for key, values in series.items()},
+            }
+            for category, series in sorted(by_category.items())
+        ],
+    }
+
+
+class TransactionSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    class Meta:
+        model = Transaction
+        fields = ['id', 'date', 'category', 'title', 'amount', 'created_by', 'created_at', 'updated_at']
+
+
+class TransactionFilter(django_filters.FilterSet):
+    """?date_from=2026-01-01&date_to=2026-12-31&category=SALARY&category=OFFICE"""
+    date_from = django_filters.DateFilter(field_name='date', lookup_expr='gte')
+    date_to = django_filters.DateFilter(field_name='date', lookup_expr='lte')
+    category = django_filters.MultipleChoiceFilter(choices=Transaction.Category.choices)
+
+    class Meta:
+        model = Transaction
+        fields = ['date_from', 'date_to', 'category']
+
+
+class IsFinanceStaff(permissions.BasePermission):
+    """僅限系統管理員與財務會計 (含 BI 排程使用的服務帳號)"""
+
+    def has_permission(self, request, view):
+        user = request.user
+        return bool(user and user.is_authenticated and (
+            user.is_superuser or user.role in (user.Role.ADMIN, user.Role.FINANCE)
+        ))
+
+
+class TransactionViewSet(ValuesListMixin, viewsets.ReadOnlyModelViewSet):
+    """
+    財務流水帳唯讀 API (/api/finance/transactions/)
+    - 依 (-date, -id) keyset 分頁，下一頁網址見回應的 next
+    - 列表走 values() 快速序列化；單筆 (retrieve) 使用一般 serializer
+    """
+    queryset = Transaction.objects.order_by('-date', '-id')
+    serializer_class = TransactionSerializer
+    filterset_class = TransactionFilter
+    filter_backends = [django_filters.rest_framework.DjangoFilterBackend]
+    pagination_class = KeysetCursorPagination
+    permission_classes = [IsFinanceStaff]
@@ -18,6 +18,7 @@ except (ImportError, ModuleNotFoundError):
         BaseImportExportAdmin = ModelAdmin
 
 from import_export import resources
+from core.pagination import EstimatedCountMixin
 from .models import User
 
 # 1. 資料匯入匯出資源配置
@@ -28,7 +29,7 @@ class UserResource(resources.ModelResource):
 
 # 2. User 管理介面
 @admin.register(User)
-class UserAdmin(BaseImportExportAdmin, BaseUserAdmin):
+class UserAdmin(EstimatedCountMixin, BaseImportExportAdmin, BaseUserAdmin):
     # 💡 繼承順序：Unfold 類別置左，確保 Nexus Admin 品牌標籤優先渲染
     
     form = UserChangeForm
@@ -3,4 +3,8 @@ from django.apps import AppConfig
 class HrConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.hr'
-    verbose_name = '人力資源管理'
\ No newline at end of file
+    verbose_name = '人力資源管理'
+
+    def ready(self):
+        # 註冊通訊錄快取失效的 signal receivers
+        from . import receivers  # noqa: F401
@@ -0,0 +1,31 @@
+# Generated by Django 6.0.1 on 2026-10-18 10:47
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def backfill_updated_at(apps, schema_editor):
+    """既有帳號以建立時間作為初始的最後更新時間，增量同步才不會漏掉"""
+    User = apps.get_model('hr', 'User')
+    User.objects.filter(updated_at__isnull=True).update(updated_at=F('date_joined'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('hr', '0002_alter_user_options_alter_user_employee_id_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, null=True, verbose_name='最後更新時間'),
+        ),
+        migrations.RunPython(backfill_updated_at, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['updated_at', 'id'], name='hr_user_updated_key'),
+        ),
+    ]
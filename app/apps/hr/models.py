@@ -27,9 +27,16 @@ class User(AbstractUser):
         verbose_name="員工編號"
     )
 
+    # 通訊錄同步 (?since=) 依此欄位取得異動；last_login 以 update_fields 寫入，登入不會更新此欄
+    updated_at = models.DateTimeField(auto_now=True, null=True, verbose_name="最後更新時間")
+
     class Meta:
         verbose_name = "使用者"
         verbose_name_plural = "使用者列表"
+        indexes = [
+            # 增量同步：WHERE updated_at > since ORDER BY updated_at, id 的 keyset 分頁
+            models.Index(fields=['updated_at', 'id'], name='hr_user_updated_key'),
+        ]
 
     def __str__(self):
         # 讓 Admin 後台顯示更直觀，例如：admin (系統管理員)
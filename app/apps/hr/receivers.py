@@ -0,0 +1,19 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from core.cache import bump_version
+from .signals import DIRECTORY_CACHE_NAMESPACE
+
+# 只有登入時間異動 (update_last_login) 不影響通訊錄內容
+IGNORED_UPDATE_FIELDS = frozenset({'last_login'})
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def invalidate_directory(sender, update_fields=None, **kwargs):
+    """帳號新增、修改、刪除並提交後遞增版本，EmployeeViewSet 的 ETag 隨之失效"""
+    if update_fields and set(update_fields) <= IGNORED_UPDATE_FIELDS:
+        return
+    transaction.on_commit(lambda: bump_version(DIRECTORY_CACHE_NAMESPACE))
@@ -0,0 +1,2 @@
+# 員工通訊錄 API (hr:employee-list) 的快取命名空間：版本號同時作為 ETag
+DIRECTORY_CACHE_NAMESPACE = 'hr.directory'
@@ -1,3 +1,105 @@
-from django.test import TestCase
+from unittest import skipUnless
 
-# Create your tests here.
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from core.pagination import EstimatedCountPaginator
+from .views import UserSerializer
+
+User = get_user_model()
+
+
+class EstimatedCountPaginatorTests(TestCase):
+    """使用者列表的總筆數：門檻以下或非 PostgreSQL 時精確計數，超過門檻改用規劃器預估"""
+
+    def setUp(self):
+        User.objects.bulk_create([
+            User(username=f'user{i}', employee_id=f'EMP{i:03d}', role='HR' if i % 2 else 'CRM')
+            for i in range(15)
+        ])
+
+    def test_exact_count_below_threshold(self):
+        paginator = EstimatedCountPaginator(User.objects.filter(role='HR').order_by('pk'), 10)
+        self.assertEqual(paginator.count, 7)
+        self.assertFalse(paginator.is_estimated)
+
+    @skipUnless(connection.vendor == 'postgresql', 'PostgreSQL only')
+    @override_settings(ADMIN_COUNT_ESTIMATE_THRESHOLD=0)
+    def test_planner_estimate_above_threshold(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'ANALYZE {connection.ops.quote_name(User._meta.db_table)}')
+        paginator = EstimatedCountPaginator(User.objects.filter(role='HR').order_by('pk'), 10)
+        self.assertGreater(paginator.count, 0)
+        self.assertTrue(paginator.is_estimated)
+
+    def test_changelist_counts_once_without_filters(self):
+        admin = User.objects.create_superuser(username='boss', password='x', email='boss@example.com',
+                                              employee_id='EMP999')
+        self.client.force_login(admin)
+        url = reverse('admin:hr_user_changelist')
+
+        response = self.client.get(url)
+        self.assertEqual(response.context['cl'].result_count, 16)
+        self.assertEqual(response.context['cl'].full_result_count, 16)
+
+        response = self.client.get(url, {'role__exact': 'HR'})
+        self.assertEqual(response.context['cl'].result_count, 7)
+        self.assertEqual(response.context['cl'].full_result_count, 16)
+
+
+class EmployeeDirectoryApiTests(TestCase):
+    """員工通訊錄 API：keyset 分頁、?since= 增量同步、ETag / Last-Modified 與 values() 快速序列化"""
+
+    def setUp(self):
+        cache.clear()
+        self.viewer = User.objects.create_user(username='sync', password='x', role='HR')
+        User.objects.bulk_create([
+            User(username=f'emp{i:02d}', employee_id=f'E{i:03d}', role='CRM', email=f'emp{i}@example.com')
+            for i in range(25)
+        ])
+        # auto_now 會覆寫 bulk_create 的值，改以 update() 設定不同的更新時間
+        for i in range(25):
+            User.objects.filter(username=f'emp{i:02d}').update(updated_at=timezone.now() - timedelta(days=30 - i))
+        self.client.force_login(self.viewer)
+        self.url = reverse('hr:employee-list')
+
+    def test_pages_match_serializer(self):
+        ids, url, params = [], self.url, {'page_size': 10}
+        while url:
+            body = self.client.get(url, params).json()
+            ids.extend(row['id'] for row in body['results'])
+            url, params = body['next'], None
+        self.assertEqual(ids, list(User.objects.order_by('id').values_list('id', flat=True)))
+
+        row = self.client.get(self.url, {'page_size': 1}).json()['results'][0]
+        self.assertEqual(row, UserSerializer(User.objects.get(pk=row['id'])).data)
+
+    def test_since_returns_changes_in_update_order(self):
+        changed = User.objects.get(username='emp03')
+        changed.email = 'new@example.com'
+        changed.save()
+        since = (timezone.now() - timedelta(days=8)).isoformat()
+        names = [row['username'] for row in self.client.get(self.url, {'since': since}).json()['results']]
+        self.assertEqual(names, [f'emp{i:02d}' for i in range(23, 25)] + ['sync', 'emp03'])
+        self.assertEqual(self.client.get(self.url, {'since': 'yesterday'}).status_code, 400)
+
+    def test_conditional_get(self):
+        response = self.client.get(self.url)
+        etag, last_modified = response['ETag'], response['Last-Modified']
+        with self.assertNumQueries(3):  # session、登入使用者與 MAX(updated_at)；不查詢、不序列化列表
+            self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 304)
+
+        # 只更新登入時間不影響通訊錄
+        self.client.force_login(self.viewer)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            User.objects.filter(username='emp05').get().delete()
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
@@ -1,15 +1,57 @@
+from django.db.models import Max
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
 from rest_framework import viewsets, permissions
-from rest_framework.response import Response
+from rest_framework.exceptions import ValidationError
+from core.api import KeysetCursorPagination, ValuesListMixin
+from core.cache import get_version
 from .models import User
+from .signals import DIRECTORY_CACHE_NAMESPACE
 from rest_framework.serializers import ModelSerializer
 
 class UserSerializer(ModelSerializer):
     class Meta:
         model = User
-        fields = ['id', 'username', 'employee_id', 'role', 'email']
+        fields = ['id', 'username', 'employee_id', 'role', 'email', 'updated_at']
 
-class EmployeeViewSet(viewsets.ReadOnlyModelViewSet):
-    queryset = User.objects.all()
+
+def directory_etag(request, *args, **kwargs):
+    """通訊錄版本號：帳號異動時遞增，未異動的頁面直接回 304 (不查詢、不序列化)"""
+    return f'{DIRECTORY_CACHE_NAMESPACE}-{get_version(DIRECTORY_CACHE_NAMESPACE)}'
+
+
+def directory_last_modified(request, *args, **kwargs):
+    return User.objects.aggregate(latest=Max('updated_at'))['latest']
+
+
+class EmployeeViewSet(ValuesListMixin, viewsets.ReadOnlyModelViewSet):
+    """
+    員工通訊錄 API (/api/hr/employees/)
+    - 依 id keyset 分頁；?since=<ISO 時間> 只回傳之後有異動的帳號，改依 (updated_at, id) 排序，
+      同步程式記下最後一筆的 updated_at 作為下次的 since
+    - ETag / Last-Modified：資料未異動時回 304
+    - 列表走 values() 快速序列化，輸出與 UserSerializer 相同
+    """
+    queryset = User.objects.order_by('id')
     serializer_class = UserSerializer
+    pagination_class = KeysetCursorPagination
     # 這裡可以實作：只有 ADMIN 和 HR 角色能看全體員工
-    permission_classes = [permissions.IsAuthenticated]
\ No newline at end of file
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        raw = self.request.query_params.get('since')
+        if raw is None or self.action != 'list':
+            return queryset
+        since = parse_datetime(raw)
+        if since is None:
+            raise ValidationError({'since': "格式應為 ISO 8601 時間，例如 2026-01-31T08:00:00+08:00"})
+        if timezone.is_naive(since):
+            since = timezone.make_aware(since)
+        return queryset.filter(updated_at__gt=since).order_by('updated_at', 'id')
+
+    @method_decorator(condition(etag_func=directory_etag, last_modified_func=directory_last_modified))
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
@@ -0,0 +1,143 @@
+"""
+Nexus REST API 共用元件 (DRF)
+
+- KeysetCursorPagination：沿用 core.pagination.KeysetPaginator，以 WHERE (date, id) < (...) 定位下一頁，
+  BI 批次拉取一整年資料時每一頁成本相同，不會像 OFFSET 一樣越翻越慢
+- SparseFieldsMixin：?fields=id,amount,date 只回傳指定欄位
+- ValuesListMixin：list() 改用 QuerySet.values() 取得 dict，再以 serializer 欄位的 to_representation 轉換，
+  不建立 model 實體，輸出格式與一般 serializer 相同
+"""
+from django.core.exceptions import ImproperlyConfigured
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import BasePagination
+from rest_framework.relations import RelatedField
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from core.pagination import CURSOR_VAR, InvalidCursor, KeysetPaginator
+
+FIELDS_PARAM = 'fields'
+
+
+class KeysetCursorPagination(BasePagination):
+    """
+    依 QuerySet 的排序欄位做 keyset 分頁 (排序需符合 KeysetPaginator 的條件，且最後一欄唯一)。
+    回應格式：{'next': URL, 'previous': URL, 'results': [...]}，不計算總筆數。
+    """
+    page_size = 100
+    max_page_size = 1000
+    page_size_query_param = 'page_size'
+    cursor_query_param = CURSOR_VAR
+
+    def get_page_size(self, request):
+        raw = request.query_params.get(self.page_size_query_param)
+        if raw is None:
+            return self.page_size
+        try:
+            size = int(raw)
+        except ValueError:
+            raise ValidationError({self.page_size_query_param: "必須為正整數"})
+        if size < 1:
+            raise ValidationError({self.page_size_query_param: "必須為正整數"})
+        return min(size, self.max_page_size)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        paginator = KeysetPaginator.from_queryset(queryset, self.get_page_size(request))
+        if paginator is None:
+            raise ImproperlyConfigured(
+                f"{type(view).__name__} 的排序無法使用 keyset 分頁，請以唯一欄位 (例如 id) 作為最後的排序鍵"
+            )
+        try:
+            self.page = paginator.page(request.query_params.get(self.cursor_query_param))
+        except InvalidCursor:
+            raise NotFound("無效的分頁游標")
+        self.request = request
+        return list(self.page)
+
+    def _link(self, cursor):
+        if cursor is None:
+            return None
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, cursor)
+
+    def get_next_link(self):
+        return self._link(self.page.next_cursor)
+
+    def get_previous_link(self):
+        return self._link(self.page.previous_cursor)
+
+    def get_first_link(self):
+        return remove_query_param(self.request.build_absolute_uri(), self.cursor_query_param)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+
+def requested_fields(request, available):
+    """解析 ?fields=a,b；未指定時回傳 None，含未知欄位時回應 400"""
+    raw = request.query_params.get(FIELDS_PARAM) if request is not None else None
+    if not raw:
+        return None
+    names = [name.strip() for name in raw.split(',') if name.strip()]
+    unknown = [name for name in names if name not in available]
+    if unknown:
+        raise ValidationError({FIELDS_PARAM: f"未知的欄位：{', '.join(unknown)}"})
+    return names
+
+
+class SparseFieldsMixin:
+    """Serializer mixin：依 ?fields= 只保留指定欄位 (順序與 Meta.fields 相同)"""
+
+    def get_fields(self):
+        fields = super().get_fields()
+        names = requested_fields(self.context.get('request'), fields)
+        if names is None:
+            return fields
+        return {name: field for name, field in fields.items() if name in names}
+
+
+class ValuesListMixin:
+    """
+    ViewSet mixin：list() 以 values() 取得資料，不建立 model 實體。
+    serializer 的欄位需直接對應本表欄位 (source 不含「.」，關聯欄位以主鍵輸出)，
+    每個值交由對應欄位的 to_representation 轉換，因此日期、Decimal 等格式與 retrieve() 一致。
+    """
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        fields = self.get_serializer().fields
+        converters = {
+            name: (field.source, None if isinstance(field, RelatedField) else field.to_representation)
+            for name, field in fields.items()
+        }
+        # 分頁游標需要排序欄位的值，即使 ?fields= 未要求也一併取出
+        ordering = [part.lstrip('-') for part in queryset.query.order_by if isinstance(part, str)]
+        columns = dict.fromkeys([source for source, _convert in converters.values()] + ordering)
+        rows = queryset.values(*columns)
+
+        def represent(row):
+            item = {}
+            for name, (source, convert) in converters.items():
+                value = row[source]
+                item[name] = value if convert is None or value is None else convert(value)
+            return item
+
+        page = self.paginate_queryset(rows)
+        data = [represent(row) for row in (rows if page is None else page)]
+        if page is not None:
+            return self.get_paginated_response(data)
+        return Response(data)
@@ -0,0 +1,12 @@
+from django.apps import AppConfig
+from django.db.backends.signals import connection_created
+
+class CoreConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'core'
+    verbose_name = '系統核心'
+
+    def ready(self):
+        # 每條資料庫連線掛上查詢計時 (慢查詢 / 抽樣日誌)
+        from .log import install_query_logging
+        connection_created.connect(install_query_logging, dispatch_uid='core.install_query_logging')
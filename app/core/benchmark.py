@@ -0,0 +1,253 @@
+"""
+Nexus 效能基準測試
+
+在獨立的測試資料庫中依序建立不同規模的資料 (10k / 100k / 1M)，以 Django test client
+逐一呼叫看板、後台列表與 API，記錄：
+- 延遲 p50 / p95 / 平均 (毫秒)
+- 每次請求的查詢數與 SQL 總耗時
+- 峰值記憶體 (tracemalloc，另外跑一次，避免拖慢延遲量測)
+
+結果輸出為 JSON，可與前一次 (例如 main 分支) 的報告比對，在部署前抓出效能退化。
+
+json_codecs() 另外比較標準庫 json 與 core.json (orjson) 在大型 payload 上的編解碼耗時，不需資料庫。
+"""
+import datetime
+import decimal
+import json
+import math
+import platform
+import random
+import subprocess
+import time
+import tracemalloc
+
+import django
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils.translation import gettext_lazy
+
+from apps.crm.models import PipelineRollup
+from apps.finance.models import BalanceCheckpoint, CashFlowDaily
+from core import json as fast_json
+from core import synthetic
+
+# (名稱, URL 名稱, 查詢參數)
+ENDPOINTS = [
+    ('dashboard_home', 'dashboard', {}),
+    ('crm_dashboard', 'crm:dashboard', {}),
+    ('crm_stats_api', 'crm:stats_api', {}),
+    ('admin_customer_changelist', 'admin:crm_customer_changelist', {}),
+    ('admin_customer_search', 'admin:crm_customer_changelist', {'q': '宏達科技'}),
+    ('admin_customer_filtered', 'admin:crm_customer_changelist', {'stage__exact': 'NEGOTIATION'}),
+    ('admin_transaction_changelist', 'admin:finance_transaction_changelist', {}),
+    ('admin_transaction_filtered', 'admin:finance_transaction_changelist', {'category__exact': 'REVENUE'}),
+    ('admin_user_changelist', 'admin:hr_user_changelist', {}),
+    ('employee_api', 'hr:employee-list', {}),
+]
+
+DEFAULT_SCALES = (10_000, 100_000, 1_000_000)
+USERS_PER_SCALE = 100  # 每 100 筆客戶 / 交易搭配 1 個使用者 (1M 規模 = 1 萬名員工)
+USER_PREFIX = 'bench'
+
+# 比對時視為退化的門檻
+LATENCY_TOLERANCE = 0.20  # p95 增加超過 20%
+LATENCY_FLOOR_MS = 2.0    # 且絕對差距超過 2ms (避免極短請求的雜訊)
+
+
+def percentile(values, pct):
+    """nearest-rank 百分位數"""
+    ordered = sorted(values)
+    if not ordered:
+        return None
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def measure(client, url, params, repeat, cold_cache=False):
+    """同一端點請求 repeat 次 (另含一次暖機與一次記憶體量測)，回傳統計結果"""
+    def request():
+        if cold_cache:
+            cache.clear()
+        return client.get(url, params)
+
+    response = request()  # 暖機：載入模板、建立連線、填入快取
+    latencies, queries, sql_times = [], [], []
+    for _ in range(repeat):
+        with CaptureQueriesContext(connection) as ctx:
+            started = time.perf_counter()
+            response = request()
+            latencies.append((time.perf_counter() - started) * 1000)
+        queries.append(len(ctx.captured_queries))
+        sql_times.append(sum(float(query['time']) for query in ctx.captured_queries) * 1000)
+
+    tracemalloc.start()
+    try:
+        request()
+        _current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'status': response.status_code,
+        'bytes': len(response.content),
+        'p50_ms': round(percentile(latencies, 50), 2),
+        'p95_ms': round(percentile(latencies, 95), 2),
+        'mean_ms': round(sum(latencies) / len(latencies), 2),
+        'queries': max(queries),
+        'sql_ms': round(sum(sql_times) / len(sql_times), 2),
+        'peak_kb': round(peak / 1024, 1),
+    }
+
+
+class Dataset:
+    """
+    逐級擴充的壓測資料：從目前筆數補到下一個規模 (10k → 100k → 1M)，不必每個規模重新產生。
+    區塊編號由起始序號決定，因此同一 seed 下每個規模的資料內容固定，可跨 commit 比較。
+    """
+
+    def __init__(self, seed, anchor, chunk_size, use_copy):
+        self.chunk_size = chunk_size
+        self.counts = {'users': 0, 'customers': 0, 'transactions': 0}
+        self.options = {
+            'seed': seed,
+            'anchor': anchor,
+            'use_copy': use_copy,
+            'batch_size': 5000,
+            'prefix': USER_PREFIX,
+            'password': synthetic.hashed_password(),
+            'years': 5,
+        }
+
+    def grow(self, scale):
+        User = get_user_model()
+        self._fill('users', scale // USERS_PER_SCALE, max(1, self.chunk_size // USERS_PER_SCALE))
+
+        accounts = User.objects.filter(username__startswith=USER_PREFIX).order_by('username')
+        self.options['assignees'] = list(accounts.filter(role='CRM').values_list('pk', flat=True))
+        self.options['creators'] = list(accounts.filter(role='FINANCE').values_list('pk', flat=True))
+
+        self._fill('customers', scale, self.chunk_size)
+        self._fill('transactions', scale, self.chunk_size)
+
+        # write_chunk 不做增量維護，統計表每次擴充後整體重建
+        PipelineRollup.objects.rebuild()
+        CashFlowDaily.objects.rebuild()
+        BalanceCheckpoint.objects.rebuild()
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+
+    def _fill(self, kind, total, chunk_size):
+        for index, start, count in synthetic.plan_chunks(total, chunk_size, offset=self.counts[kind]):
+            synthetic.write_chunk(kind, index, start, count, self.options)
+        self.counts[kind] = max(self.counts[kind], total)
+
+
+def run_endpoints(client, repeat, cold_cache=False, only=None):
+    results = {}
+    for name, url_name, params in ENDPOINTS:
+        if only and name not in only:
+            continue
+        results[name] = measure(client, reverse(url_name), params, repeat, cold_cache)
+    return results
+
+
+def metadata(**extra):
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, timeout=5,
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        'commit': commit,
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'database': connection.vendor,
+        'django': django.get_version(),
+        'python': platform.python_version(),
+        **extra,
+    }
+
+
+def compare(current, baseline):
+    """
+    比對兩份報告，回傳 [(規模, 端點, 指標, 基準值, 目前值, 是否退化)]：
+    查詢數增加、或 p95 同時超過相對與絕對門檻即視為退化。
+    """
+    rows = []
+    for scale, endpoints in current['results'].items():
+        for name, result in endpoints.items():
+            before = baseline.get('results', {}).get(scale, {}).get(name)
+            if not before:
+                continue
+            rows.append((scale, name, 'queries', before['queries'], result['queries'],
+                         result['queries'] > before['queries']))
+            slower = result['p95_ms'] - before['p95_ms']
+            rows.append((scale, name, 'p95_ms', before['p95_ms'], result['p95_ms'],
+                         slower > LATENCY_FLOOR_MS and slower > before['p95_ms'] * LATENCY_TOLERANCE))
+    return rows
+
+
+def json_payload(rows, seed=42):
+    """與交易 API 同形狀的資料，值保留 Decimal / datetime / 延遲翻譯字串等原始型別"""
+    rng = random.Random(seed)
+    labels = [gettext_lazy("營收"), gettext_lazy("薪資"), gettext_lazy("辦公支出")]
+    anchor = datetime.datetime(2026, 1, 1, tzinfo=datetime.timezone.utc)
+    return {
+        'results': [
+            {
+                'id': index,
+                'date': anchor.date() - datetime.timedelta(days=index % 1800),
+                'category': labels[index % len(labels)],
+                'title': f"交易 #{index}",
+                'amount': decimal.Decimal(rng.randrange(-500_000_00, 500_000_00)) / 100,
+                'created_by': index % 97 or None,
+                'created_at': anchor - datetime.timedelta(seconds=index * 37),
+                'updated_at': anchor - datetime.timedelta(seconds=index * 11),
+            }
+            for index in range(1, rows + 1)
+        ],
+    }
+
+
+def json_codecs(rows, repeat):
+    """
+    同一份 payload 以標準庫 json (DjangoJSONEncoder) 與 core.json 各編解碼 repeat 次，
+    回傳 {'rows', 'bytes', 'engine', 'stdlib': {...}, 'fast': {...}}，耗時取中位數 (毫秒)
+    """
+    payload = json_payload(rows)
+
+    def stdlib_dumps():
+        return json.dumps(payload, cls=DjangoJSONEncoder, ensure_ascii=False).encode()
+
+    def timed(func, *args):
+        samples = []
+        for _round in range(repeat):
+            started = time.perf_counter()
+            func(*args)
+            samples.append((time.perf_counter() - started) * 1000)
+        return round(percentile(samples, 50), 2)
+
+    body = fast_json.dumps(payload)
+    return {
+        'rows': rows,
+        'bytes': len(body),
+        'engine': 'orjson' if fast_json.orjson is not None else 'json',
+        'stdlib': {'dumps_ms': timed(stdlib_dumps), 'loads_ms': timed(json.loads, body)},
+        'fast': {'dumps_ms': timed(fast_json.dumps, payload), 'loads_ms': timed(fast_json.loads, body)},
+    }
+
+
+def load_report(path):
+    with open(path, encoding='utf-8') as fp:
+        return json.load(fp)
+
+
+def write_report(report, path):
+    with open(path, 'w', encoding='utf-8') as fp:
+        json.dump(report, fp, ensure_ascii=False, indent=2, sort_keys=True)
+        fp.write('\n')
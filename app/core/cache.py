@@ -0,0 +1,199 @@
+"""
+Nexus 共用快取工具
+
+- 版本化快取：每個命名空間 (namespace) 有一個版本號，資料異動時遞增版本，
+  舊版本的快取自然失效，不需要逐一刪除 key。
+- ETag / 304：版本號同時作為強 ETag，前端輪詢時若資料未變，只需讀一次版本號即可回 304。
+- 命中率統計：hits / misses / not_modified 計數存放在共用快取中，多個 worker 可累計。
+- stale-while-revalidate：過期 (或版本已變) 的內容先回傳，同時在背景執行緒重新計算，
+  只有完全沒有快取時才需要等待計算。
+"""
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.cache import cache
+from django.db import close_old_connections
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.http import parse_etags
+
+from core import json
+
+logger = logging.getLogger('core.cache')
+
+STAT_FIELDS = ('hits', 'misses', 'not_modified', 'stale')
+
+# 記錄有哪些命名空間出現過統計，供 cache_stats 指令列出
+STATS_INDEX_KEY = 'nexus:stats:index'
+
+
+def _version_key(namespace):
+    return f'nexus:ver:{namespace}'
+
+
+def get_version(namespace):
+    """取得命名空間目前的版本號；不存在 (或被淘汰) 時以時間戳初始化，避免重複使用舊版本號"""
+    key = _version_key(namespace)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time_ns(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def bump_version(namespace):
+    """資料異動時呼叫，讓該命名空間底下的所有快取失效"""
+    key = _version_key(namespace)
+    try:
+        try:
+            return cache.incr(key)
+        except ValueError:
+            cache.set(key, time.time_ns(), timeout=None)
+    except Exception:
+        # 快取服務異常不應中斷資料寫入，但需留下紀錄以便追查過期數據
+        logger.exception("Cache version bump failed: %s", namespace)
+
+
+def record(namespace, field):
+    """累加命中率計數 (hits / misses / not_modified / stale)"""
+    key = f'nexus:stats:{namespace}:{field}'
+    try:
+        try:
+            cache.incr(key)
+        except ValueError:
+            if not cache.add(key, 1, timeout=None):
+                cache.incr(key)
+            index = cache.get(STATS_INDEX_KEY) or []
+            if namespace not in index:
+                cache.set(STATS_INDEX_KEY, sorted({*index, namespace}), timeout=None)
+    except Exception:
+        logger.warning("Cache stats update failed: %s", namespace, exc_info=True)
+
+
+def get_stats(namespaces=None):
+    """回傳 {namespace: {'hits', 'misses', 'not_modified', 'stale', 'hit_ratio'}}"""
+    namespaces = namespaces or cache.get(STATS_INDEX_KEY) or []
+    keys = {
+        f'nexus:stats:{namespace}:{field}': (namespace, field)
+        for namespace in namespaces
+        for field in STAT_FIELDS
+    }
+    values = cache.get_many(list(keys))
+    stats = {namespace: dict.fromkeys(STAT_FIELDS, 0) for namespace in namespaces}
+    for key, value in values.items():
+        namespace, field = keys[key]
+        stats[namespace][field] = value
+    for item in stats.values():
+        served = item['hits'] + item['not_modified'] + item['stale']
+        total = served + item['misses']
+        item['hit_ratio'] = round(served / total, 4) if total else None
+    return stats
+
+
+def reset_stats(namespaces=None):
+    namespaces = namespaces or cache.get(STATS_INDEX_KEY) or []
+    cache.delete_many([
+        f'nexus:stats:{namespace}:{field}'
+        for namespace in namespaces
+        for field in STAT_FIELDS
+    ])
+
+
+def versioned_json_response(request, namespace, build_payload, timeout=300, variant=None):
+    """
+    以版本化快取回傳 JSON：
+    1. If-None-Match 與目前版本相符 → 直接 304，不查資料庫也不序列化
+    2. 快取中有該版本的 payload → 直接回傳已序列化的位元組
+    3. 都沒有才呼叫 build_payload() 重新計算並寫入快取
+    同一命名空間下依查詢參數產生不同內容時，以 variant 區分 payload (例如 "2025-01-01:2025-12-31:month")。
+    """
+    version = get_version(namespace)
+    etag = f'"{namespace}-{version}"'
+    headers = {'ETag': etag, 'Cache-Control': 'private, no-cache'}
+
+    if etag in parse_etags(request.headers.get('If-None-Match', '')):
+        record(namespace, 'not_modified')
+        response = HttpResponseNotModified()
+        for header, value in headers.items():
+            response[header] = value
+        return response
+
+    payload_key = f'nexus:payload:{namespace}:{version}'
+    if variant:
+        payload_key = f'{payload_key}:{variant}'
+    body = cache.get(payload_key)
+    if body is None:
+        record(namespace, 'misses')
+        body = json.dumps(build_payload())
+        cache.set(payload_key, body, timeout=timeout)
+    else:
+        record(namespace, 'hits')
+
+    return HttpResponse(body, content_type='application/json', headers=headers)
+
+
+# 背景重新計算用的執行緒；不依附於請求的事件迴圈，WSGI (gunicorn) 下回應送出後仍會完成
+_revalidator = ThreadPoolExecutor(max_workers=4, thread_name_prefix='nexus-swr')
+
+
+def _build(key, namespace, build, fresh_for, stale_for):
+    """計算並寫入快取，版本號在計算前取得，計算期間若資料異動，下次讀取仍會視為過期"""
+    version = get_version(namespace)
+    value = build()
+    cache.set(key, {'version': version, 'expires': time.time() + fresh_for, 'value': value},
+              timeout=fresh_for + stale_for)
+    return value
+
+
+def _revalidate(key, namespace, build, fresh_for, stale_for):
+    """背景執行緒：自行管理資料庫連線，結束時釋放鎖"""
+    close_old_connections()
+    try:
+        return _build(key, namespace, build, fresh_for, stale_for)
+    except Exception:
+        logger.exception("Cache revalidation failed: %s", key)
+    finally:
+        cache.delete(f'{key}:refreshing')
+        close_old_connections()
+
+
+def revalidate_in_background(key, namespace, build, fresh_for, stale_for):
+    """排入背景重新計算，回傳 Future；同一個 key 已在計算中 (cache.add 作為跨 worker 的鎖) 時回傳 None"""
+    if not cache.add(f'{key}:refreshing', 1, timeout=60):
+        return None
+    return _revalidator.submit(_revalidate, key, namespace, build, fresh_for, stale_for)
+
+
+def _swr_key(namespace, name):
+    return f'nexus:swr:{namespace}:{name}'
+
+
+def prime(namespace, name, build, fresh_for=60, stale_for=3600):
+    """
+    直接計算並寫入 stale_while_revalidate 的快取項目，不讀取舊值也不排入背景重新計算。
+    💡 gunicorn preload 時在 master 暖機 (fork 之前) 使用：不能提交工作到 _revalidator 或設定 :refreshing 鎖，
+    否則 worker 會繼承 master 的執行緒池狀態，且鎖在 60 秒內擋住所有 worker 的重新計算
+    """
+    return _build(_swr_key(namespace, name), namespace, build, fresh_for, stale_for)
+
+
+def stale_while_revalidate(namespace, name, build, fresh_for=60, stale_for=3600):
+    """
+    以 stale-while-revalidate 取得 build() 的結果，回傳 (value, is_stale)：
+    1. 快取為目前版本且未超過 fresh_for 秒 → 直接回傳
+    2. 已過期或命名空間版本已變，但仍在 fresh_for + stale_for 內 → 回傳舊值，背景重新計算
+    3. 沒有快取 → 同步計算 (呼叫端只需等待這一種情況)
+    """
+    key = _swr_key(namespace, name)
+    entry = cache.get(key)
+    if entry is None:
+        record(namespace, 'misses')
+        return _build(key, namespace, build, fresh_for, stale_for), False
+
+    if entry['version'] == get_version(namespace) and entry['expires'] > time.time():
+        record(namespace, 'hits')
+        return entry['value'], False
+
+    record(namespace, 'stale')
+    revalidate_in_background(key, namespace, build, fresh_for, stale_for)
+    return entry['value'], True
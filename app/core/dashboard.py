@@ -0,0 +1,116 @@
+"""
+Nexus 首頁看板 (CRM 管線 / 財務現金流 / HR 人力)
+
+- 每個 widget 各自以 stale-while-revalidate 快取 (core.cache.stale_while_revalidate)，
+  版本號跟隨各模組的命名空間，資料異動後先回傳舊值並於背景重新計算
+- load_widgets() 以 asyncio.gather 同時載入所有 widget：每個 widget 在獨立執行緒、獨立資料庫連線中執行
+  (thread_sensitive=False)，頁面延遲取決於最慢的一個未命中，而不是所有查詢的總和
+  💡 Django 的 async ORM (aaggregate 等) 預設 thread_sensitive=True，同一請求內仍會排隊在同一條執行緒，
+  因此這裡直接把同步的聚合函式丟到各自的執行緒
+"""
+import asyncio
+import logging
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.db import close_old_connections
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from apps.crm.models import PipelineRollup
+from apps.crm.signals import PIPELINE_CACHE_NAMESPACE
+from apps.finance.models import BalanceCheckpoint, CashFlowDaily
+from apps.finance.signals import CASHFLOW_CACHE_NAMESPACE
+from apps.hr.signals import DIRECTORY_CACHE_NAMESPACE
+from core.cache import prime, stale_while_revalidate
+
+logger = logging.getLogger('core.dashboard')
+
+# 版本未變時視為新鮮的秒數；超過後 (或版本已變) 在 STALE_FOR 秒內仍先回傳舊值
+FRESH_FOR = 300
+STALE_FOR = 24 * 3600
+
+
+def crm_widget():
+    stats = PipelineRollup.objects.summary()
+    return {
+        'title': "CRM 管線",
+        'cards': [
+            {"title": "總客戶數", "value": f"{stats['count']:,}", "icon": "groups"},
+            {"title": "預估總案量", "value": f"${stats['total']:,.0f}", "icon": "payments"},
+            {"title": "活躍商機", "value": f"{stats['active']:,}", "icon": "trending_up"},
+        ],
+    }
+
+
+def finance_widget():
+    today = timezone.localdate()
+    month = CashFlowDaily.objects.filter(date__gte=today.replace(day=1), date__lte=today).totals()
+    balance = BalanceCheckpoint.objects.balance_as_of(today)
+    return {
+        'title': "財務現金流",
+        'cards': [
+            {"title": "本月收入", "value": f"${month['income']:,.0f}", "icon": "savings"},
+            {"title": "本月支出", "value": f"${month['expense']:,.0f}", "icon": "receipt_long"},
+            {"title": "目前餘額", "value": f"${balance:,.0f}", "icon": "account_balance"},
+        ],
+    }
+
+
+def hr_widget():
+    User = get_user_model()
+    month_start = timezone.localdate().replace(day=1)
+    stats = User.objects.filter(is_active=True).aggregate(
+        headcount=Count('id'),
+        joined=Count('id', filter=Q(date_joined__date__gte=month_start)),
+        sales=Count('id', filter=Q(role=User.Role.CRM)),
+    )
+    return {
+        'title': "HR 人力",
+        'cards': [
+            {"title": "在職員工", "value": f"{stats['headcount']:,}", "icon": "badge"},
+            {"title": "本月到職", "value": f"{stats['joined']:,}", "icon": "person_add"},
+            {"title": "業務人員", "value": f"{stats['sales']:,}", "icon": "support_agent"},
+        ],
+    }
+
+
+# (快取名稱, 版本命名空間, 計算函式)，依顯示順序排列
+WIDGETS = [
+    ('crm', PIPELINE_CACHE_NAMESPACE, crm_widget),
+    ('finance', CASHFLOW_CACHE_NAMESPACE, finance_widget),
+    ('hr', DIRECTORY_CACHE_NAMESPACE, hr_widget),
+]
+
+
+def load_widget(name, namespace, build):
+    """在工作執行緒中執行，結束時歸還該執行緒的資料庫連線"""
+    close_old_connections()
+    try:
+        value, stale = stale_while_revalidate(
+            namespace, f'dashboard:{name}', build, fresh_for=FRESH_FOR, stale_for=STALE_FOR,
+        )
+        return {**value, 'name': name, 'stale': stale}
+    finally:
+        close_old_connections()
+
+
+def prime_widgets():
+    """暖機用：同步計算每個 widget 並直接寫入快取 (不經過背景重新計算，fork 之前呼叫也安全)"""
+    for name, namespace, build in WIDGETS:
+        prime(namespace, f'dashboard:{name}', build, fresh_for=FRESH_FOR, stale_for=STALE_FOR)
+
+
+async def load_widgets():
+    """同時載入所有 widget；單一 widget 失敗只影響該區塊，不讓整頁 500"""
+    results = await asyncio.gather(
+        *(sync_to_async(load_widget, thread_sensitive=False)(*widget) for widget in WIDGETS),
+        return_exceptions=True,
+    )
+    widgets = []
+    for (name, _namespace, _build), result in zip(WIDGETS, results):
+        if isinstance(result, Exception):
+            logger.error("Dashboard widget failed: %s", name, exc_info=result)
+            result = {'name': name, 'title': name.upper(), 'cards': [], 'error': True}
+        widgets.append(result)
+    return widgets
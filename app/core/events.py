@@ -0,0 +1,205 @@
+"""
+Nexus 即時事件 (Server-Sent Events)
+
+- 模組在統計異動並提交後 publish(channel, data)，頻道名稱沿用快取命名空間 (crm.pipeline、finance.cashflow)
+- 每個 SSE 連線只是一個 asyncio.Queue 訂閱 (Subscription)，不佔用執行緒與資料庫連線；
+  同一個 worker 的所有連線共用一條 Redis pub/sub 連線，由 Broker 在行程內分送 (fan-out)
+- LocalBroker：行程內分送，測試與單一行程開發使用
+- RedisBroker：跨 worker / 主機，publish 寫入 Redis，各 worker 的 listener 收到後分送給本地訂閱者
+- 訂閱者處理不及 (佇列滿) 時丟棄累積的增量，改送一筆 {'type': 'reset'}，前端收到後重新讀取完整數據
+
+SSE 串流需要 ASGI 伺服器 (uvicorn)；WSGI 下 events_stream 只回覆 retry 間隔，瀏覽器退化為定期重連。
+"""
+import asyncio
+import logging
+import threading
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+from core import json
+
+# 💡 redis 為選用套件 (django-redis 的相依套件)：未安裝時只能使用 LocalBroker
+try:
+    import redis
+    import redis.asyncio as aioredis
+except ImportError:
+    redis = None
+
+logger = logging.getLogger('core.events')
+
+# 每個訂閱者最多累積的事件數，超過即改送 reset
+QUEUE_SIZE = 100
+RESET = {'type': 'reset'}
+
+
+class Subscription:
+    """一個 SSE 連線的訂閱；dispatch 可能來自其他執行緒，一律排回訂閱者所在的事件迴圈"""
+
+    def __init__(self, channels):
+        self.channels = frozenset(channels)
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+
+    def offer(self, channel, data):
+        self.loop.call_soon_threadsafe(self._put, channel, data)
+
+    def _put(self, channel, data):
+        try:
+            self.queue.put_nowait((channel, data))
+        except asyncio.QueueFull:
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait((channel, RESET))
+
+    async def get(self, timeout=None):
+        """下一筆 (channel, data)；逾時回傳 None"""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class LocalBroker:
+    """行程內分送"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = set()
+
+    def subscriber_count(self):
+        return len(self._subscribers)
+
+    async def subscribe(self, channels):
+        subscription = Subscription(channels)
+        with self._lock:
+            self._subscribers.add(subscription)
+        return subscription
+
+    async def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def dispatch(self, channel, data):
+        with self._lock:
+            targets = [sub for sub in self._subscribers if channel in sub.channels]
+        for subscription in targets:
+            try:
+                subscription.offer(channel, data)
+            except RuntimeError:
+                # 訂閱者的事件迴圈已關閉 (連線中斷但尚未取消訂閱)
+                with self._lock:
+                    self._subscribers.discard(subscription)
+
+    def publish(self, channel, data):
+        self.dispatch(channel, data)
+
+
+class RedisBroker(LocalBroker):
+    """
+    publish 以同步 Redis 連線寫入 (在請求或 on_commit 中呼叫)；
+    每個事件迴圈只有一個 listener task 以 PSUBSCRIBE 接收所有頻道，再交由 dispatch 分送
+    """
+    prefix = 'nexus:events:'
+
+    def __init__(self, url):
+        if redis is None:
+            raise ImproperlyConfigured("RedisBroker 需要安裝 redis 套件")
+        super().__init__()
+        self.url = url
+        self._client = redis.Redis.from_url(url)
+        self._listener = None
+
+    async def subscribe(self, channels):
+        subscription = await super().subscribe(channels)
+        if self._listener is None or self._listener.done():
+            self._listener = asyncio.get_running_loop().create_task(self._listen())
+        return subscription
+
+    async def unsubscribe(self, subscription):
+        await super().unsubscribe(subscription)
+        if not self._subscribers and self._listener is not None:
+            self._listener.cancel()
+            self._listener = None
+
+    async def _listen(self):
+        """Redis 斷線時以遞增間隔重連；重連期間可能漏掉事件，因此重連後對所有訂閱者送出 reset"""
+        delay = 1
+        reconnected = False
+        while True:
+            client = aioredis.from_url(self.url)
+            try:
+                async with client.pubsub() as pubsub:
+                    await pubsub.psubscribe(f'{self.prefix}*')
+                    if reconnected:
+                        for subscription in list(self._subscribers):
+                            for channel in subscription.channels:
+                                subscription.offer(channel, RESET)
+                    delay = 1
+                    async for message in pubsub.listen():
+                        if message['type'] != 'pmessage':
+                            continue
+                        channel = message['channel'].decode()[len(self.prefix):]
+                        self.dispatch(channel, json.loads(message['data']))
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.warning("Event listener disconnected, retrying in %ss", delay, exc_info=True)
+                reconnected = True
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 30)
+            finally:
+                await client.aclose()
+
+    def publish(self, channel, data):
+        try:
+            self._client.publish(f'{self.prefix}{channel}', json.dumps(data))
+        except Exception:
+            # 推播失敗不應中斷資料寫入；前端重連或下次讀取時仍會取得最新數據
+            logger.exception("Event publish failed: %s", channel)
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    """依 settings.EVENTS_BROKER ('local' / 'redis') 建立行程內唯一的 broker"""
+    global _broker
+    with _broker_lock:
+        if _broker is None:
+            if settings.EVENTS_BROKER == 'redis':
+                _broker = RedisBroker(settings.EVENTS_REDIS_URL)
+            elif settings.EVENTS_BROKER == 'local':
+                _broker = LocalBroker()
+            else:
+                raise ImproperlyConfigured(f"未知的 EVENTS_BROKER：{settings.EVENTS_BROKER}")
+        return _broker
+
+
+def publish(channel, data):
+    get_broker().publish(channel, data)
+
+
+def format_event(channel, data):
+    """SSE 訊息格式：event 為頻道名稱，data 為單行 JSON"""
+    return b'event: ' + channel.encode() + b'\ndata: ' + json.dumps(data) + b'\n\n'
+
+
+async def stream(channels, heartbeat=15):
+    """
+    SSE 串流內容：先訂閱再送出 retry 設定，之後逐筆送出事件；閒置 heartbeat 秒送一行註解，
+    讓 proxy 不因閒置斷線，也讓伺服器及早發現已關閉的連線。連線中斷時 (ASGI 取消) 取消訂閱。
+    """
+    broker = get_broker()
+    subscription = await broker.subscribe(channels)
+    try:
+        yield b'retry: 5000\n\n'
+        while True:
+            item = await subscription.get(timeout=heartbeat)
+            if item is None:
+                yield b': ping\n\n'
+            else:
+                yield format_event(*item)
+    finally:
+        await broker.unsubscribe(subscription)
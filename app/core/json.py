@@ -0,0 +1,109 @@
+"""
+Nexus 高速 JSON 編解碼
+
+- dumps() / loads()：安裝 orjson 時由其以 C 實作編碼，直接輸出 UTF-8 bytes；
+  未安裝時退回標準庫 json + DjangoJSONEncoder，輸出格式相同
+- Decimal 一律輸出為字串 (例如 "1234.50")，與 DRF、DjangoJSONEncoder 一致，不經 float 失去精度
+- datetime / date / time / UUID 由 orjson 原生處理 (UTC 以 Z 結尾)；
+  gettext_lazy 等延遲翻譯字串、timedelta 由 default() 轉換
+- FastJsonResponse：JsonResponse 的替代品
+- FastJSONRenderer / FastJSONParser：DRF 的 renderer / parser，於 settings.REST_FRAMEWORK 設定
+"""
+import datetime
+import decimal
+import json
+import uuid
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse
+from django.utils.duration import duration_iso_string
+from django.utils.functional import Promise
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+from rest_framework.renderers import BaseRenderer
+
+# 💡 orjson 為選用套件：未安裝時改用標準庫 json
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+if orjson is not None:
+    # 非字串的 dict key (例如 {date: ...}) 轉為字串，與標準庫 json 的行為相近
+    OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_UTC_Z
+    JSONDecodeError = orjson.JSONDecodeError
+else:
+    JSONDecodeError = json.JSONDecodeError
+
+
+def default(value):
+    """orjson 無法原生處理的型別"""
+    if isinstance(value, decimal.Decimal):
+        return str(value)
+    if isinstance(value, Promise):
+        return str(value)
+    if isinstance(value, datetime.timedelta):
+        return duration_iso_string(value)
+    if isinstance(value, (set, frozenset, tuple)):
+        return list(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+class _Encoder(DjangoJSONEncoder):
+    """未安裝 orjson 時使用；datetime 等交由 DjangoJSONEncoder，其餘沿用 default()"""
+
+    def default(self, o):
+        if isinstance(o, (datetime.datetime, datetime.date, datetime.time, uuid.UUID)):
+            return super().default(o)
+        return default(o)
+
+
+def dumps(data, indent=False):
+    """序列化為 UTF-8 bytes"""
+    if orjson is not None:
+        option = OPTIONS | orjson.OPT_INDENT_2 if indent else OPTIONS
+        return orjson.dumps(data, default=default, option=option)
+    return json.dumps(data, cls=_Encoder, ensure_ascii=False, indent=2 if indent else None).encode()
+
+
+def loads(data):
+    """接受 bytes 或 str"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+class FastJsonResponse(HttpResponse):
+    """與 JsonResponse 相同用法；safe=True 時只允許 dict，避免輸出頂層陣列"""
+
+    def __init__(self, data, safe=True, **kwargs):
+        if safe and not isinstance(data, dict):
+            raise TypeError("In order to allow non-dict objects to be serialized set the safe parameter to False.")
+        kwargs.setdefault('content_type', 'application/json')
+        super().__init__(content=dumps(data), **kwargs)
+
+
+class FastJSONRenderer(BaseRenderer):
+    """DRF renderer；可瀏覽 API 要求縮排時輸出兩格縮排"""
+    media_type = 'application/json'
+    format = 'json'
+    charset = None  # JSON 一律為 UTF-8，不附加 charset 參數
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        indent = (renderer_context or {}).get('indent')
+        if accepted_media_type and 'indent=' in accepted_media_type:
+            indent = True
+        return dumps(data, indent=bool(indent))
+
+
+class FastJSONParser(BaseParser):
+    media_type = 'application/json'
+    renderer_class = FastJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return loads(stream.read())
+        except (JSONDecodeError, UnicodeDecodeError) as exc:
+            raise ParseError(f"JSON parse error - {exc}")
@@ -0,0 +1,153 @@
+"""
+Nexus 非阻塞日誌管線
+
+1. BackgroundHandler：請求執行緒只把 LogRecord 放進記憶體佇列，格式化與寫檔交給背景執行緒
+   (QueueListener)；佇列滿時直接丟棄並計數，絕不讓請求等待磁碟 I/O。
+2. SQL 查詢不再逐筆走 django.db.backends 的 DEBUG 日誌，改由 execute_wrapper 計時：
+   超過 SQL_SLOW_QUERY_MS 的慢查詢一律記錄，其餘依 SQL_LOG_SAMPLE_RATE 抽樣，
+   以 JSON Lines 寫入 logs/sql.log。DEBUG=False 的正式環境同樣能看到慢查詢。
+"""
+import atexit
+import datetime
+import json
+import logging
+import os
+import queue
+import random
+import time
+from logging.handlers import QueueHandler, QueueListener
+
+from django.conf import settings
+
+sql_logger = logging.getLogger('core.sql')
+
+# runserver 存取紀錄中的雜訊路徑
+NOISE_PATHS = ('com.chrome.devtools.json', '/admin/jsi18n/', 'favicon.ico')
+
+
+class SuppressNoiseFilter(logging.Filter):
+    """
+    過濾瀏覽器與框架產生的雜訊，以及成功的 GET 存取紀錄。
+    💡 直接檢查 record.args (請求行、狀態碼)，不呼叫 getMessage() 組字串；
+    非 INFO 等級的紀錄 (警告、錯誤) 一律放行。
+    """
+
+    def filter(self, record):
+        if record.levelno != logging.INFO:
+            return True
+        args = record.args if isinstance(record.args, tuple) else ()
+        request_line = args[0] if args and isinstance(args[0], str) else ''
+        if any(path in request_line for path in NOISE_PATHS):
+            return False
+        status = str(args[1]) if len(args) > 1 else ''
+        return not (request_line.startswith('GET ') and status == '200')
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """每筆紀錄一行 JSON；extra 帶入的欄位 (例如 SQL 的 duration_ms) 原樣輸出"""
+
+    RESERVED = frozenset(vars(logging.makeLogRecord({}))) | {'message', 'asctime'}
+
+    def format(self, record):
+        data = {
+            'time': datetime.datetime.fromtimestamp(record.created).astimezone().isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in self.RESERVED and not key.startswith('_'):
+                data[key] = value
+        if record.exc_info:
+            data['exception'] = self.formatException(record.exc_info)
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+class BackgroundHandler(QueueHandler):
+    """
+    把紀錄轉交給背景執行緒，由 handlers 列出的 handler (依 LOGGING 中的名稱) 實際輸出。
+    背景執行緒在每個行程第一次寫日誌時才啟動，gunicorn fork 出的 worker 各自擁有自己的佇列與執行緒。
+    """
+
+    def __init__(self, handlers=(), maxsize=10_000):
+        super().__init__(queue.Queue(maxsize))
+        # 設定當下就取得 handler 實體：logging 只以弱參照登記 handler，未掛在 logger 上的會被回收
+        self.targets = [_handler_by_name(name) for name in handlers]
+        self.maxsize = maxsize
+        self.listener = None
+        self.dropped = 0
+        self._pid = None
+
+    def prepare(self, record):
+        # 同一行程內的佇列不需序列化，訊息留給背景執行緒組裝
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def emit(self, record):
+        if self._pid != os.getpid():
+            self.start()
+        super().emit(record)
+
+    def start(self):
+        # fork 後沿用父行程的佇列可能卡在父行程持有的鎖，子行程一律重建
+        self.queue = queue.Queue(self.maxsize)
+        self.listener = QueueListener(self.queue, *self.targets, respect_handler_level=True)
+        self.listener.start()
+        self._pid = os.getpid()
+        atexit.register(self.stop)
+
+    def stop(self):
+        """送出佇列中剩餘的紀錄並停止背景執行緒"""
+        if self.listener and self._pid == os.getpid():
+            self.listener.stop()
+            self.listener = None
+            self._pid = None
+
+    def close(self):
+        self.stop()
+        super().close()
+
+
+def _handler_by_name(name):
+    getter = getattr(logging, 'getHandlerByName', None)  # Python 3.12+
+    handler = getter(name) if getter else logging._handlers.get(name)
+    if handler is None:
+        # dictConfig 依名稱排序建立 handler，遇到此訊息會延後到其他 handler 建立完成後重試
+        raise ValueError(f'Unable to resolve handler {name!r}') from TypeError('target not configured yet')
+    return handler
+
+
+def log_query(execute, sql, params, many, context):
+    """execute_wrapper：計時每筆查詢，慢查詢或抽樣命中時才產生日誌紀錄"""
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        duration_ms = (time.perf_counter() - started) * 1000
+        slow = duration_ms >= settings.SQL_SLOW_QUERY_MS
+        if slow or random.random() < settings.SQL_LOG_SAMPLE_RATE:
+            # 不記錄參數值，避免密碼雜湊、個資寫進日誌
+            sql_logger.log(
+                logging.WARNING if slow else logging.INFO,
+                'slow query' if slow else 'sampled query',
+                extra={
+                    'duration_ms': round(duration_ms, 3),
+                    'sql': sql,
+                    'many': many,
+                    'alias': context['connection'].alias,
+                },
+            )
+
+
+def install_query_logging(sender, connection, **kwargs):
+    """
+    connection_created receiver：每條資料庫連線掛上 log_query (重新連線時不重複掛載)。
+    💡 放在最前面：連線可能在 execute_wrapper() 區塊中才建立，該區塊結束時會 pop() 最後一個 wrapper
+    """
+    if log_query not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, log_query)
@@ -0,0 +1,119 @@
+import argparse
+import datetime
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.utils import timezone
+
+from core import benchmark
+
+User = get_user_model()
+
+
+def scale_list(value):
+    try:
+        scales = sorted({int(item.replace('_', '')) for item in value.split(',') if item.strip()})
+    except ValueError:
+        raise argparse.ArgumentTypeError("規模需為以逗號分隔的整數，例如 10000,100000")
+    if not scales or scales[0] <= 0:
+        raise argparse.ArgumentTypeError("規模需為正整數")
+    return scales
+
+
+class Command(BaseCommand):
+    help = "在獨立測試資料庫中以多種資料規模量測看板、後台列表與 API 的效能，輸出 JSON 報告"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--scales', type=scale_list, default=list(benchmark.DEFAULT_SCALES),
+            help="資料規模 (客戶與交易各自的筆數)，以逗號分隔；預設 10000,100000,1000000",
+        )
+        parser.add_argument('--repeat', type=int, default=10, help="每個端點量測的請求次數")
+        parser.add_argument('--seed', type=int, default=42, help="壓測資料的亂數種子")
+        parser.add_argument(
+            '--anchor', type=datetime.date.fromisoformat, default=datetime.date(2026, 1, 1),
+            help="壓測資料的時間基準日；固定基準日才能跨 commit 比較",
+        )
+        parser.add_argument('--chunk-size', type=int, default=10_000, help="每次寫入的筆數 (規模需為其倍數)")
+        parser.add_argument('--only', nargs='+', metavar='ENDPOINT', help="只量測指定端點")
+        parser.add_argument('--cold-cache', action='store_true', help="每次請求前清空快取，量測未命中時的表現")
+        parser.add_argument('--output', default='benchmark.json', help="JSON 報告輸出路徑")
+        parser.add_argument('--compare', metavar='BASELINE', help="與先前的報告比對，發現退化時以非零狀態結束")
+        parser.add_argument('--keepdb', action='store_true', help="保留測試資料庫 (除錯用)")
+
+    def handle(self, *args, **options):
+        names = {name for name, _url, _params in benchmark.ENDPOINTS}
+        if options['only'] and set(options['only']) - names:
+            raise CommandError(f"❌ 未知的端點：{', '.join(sorted(set(options['only']) - names))}")
+        if options['repeat'] < 1:
+            raise CommandError("❌ --repeat 至少為 1")
+        if any(scale % options['chunk_size'] for scale in options['scales']):
+            raise CommandError(f"❌ 每個規模都需為 --chunk-size ({options['chunk_size']}) 的倍數")
+        baseline = benchmark.load_report(options['compare']) if options['compare'] else None
+
+        # 1. 建立獨立的測試資料庫，絕不碰觸開發 / 正式資料
+        setup_test_environment()
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False, keepdb=options['keepdb'])
+        try:
+            report = self.run(options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=options['keepdb'])
+            teardown_test_environment()
+
+        benchmark.write_report(report, options['output'])
+        self.stdout.write(self.style.SUCCESS(f"✅ 報告已寫入 {options['output']}"))
+
+        if baseline:
+            self.compare(report, baseline)
+
+    def run(self, options):
+        anchor = timezone.make_aware(datetime.datetime.combine(options['anchor'], datetime.time(18)))
+        dataset = benchmark.Dataset(
+            options['seed'], anchor, options['chunk_size'], use_copy=connection.vendor == 'postgresql',
+        )
+        admin = User.objects.create_superuser(username='bench_admin', password='x', email='bench@example.com')
+        client = Client()
+        client.force_login(admin)
+
+        results = {}
+        for scale in options['scales']:
+            self.stdout.write(self.style.WARNING(f"🏭 產生 {scale:,} 筆規模的資料..."))
+            dataset.grow(scale)
+            self.stdout.write(f"⏱️ 量測中 (每個端點 {options['repeat']} 次)...")
+            results[str(scale)] = benchmark.run_endpoints(
+                client, options['repeat'], options['cold_cache'], options['only'],
+            )
+            self.print_table(scale, results[str(scale)])
+
+        return {
+            'meta': benchmark.metadata(
+                seed=options['seed'], anchor=options['anchor'].isoformat(),
+                repeat=options['repeat'], cold_cache=options['cold_cache'],
+            ),
+            'results': results,
+        }
+
+    def print_table(self, scale, results):
+        self.stdout.write(f"\n📊 {scale:,} 筆")
+        self.stdout.write(f"{'端點':<30}{'狀態':>6}{'p50ms':>10}{'p95ms':>10}{'查詢':>6}{'SQLms':>10}{'峰值KB':>10}")
+        for name, row in results.items():
+            self.stdout.write(
+                f"{name:<30}{row['status']:>6}{row['p50_ms']:>10}{row['p95_ms']:>10}"
+                f"{row['queries']:>6}{row['sql_ms']:>10}{row['peak_kb']:>10}"
+            )
+        self.stdout.write('')
+
+    def compare(self, report, baseline):
+        rows = benchmark.compare(report, baseline)
+        regressions = [row for row in rows if row[-1]]
+        self.stdout.write(f"🔍 與 {baseline['meta'].get('commit') or '基準報告'} 比對：")
+        for scale, name, metric, before, after, regressed in rows:
+            if regressed:
+                self.stdout.write(self.style.ERROR(f"  ❌ [{scale}] {name} {metric}: {before} → {after}"))
+        if regressions:
+            raise CommandError(f"❌ 發現 {len(regressions)} 項效能退化")
+        self.stdout.write(self.style.SUCCESS(f"✅ 共比對 {len(rows)} 項指標，未發現退化"))
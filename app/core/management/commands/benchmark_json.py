@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core import benchmark
+from core.management.commands.benchmark import scale_list
+
+
+class Command(BaseCommand):
+    help = "比較標準庫 json 與 core.json (orjson) 在大型 payload 上的序列化 / 解析耗時"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rows', type=scale_list, default=[1_000, 10_000, 100_000],
+            help="payload 的筆數 (交易 API 形狀)，以逗號分隔；預設 1000,10000,100000",
+        )
+        parser.add_argument('--repeat', type=int, default=5, help="每種編解碼量測的次數 (取中位數)")
+
+    def handle(self, *args, **options):
+        if options['repeat'] < 1:
+            raise CommandError("❌ --repeat 至少為 1")
+
+        results = [benchmark.json_codecs(rows, options['repeat']) for rows in options['rows']]
+        self.stdout.write(f"⚙️ core.json 引擎：{results[0]['engine']}")
+        self.stdout.write(f"{'筆數':>10}{'大小KB':>10}{'json 編碼':>12}{'快速編碼':>12}{'倍數':>8}{'json 解析':>12}{'快速解析':>12}{'倍數':>8}")
+        for row in results:
+            stdlib, fast = row['stdlib'], row['fast']
+            self.stdout.write(
+                f"{row['rows']:>10,}{row['bytes'] / 1024:>10,.0f}"
+                f"{stdlib['dumps_ms']:>12}{fast['dumps_ms']:>12}{speedup(stdlib['dumps_ms'], fast['dumps_ms']):>8}"
+                f"{stdlib['loads_ms']:>12}{fast['loads_ms']:>12}{speedup(stdlib['loads_ms'], fast['loads_ms']):>8}"
+            )
+        self.stdout.write(self.style.SUCCESS("✅ 量測完成 (耗時單位：毫秒)"))
+
+
+def speedup(before, after):
+    return f"{before / after:.1f}x" if after else "-"
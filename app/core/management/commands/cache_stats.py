@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from core.cache import get_stats, reset_stats
+
+
+class Command(BaseCommand):
+    help = "顯示版本化快取的命中率統計 (hits / misses / 304 / stale)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('namespaces', nargs='*', help="只顯示指定的命名空間，例如 crm.pipeline")
+        parser.add_argument('--reset', action='store_true', help="顯示後歸零計數")
+
+    def handle(self, *args, **options):
+        stats = get_stats(options['namespaces'])
+        if not stats:
+            self.stdout.write(self.style.WARNING("尚無任何快取統計紀錄"))
+            return
+
+        for namespace, item in stats.items():
+            ratio = "-" if item['hit_ratio'] is None else f"{item['hit_ratio']:.1%}"
+            self.stdout.write(
+                f"📦 {namespace}: 命中 {item['hits']}，未命中 {item['misses']}，"
+                f"304 {item['not_modified']}，過期回傳 {item['stale']}，命中率 {ratio}"
+            )
+
+        if options['reset']:
+            reset_stats(list(stats))
+            self.stdout.write(self.style.SUCCESS("✅ 已歸零計數"))
@@ -0,0 +1,154 @@
+import http.client
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY, get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.module_loading import import_string
+
+from core.benchmark import percentile
+
+# 重啟情境：覆寫 gunicorn.conf.py 讀取的環境變數
+SCENARIOS = {
+    'cold': {'GUNICORN_PRELOAD': '0', 'NEXUS_WARMUP': '0'},
+    'preload': {'GUNICORN_PRELOAD': '1', 'NEXUS_WARMUP': '0'},
+    'warmup': {'GUNICORN_PRELOAD': '1', 'NEXUS_WARMUP': '1'},
+}
+DEFAULT_PATHS = ['/admin/login/', '/admin/', '/admin/crm/customer/', '/admin/finance/transaction/', '/api/hr/employees/']
+READY_PATH = '/favicon.ico'  # 只經過 URL 轉址，不載入模板與資料庫
+
+
+def ttfb(host, port, path, cookie=None, timeout=60):
+    """送出請求到收到狀態列與標頭的時間 (毫秒)，回傳 (ttfb_ms, status)"""
+    connection = http.client.HTTPConnection(host, port, timeout=timeout)
+    try:
+        started = time.perf_counter()
+        connection.request('GET', path, headers={'Cookie': cookie} if cookie else {})
+        response = connection.getresponse()
+        elapsed = (time.perf_counter() - started) * 1000
+        response.read()
+        return round(elapsed, 1), response.status
+    finally:
+        connection.close()
+
+
+class Command(BaseCommand):
+    help = "重啟 gunicorn 後量測首個請求的 TTFB，比較無 preload / preload / preload + 暖機"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--scenarios', default=','.join(SCENARIOS),
+            help=f"以逗號分隔的情境：{' / '.join(SCENARIOS)}",
+        )
+        parser.add_argument('--mode', choices=['wsgi', 'asgi'], default='wsgi', help="GUNICORN_MODE")
+        parser.add_argument('--paths', nargs='+', default=DEFAULT_PATHS, help="量測的路徑 (依序請求)")
+        parser.add_argument('--runs', type=int, default=3, help="每個情境重啟幾次 (取中位數)")
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--username', help="以該使用者的 session 請求 (後台頁面需 staff 帳號)")
+        parser.add_argument('--output', help="JSON 報告輸出路徑")
+
+    def handle(self, *args, **options):
+        scenarios = [name for name in options['scenarios'].split(',') if name]
+        unknown = set(scenarios) - set(SCENARIOS)
+        if unknown or not scenarios:
+            raise CommandError(f"❌ 未知的情境：{', '.join(sorted(unknown)) or '(空白)'}")
+        if options['runs'] < 1:
+            raise CommandError("❌ --runs 至少為 1")
+        cookie = self.session_cookie(options['username']) if options['username'] else None
+
+        results = {}
+        for scenario in scenarios:
+            self.stdout.write(self.style.WARNING(f"🔄 {scenario}：重啟 {options['runs']} 次..."))
+            runs = [self.measure(scenario, options, cookie) for _ in range(options['runs'])]
+            results[scenario] = self.summarize(runs, options['paths'])
+        self.print_table(results, options['paths'])
+
+        if options['output']:
+            Path(options['output']).write_text(
+                json.dumps({'mode': options['mode'], 'results': results}, ensure_ascii=False, indent=2) + '\n',
+                encoding='utf-8',
+            )
+            self.stdout.write(self.style.SUCCESS(f"✅ 報告已寫入 {options['output']}"))
+
+    def session_cookie(self, username):
+        """在目前資料庫建立登入 session，讓 gunicorn 處理的請求以該使用者身分執行"""
+        User = get_user_model()
+        try:
+            user = User.objects.get(username=username)
+        except User.DoesNotExist:
+            raise CommandError(f"❌ 找不到使用者 {username}")
+        session = import_string(f'{settings.SESSION_ENGINE}.SessionStore')()
+        session[SESSION_KEY] = str(user.pk)
+        session[BACKEND_SESSION_KEY] = settings.AUTHENTICATION_BACKENDS[0]
+        session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+        session.save()
+        return f'{settings.SESSION_COOKIE_NAME}={session.session_key}'
+
+    def measure(self, scenario, options, cookie):
+        """啟動單一 worker 的 gunicorn，等到可回應後依序請求各路徑兩次 (首次 / 已暖)"""
+        host, port = '127.0.0.1', options['port']
+        env = {
+            **os.environ,
+            **SCENARIOS[scenario],
+            'GUNICORN_MODE': options['mode'],
+            'GUNICORN_BIND': f'{host}:{port}',
+            'GUNICORN_WORKERS': '1',
+        }
+        env.pop('PROMETHEUS_MULTIPROC_DIR', None)
+        started = time.perf_counter()
+        process = subprocess.Popen(
+            [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py'],
+            cwd=settings.BASE_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        try:
+            ready_ms = self.wait_ready(process, host, port, started)
+            first, warm = {}, {}
+            for path in options['paths']:
+                first[path], _status = ttfb(host, port, path, cookie)
+                warm[path], _status = ttfb(host, port, path, cookie)
+            return {'ready_ms': ready_ms, 'first': first, 'warm': warm}
+        finally:
+            process.terminate()
+            try:
+                process.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+    def wait_ready(self, process, host, port, started, timeout=120):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                raise CommandError(f"❌ gunicorn 啟動失敗 (結束碼 {process.returncode})")
+            try:
+                ttfb(host, port, READY_PATH, timeout=timeout)
+            except (ConnectionError, socket.timeout, http.client.HTTPException):
+                time.sleep(0.05)
+                continue
+            return round((time.perf_counter() - started) * 1000, 1)
+        raise CommandError("❌ 等待 gunicorn 啟動逾時")
+
+    def summarize(self, runs, paths):
+        def median(values):
+            return percentile(values, 50)
+
+        return {
+            'ready_ms': median([run['ready_ms'] for run in runs]),
+            'first_ms': {path: median([run['first'][path] for run in runs]) for path in paths},
+            'warm_ms': {path: median([run['warm'][path] for run in runs]) for path in paths},
+        }
+
+    def print_table(self, results, paths):
+        self.stdout.write("\n📊 重啟後 TTFB (毫秒，中位數；首次 / 已暖)")
+        header = f"{'路徑':<32}" + ''.join(f"{name:>20}" for name in results)
+        self.stdout.write(header)
+        self.stdout.write(f"{'(可回應)':<32}" + ''.join(f"{row['ready_ms']:>20}" for row in results.values()))
+        for path in paths:
+            cells = [f"{row['first_ms'][path]} / {row['warm_ms'][path]}" for row in results.values()]
+            self.stdout.write(f"{path:<32}" + ''.join(f"{cell:>20}" for cell in cells))
+        self.stdout.write('')
@@ -0,0 +1,136 @@
+import argparse
+import datetime
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from apps.crm.models import PipelineRollup
+from apps.finance.models import BalanceCheckpoint, CashFlowDaily
+from core import synthetic
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = "產生大量且可重現的壓測資料 (使用者 / 客戶 / 財務交易)，分佈貼近正式環境"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000, help="使用者筆數")
+        parser.add_argument('--customers', type=int, default=100_000, help="客戶筆數")
+        parser.add_argument('--transactions', type=int, default=1_000_000, help="財務交易筆數")
+        parser.add_argument('--seed', type=int, default=42, help="亂數種子，相同種子產生相同資料")
+        parser.add_argument(
+            '--anchor', type=datetime.date.fromisoformat, default=None,
+            help="時間基準日 (YYYY-MM-DD)，資料日期往前回推；預設為今天",
+        )
+        parser.add_argument('--years', type=int, default=5, help="客戶與交易的日期分散年數")
+        parser.add_argument('--chunk-size', type=int, default=20_000, help="每個區塊 (一次寫入) 的筆數")
+        parser.add_argument('--batch-size', type=int, default=5000, help="bulk_create 每次 INSERT 的筆數")
+        parser.add_argument('--workers', type=int, default=1, help="平行寫入的行程數 (SQLite 固定為 1)")
+        parser.add_argument('--prefix', default='load', help="壓測帳號的帳號前綴")
+        parser.add_argument(
+            '--copy', action=argparse.BooleanOptionalAction, default=None,
+            help="使用 PostgreSQL COPY 寫入 (PostgreSQL 預設開啟，--no-copy 改用 bulk_create)",
+        )
+
+    def handle(self, *args, **options):
+        use_copy = options['copy']
+        if use_copy is None:
+            use_copy = connection.vendor == 'postgresql'
+        elif use_copy and connection.vendor != 'postgresql':
+            raise CommandError("❌ COPY 僅支援 PostgreSQL")
+
+        workers = max(1, options['workers'])
+        if workers > 1 and connection.vendor == 'sqlite':
+            self.stdout.write(self.style.WARNING("⚠️ SQLite 不支援平行寫入，改為單一行程"))
+            workers = 1
+
+        prefix = options['prefix']
+        if options['users'] and User.objects.filter(username__startswith=prefix).exists():
+            raise CommandError(f"❌ 已存在前綴為 {prefix} 的帳號，請改用 --prefix 或先清除舊的壓測資料")
+
+        anchor = options['anchor'] or timezone.localdate()
+        self.chunk_options = {
+            'seed': options['seed'],
+            'anchor': timezone.make_aware(datetime.datetime.combine(anchor, datetime.time(18))),
+            'use_copy': use_copy,
+            'batch_size': options['batch_size'],
+            'prefix': prefix,
+            'password': synthetic.hashed_password(),
+            'years': options['years'],
+        }
+        self.workers = workers
+        self.chunk_size = options['chunk_size']
+
+        self.stdout.write(self.style.WARNING(
+            f"🏭 開始產生壓測資料 (seed={options['seed']}, 基準日={anchor}, "
+            f"{'COPY' if use_copy else 'bulk_create'}, {workers} 個行程)..."
+        ))
+
+        self.run('users', options['users'])
+
+        # 業務與經手人依帳號排序，確保同一 seed 在不同資料庫得到相同的分配結果
+        accounts = User.objects.order_by('username')
+        if options['users']:
+            accounts = accounts.filter(username__startswith=prefix)
+        self.chunk_options['assignees'] = list(accounts.filter(role='CRM').values_list('pk', flat=True))
+        self.chunk_options['creators'] = list(accounts.filter(role='FINANCE').values_list('pk', flat=True))
+
+        self.run('customers', options['customers'])
+        self.run('transactions', options['transactions'])
+
+        # 寫入時不做增量維護 (COPY 不經過 ORM；bulk_create 也略過 QuerySet 的覆寫)，統計表最後整體重建一次
+        if options['customers']:
+            self.stdout.write("🔄 重建 CRM 管線統計表...")
+            PipelineRollup.objects.rebuild()
+        if options['transactions']:
+            self.stdout.write("🔄 重建財務現金流統計表...")
+            CashFlowDaily.objects.rebuild()
+            BalanceCheckpoint.objects.rebuild()
+        if connection.vendor == 'postgresql':
+            # 更新規劃器統計，列表頁的預估筆數與執行計畫才會反映新資料量
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+
+        self.stdout.write(self.style.SUCCESS("✅ 壓測資料產生完成"))
+
+    def run(self, kind, total):
+        if total <= 0:
+            return
+        chunks = synthetic.plan_chunks(total, self.chunk_size)
+        started = time.monotonic()
+        written = 0
+
+        if self.workers == 1:
+            for index, start, count in chunks:
+                written += synthetic.write_chunk(kind, index, start, count, self.chunk_options)
+                self.progress(kind, written, total, started)
+        else:
+            synthetic.close_connections()
+            context = multiprocessing.get_context('fork')
+            with ProcessPoolExecutor(max_workers=self.workers, mp_context=context) as pool:
+                futures = [
+                    pool.submit(synthetic.write_chunk, kind, index, start, count, self.chunk_options)
+                    for index, start, count in chunks
+                ]
+                for future in as_completed(futures):
+                    written += future.result()
+                    self.progress(kind, written, total, started)
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"  ✔ {kind}: {written:,} 筆，耗時 {elapsed:.1f} 秒 ({written / max(elapsed, 1e-6):,.0f} 筆/秒)"
+        ))
+
+    def progress(self, kind, written, total, started):
+        self.stdout.write(
+            f"  {kind}: {written:,} / {total:,} ({time.monotonic() - started:.1f}s)",
+            ending='\r',
+        )
+        self.stdout.flush()
+
@@ -0,0 +1,114 @@
+"""
+Nexus Prometheus 指標
+
+- 每個 view (URL 名稱，例如 crm:stats_api、hr:employee-list) 的延遲直方圖與請求數
+- 每個請求的查詢數與 SQL 耗時、快取命中 / 未命中次數、未處理的例外次數
+- gunicorn 多個 worker：設定 PROMETHEUS_MULTIPROC_DIR 後，各行程把數值寫入該目錄的 mmap 檔，
+  /metrics 讀取時再彙總 (worker 結束時由 gunicorn.conf.py 的 child_exit 標記)
+- /metrics 僅允許內部網段存取 (METRICS_ALLOWED_NETWORKS)，nginx 也會擋下外部請求
+
+查詢與快取的量測與 Server-Timing 共用 core.telemetry.measure()。
+"""
+import ipaddress
+import os
+import time
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+
+from core.telemetry import measure, view_name
+
+# 💡 prometheus_client 為選用套件：未安裝時不收集指標，/metrics 回應 503
+try:
+    from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest
+    from prometheus_client import multiprocess
+except ImportError:
+    Histogram = None
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+
+if Histogram is not None:
+    REQUEST_LATENCY = Histogram(
+        'nexus_http_request_duration_seconds', "Request latency by view",
+        ['view', 'method'], buckets=LATENCY_BUCKETS,
+    )
+    REQUESTS = Counter('nexus_http_requests', "Requests by view and status class", ['view', 'method', 'status'])
+    DB_QUERIES = Histogram(
+        'nexus_db_queries_per_request', "Database queries per request", ['view'], buckets=QUERY_BUCKETS,
+    )
+    DB_TIME = Histogram(
+        'nexus_db_duration_seconds', "Total SQL time per request", ['view'], buckets=LATENCY_BUCKETS,
+    )
+    CACHE_GETS = Counter('nexus_cache_gets', "Cache lookups by result", ['result'])
+    EXCEPTIONS = Counter('nexus_http_exceptions', "Unhandled view exceptions", ['view', 'exception'])
+
+
+def enabled():
+    return Histogram is not None and settings.METRICS_ENABLED
+
+
+class MetricsMiddleware:
+    """放在 MIDDLEWARE 最前面，延遲才涵蓋其他 middleware"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not enabled():
+            return self.get_response(request)
+
+        started = time.perf_counter()
+        with measure() as stats:
+            response = self.get_response(request)
+        elapsed = time.perf_counter() - started
+
+        name = view_name(request)
+        REQUEST_LATENCY.labels(name, request.method).observe(elapsed)
+        REQUESTS.labels(name, request.method, f'{response.status_code // 100}xx').inc()
+        DB_QUERIES.labels(name).observe(stats.queries)
+        DB_TIME.labels(name).observe(stats.db_ms / 1000)
+        if stats.cache_hits:
+            CACHE_GETS.labels('hit').inc(stats.cache_hits)
+        if stats.cache_misses:
+            CACHE_GETS.labels('miss').inc(stats.cache_misses)
+        return response
+
+    def process_exception(self, request, exception):
+        if enabled():
+            EXCEPTIONS.labels(view_name(request), type(exception).__name__).inc()
+
+
+def _client_addresses(request):
+    """直接連線的位址，以及經過 proxy 時 X-Forwarded-For 中的每個位址"""
+    addresses = [request.META.get('REMOTE_ADDR', '')]
+    forwarded = request.META.get('HTTP_X_FORWARDED_FOR')
+    if forwarded:
+        addresses.extend(address.strip() for address in forwarded.split(','))
+    return addresses
+
+
+def is_internal(request):
+    networks = [ipaddress.ip_network(network) for network in settings.METRICS_ALLOWED_NETWORKS]
+    for address in _client_addresses(request):
+        try:
+            ip = ipaddress.ip_address(address)
+        except ValueError:
+            return False
+        if not any(ip in network for network in networks):
+            return False
+    return True
+
+
+def metrics_view(request):
+    if not is_internal(request):
+        return HttpResponseForbidden()
+    if not enabled():
+        return HttpResponse("metrics disabled\n", status=503, content_type='text/plain')
+
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return HttpResponse(generate_latest(registry), content_type=CONTENT_TYPE_LATEST)
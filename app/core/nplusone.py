@@ -0,0 +1,138 @@
+"""
+Nexus N+1 查詢偵測
+
+後台列表的 @display 欄位、DRF serializer 逐列存取關聯物件時，很容易每一列多一次查詢而不自知。
+偵測方式：
+1. 每筆 SELECT 去除字面值 (字串、數字、IN 清單) 得到「查詢形狀」(fingerprint)
+2. 往上找觸發查詢的專案程式碼位置 (call site)
+3. 同一請求中，同一個形狀從同一個位置重複達 NPLUSONE_THRESHOLD 次即視為 N+1
+
+測試環境 (manage.py test) 直接拋出 NPlusOneError，讓 CI 失敗；
+正式環境依 NPLUSONE_SAMPLE_RATE 抽樣偵測，只記錄警告與呼叫堆疊摘要。
+"""
+import logging
+import os
+import random
+import re
+import sys
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger('core.nplusone')
+
+LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+IN_LIST = re.compile(r'\bIN\s*\(\s*\?(?:\s*,\s*\?)*\s*\)', re.IGNORECASE)
+WHITESPACE = re.compile(r'\s+')
+
+# 查詢計時 / 偵測本身的 wrapper 與 middleware，不算呼叫位置
+_INFRA_FILES = {
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), name)
+    for name in ('log.py', 'telemetry.py', 'nplusone.py')
+}
+_ORM_DIR = os.path.join('django', 'db', '')
+
+
+class NPlusOneError(Exception):
+    pass
+
+
+def fingerprint(sql):
+    """把字面值與參數佔位符換成 ?，IN (...) 不論幾個值都視為同一形狀"""
+    sql = LITERALS.sub('?', sql).replace('%s', '?')
+    sql = IN_LIST.sub('IN (...)', sql)
+    return WHITESPACE.sub(' ', sql).strip()
+
+
+def short_path(filename):
+    """(顯示用路徑, 是否為專案程式碼)：專案內取相對路徑，第三方套件從 site-packages 之後開始"""
+    base = str(settings.BASE_DIR)
+    if filename.startswith(base) and 'site-packages' not in filename:
+        return os.path.relpath(filename, base), True
+    marker = filename.rfind('site-packages' + os.sep)
+    return (filename[marker + len('site-packages') + 1:] if marker >= 0 else filename), False
+
+
+def call_stack(limit=4):
+    """
+    由內而外列出觸發查詢的位置 [(路徑, 行號, 函式名稱)]：
+    第一筆為 ORM 之外最內層的呼叫 (例如 admin 的 lookup_field、模板變數解析)，其後為專案程式碼
+    """
+    frames = []
+    frame = sys._getframe(2)
+    while frame is not None and len(frames) < limit:
+        filename = frame.f_code.co_filename
+        if _ORM_DIR not in filename and filename not in _INFRA_FILES:
+            path, in_project = short_path(filename)
+            if in_project or not frames:
+                frames.append((path, frame.f_lineno, frame.f_code.co_name))
+        frame = frame.f_back
+    return frames
+
+
+class QueryTracker:
+    """execute_wrapper：依 (查詢形狀, 呼叫位置) 計數重複的 SELECT"""
+
+    def __init__(self, threshold=None, raise_errors=None):
+        self.threshold = threshold or settings.NPLUSONE_THRESHOLD
+        self.raise_errors = settings.NPLUSONE_RAISE if raise_errors is None else raise_errors
+        self.counts = Counter()
+        self.stacks = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        if not many and sql.lstrip()[:6].upper() == 'SELECT':
+            self.track(sql)
+        return execute(sql, params, many, context)
+
+    def track(self, sql):
+        stack = call_stack()
+        key = (fingerprint(sql), stack[0] if stack else None)
+        self.counts[key] += 1
+        self.stacks.setdefault(key, stack)
+        if self.raise_errors and self.counts[key] == self.threshold:
+            raise NPlusOneError(self.describe(key))
+
+    def violations(self):
+        return [key for key, count in self.counts.items() if count >= self.threshold]
+
+    def describe(self, key):
+        shape, _site = key
+        frames = '\n'.join(f'  {path}:{line} in {name}' for path, line, name in self.stacks[key]) or '  (no project frames)'
+        return f"Possible N+1 query: {self.counts[key]} × {shape}\n{frames}"
+
+    def report(self, label=''):
+        for key in self.violations():
+            logger.warning("%s%s", f'[{label}] ' if label else '', self.describe(key),
+                           extra={'queries': self.counts[key], 'sql': key[0]})
+
+
+@contextmanager
+def detect(threshold=None, raise_errors=None):
+    """
+    在區塊內追蹤所有資料庫連線的查詢，可直接用於測試或 shell：
+        with detect(raise_errors=True):
+            UserSerializer(User.objects.all(), many=True).data
+    """
+    tracker = QueryTracker(threshold, raise_errors)
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(tracker))
+        yield tracker
+
+
+class NPlusOneMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if random.random() >= settings.NPLUSONE_SAMPLE_RATE:
+            return self.get_response(request)
+
+        with detect() as tracker:
+            response = self.get_response(request)
+        if not tracker.raise_errors:
+            match = request.resolver_match
+            tracker.report(match.view_name if match else request.path)
+        return response
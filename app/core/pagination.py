@@ -0,0 +1,372 @@
+"""
+Nexus Admin 分頁工具
+
+Keyset (cursor) 分頁：以排序欄位的「最後一筆值」作為游標，用 WHERE (a, b, id) < (...) 搭配複合索引
+直接定位下一頁，第 N 頁與第 1 頁成本相同，不會像 OFFSET 一樣隨頁數線性變慢。
+
+預估筆數分頁：大表的精確 COUNT(*) 往往是列表頁最慢的查詢，超過門檻時改用 PostgreSQL 規劃器的
+列數預估 (pg_class.reltuples / EXPLAIN)，門檻以下或其他資料庫仍使用精確計數。
+"""
+import base64
+import binascii
+import datetime
+import json
+import logging
+
+from django.conf import settings
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.core.paginator import InvalidPage, Paginator
+from django.db import DatabaseError, connections
+from django.db.models import BooleanField, F, Func, OrderBy, Q, Value
+from django.utils.functional import cached_property
+from unfold.views import ChangeList
+
+logger = logging.getLogger('core.pagination')
+
+CURSOR_VAR = 'cursor'
+
+DEFAULT_COUNT_ESTIMATE_THRESHOLD = 100_000
+
+
+def estimate_count(queryset):
+    """
+    回傳規劃器預估的筆數；非 PostgreSQL 或無法預估時回傳 None。
+    未篩選的整張表直接讀 pg_class.reltuples (ANALYZE / autovacuum 維護)，
+    有條件時改讀 EXPLAIN 的 Plan Rows，兩者都只做規劃不掃描資料。
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+
+    query = queryset.query
+    try:
+        with connection.cursor() as cursor:
+            if not query.where and not query.distinct and not query.combinator and not query.is_sliced:
+                # relkind = 'r'：分割表的父表沒有自己的 reltuples，交給 EXPLAIN 加總各分割區
+                cursor.execute(
+                    "SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass(%s) AND relkind = 'r'",
+                    [connection.ops.quote_name(queryset.model._meta.db_table)],
+                )
+                row = cursor.fetchone()
+                # 從未 ANALYZE 的表 reltuples 為 -1 (PG14+) 或 0，這時不可信
+                if row and row[0] > 0:
+                    return row[0]
+
+            # 只保留 WHERE 條件：排序與 select_related 的 JOIN 不影響筆數，卻會讓預估變慢
+            sql, params = queryset.order_by().values('pk').query.sql_with_params()
+            cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+            plan = cursor.fetchone()[0]
+    except DatabaseError:
+        logger.warning("Row estimate failed for %s", queryset.model._meta.label, exc_info=True)
+        return None
+
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    超過門檻 (ADMIN_COUNT_ESTIMATE_THRESHOLD) 時以規劃器預估值作為總筆數，門檻以下仍精確計數，
+    小表與篩選後筆數不多的結果頁碼依然正確；SQLite 等無法預估的資料庫一律精確計數。
+    """
+    template_name = 'admin/estimated_pagination.html'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.is_estimated = False
+
+    @cached_property
+    def count(self):
+        threshold = getattr(settings, 'ADMIN_COUNT_ESTIMATE_THRESHOLD', DEFAULT_COUNT_ESTIMATE_THRESHOLD)
+        estimate = estimate_count(self.object_list) if hasattr(self.object_list, 'query') else None
+        if estimate is None or estimate < threshold:
+            return super().count
+        self.is_estimated = True
+        return estimate
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+class RowComparison(Func):
+    """列值比較 (a, b, c) < (x, y, z)，資料庫可直接以複合索引做範圍掃描"""
+    conditional = True
+    output_field = BooleanField()
+
+    def __init__(self, fields, values, operator):
+        self.operator = operator
+        self.width = len(fields)
+        super().__init__(*fields, *values)
+
+    def as_sql(self, compiler, connection, **extra_context):
+        sqls, params = [], []
+        for expression in self.get_source_expressions():
+            sql, expression_params = compiler.compile(expression)
+            sqls.append(sql)
+            params.extend(expression_params)
+        lhs = ', '.join(sqls[:self.width])
+        rhs = ', '.join(sqls[self.width:])
+        return f'({lhs}) {self.operator} ({rhs})', params
+
+
+class KeysetPage:
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+class KeysetPaginator:
+    """
+    依 QuerySet 既有的排序欄位做 keyset 分頁。
+    支援條件：排序皆為本表欄位、方向一致，且只有第一個欄位可為 NULL
+    (NULL 值依資料庫慣例排在最前或最後，以獨立區段查詢，避免 OR IS NULL 破壞索引掃描)。
+    不符合條件時 from_queryset() 回傳 None，由呼叫端退回 OFFSET 分頁。
+    """
+    template_name = 'admin/keyset_pagination.html'
+
+    def __init__(self, queryset, per_page, fields, descending):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.fields = fields
+        self.descending = descending
+
+    @classmethod
+    def from_queryset(cls, queryset, per_page):
+        opts = queryset.model._meta
+        fields, directions = [], set()
+        for part in queryset.query.order_by:
+            if isinstance(part, str):
+                name, descending = part.lstrip('-'), part.startswith('-')
+            elif isinstance(part, OrderBy) and isinstance(part.expression, F):
+                name, descending = part.expression.name, part.descending
+            else:
+                return None
+            try:
+                field = opts.pk if name == 'pk' else opts.get_field(name)
+            except FieldDoesNotExist:
+                return None
+            if not field.concrete or (field.is_relation and name == field.name):
+                return None
+            fields.append(field)
+            directions.add(descending)
+
+        if len(directions) != 1 or any(field.null for field in fields[1:]):
+            return None
+        if not any(field.primary_key or (field.unique and not field.null) for field in fields):
+            return None
+        return cls(queryset, per_page, fields, directions.pop())
+
+    # --- 游標編碼 ---
+
+    @staticmethod
+    def _encode_value(value):
+        # 時間需保留完整微秒 (DjangoJSONEncoder 會截到毫秒，導致游標比較錯位)
+        if isinstance(value, (datetime.date, datetime.time)):
+            return value.isoformat()
+        if value is None or isinstance(value, (bool, int, str)):
+            return value
+        return str(value)
+
+    def encode_cursor(self, obj, reverse=False):
+        # obj 可為 model 實體或 values() 的 dict (API 快速序列化路徑)
+        get = obj.__getitem__ if isinstance(obj, dict) else obj.__getattribute__
+        values = [self._encode_value(get(field.attname)) for field in self.fields]
+        raw = json.dumps({'v': values, 'r': reverse}, separators=(',', ':'))
+        return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, token):
+        try:
+            padded = token + '=' * (-len(token) % 4)
+            data = json.loads(base64.urlsafe_b64decode(padded.encode()))
+            values = data['v']
+            if len(values) != len(self.fields):
+                raise InvalidCursor(token)
+            values = [
+                None if value is None else field.to_python(value)
+                for field, value in zip(self.fields, values)
+            ]
+            return values, bool(data.get('r'))
+        except (ValueError, KeyError, TypeError, binascii.Error, ValidationError) as exc:
+            raise InvalidCursor(token) from exc
+
+    # --- 查詢 ---
+
+    def _segments(self):
+        """
+        依「正向」順序列出查詢區段：[(區段條件, 用於比較的欄位)]
+        第一欄可為 NULL 時，NULL 與非 NULL 分成兩段，NULL 段的位置依資料庫排序慣例決定。
+        """
+        first = self.fields[0]
+        if not first.null:
+            return [(Q(), self.fields)]
+        not_null = (Q(**{f'{first.attname}__isnull': False}), self.fields)
+        null = (Q(**{f'{first.attname}__isnull': True}), self.fields[1:])
+        nulls_first = connections[self.queryset.db].features.nulls_order_largest == self.descending
+        return [null, not_null] if nulls_first else [not_null, null]
+
+    def _segment_index(self, values):
+        if not self.fields[0].null:
+            return 0
+        segments = self._segments()
+        wants_null = values[0] is None
+        return next(i for i, (q, fields) in enumerate(segments) if (len(fields) < len(self.fields)) == wants_null)
+
+    def _fetch(self, segment, values, reverse, limit):
+        condition, fields = segment
+        queryset = self.queryset.filter(condition)
+        descending = self.descending != reverse
+        if values is not None:
+            offset = len(self.fields) - len(fields)
+            operator = '<' if descending else '>'
+            queryset = queryset.filter(RowComparison(
+                [F(field.attname) for field in fields],
+                [Value(value, output_field=field) for field, value in zip(fields, values[offset:])],
+                operator,
+            ))
+        ordering = [f"{'-' if descending else ''}{field.attname}" for field in fields]
+        return list(queryset.order_by(*ordering)[:limit])
+
+    def _collect(self, values, reverse, limit):
+        segments = self._segments()
+        if reverse:
+            segments = segments[::-1]
+        start = 0
+        if values is not None:
+            index = self._segment_index(values)
+            start = len(segments) - 1 - index if reverse else index
+
+        rows = []
+        for position in range(start, len(segments)):
+            seek = values if position == start else None
+            rows.extend(self._fetch(segments[position], seek, reverse, limit - len(rows)))
+            if len(rows) >= limit:
+                break
+        return rows
+
+    def page(self, cursor=None):
+        values, reverse = (None, False) if not cursor else self.decode_cursor(cursor)
+        rows = self._collect(values, reverse, self.per_page + 1)
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+
+        if reverse:
+            rows.reverse()
+            has_previous, has_next = has_more, True
+        else:
+            has_previous, has_next = cursor is not None, has_more
+
+        return KeysetPage(
+            rows,
+            next_cursor=self.encode_cursor(rows[-1]) if rows and has_next else None,
+            previous_cursor=self.encode_cursor(rows[0], reverse=True) if rows and has_previous else None,
+        )
+
+
+class CountingChangeList(ChangeList):
+    """
+    總筆數與全表筆數都交由 ModelAdmin 的 paginator 計算 (使用 EstimatedCountPaginator 時即為預估值)；
+    沒有套用任何篩選時兩者是同一個查詢，只計數一次。
+    """
+
+    def count_results(self, request, counter):
+        self.result_count = counter.count
+        self.result_count_estimated = getattr(counter, 'is_estimated', False)
+        self.show_full_result_count = self.model_admin.show_full_result_count
+        if not self.show_full_result_count:
+            self.full_result_count = None
+        elif self.queryset.query.where == self.root_queryset.query.where:
+            self.full_result_count = self.result_count
+        else:
+            self.full_result_count = self.model_admin.get_paginator(
+                request, self.root_queryset, self.list_per_page
+            ).count
+        # 有資料或不計算全表筆數時才顯示批次動作 (與 Django 原本行為一致)
+        self.show_admin_actions = not self.show_full_result_count or bool(self.full_result_count)
+
+    def get_results(self, request):
+        paginator = self.model_admin.get_paginator(request, self.queryset, self.list_per_page)
+        self.count_results(request, paginator)
+        self.can_show_all = self.result_count <= self.list_max_show_all
+        self.multi_page = self.result_count > self.list_per_page
+
+        if (self.show_all and self.can_show_all) or not self.multi_page:
+            self.result_list = self.queryset._clone()
+        else:
+            try:
+                self.result_list = paginator.page(self.page_num).object_list
+            except InvalidPage:
+                raise IncorrectLookupParameters
+        self.paginator = paginator
+
+
+class KeysetChangeList(CountingChangeList):
+    """
+    Unfold ChangeList 的 keyset 分頁版本：?cursor= 取代 ?p=。
+    排序條件不支援 keyset (例如依關聯欄位排序) 或啟用 list_editable / 顯示全部時，自動退回原本的 OFFSET 分頁。
+    """
+
+    def __init__(self, request, *args, **kwargs):
+        self.cursor = None
+        self.keyset_page = None
+        super().__init__(request, *args, **kwargs)
+
+    def get_queryset(self, request, exclude_parameters=None):
+        # 游標不是過濾條件，從參數中移除，篩選/排序連結也不會帶著舊游標
+        if CURSOR_VAR in self.params:
+            self.cursor = self.params.pop(CURSOR_VAR)
+            self.filter_params.pop(CURSOR_VAR, None)
+        return super().get_queryset(request, exclude_parameters)
+
+    def get_results(self, request):
+        paginator = None
+        if not self.show_all and not self.list_editable:
+            paginator = KeysetPaginator.from_queryset(self.queryset, self.list_per_page)
+        if paginator is None:
+            return super().get_results(request)
+
+        try:
+            page = paginator.page(self.cursor)
+        except InvalidCursor:
+            raise IncorrectLookupParameters
+
+        # 總筆數仍交由 ModelAdmin 的 paginator 計算，與翻到第幾頁無關
+        counter = self.model_admin.get_paginator(request, self.queryset, self.list_per_page)
+        self.count_results(request, counter)
+        self.result_list = page.object_list
+        self.can_show_all = False
+        self.multi_page = False  # 不產生頁碼列表，由 keyset 模板顯示上一頁/下一頁
+        self.paginator = paginator
+        self.keyset_page = page
+        self.keyset_first_url = self.get_query_string() if self.cursor else None
+        self.keyset_next_url = page.next_cursor and self.get_query_string({CURSOR_VAR: page.next_cursor})
+        self.keyset_previous_url = page.previous_cursor and self.get_query_string({CURSOR_VAR: page.previous_cursor})
+
+
+class KeysetPaginationMixin:
+    """
+    ModelAdmin 混入類別：changelist 改用 keyset 分頁 (需搭配與排序欄位一致的複合索引)
+    """
+
+    def get_changelist(self, request, **kwargs):
+        return KeysetChangeList
+
+
+class EstimatedCountMixin:
+    """
+    ModelAdmin 混入類別：大表的總筆數改用預估值 (與 KeysetPaginationMixin 併用時需放在其後)
+    """
+    paginator = EstimatedCountPaginator
+
+    def get_changelist(self, request, **kwargs):
+        return CountingChangeList
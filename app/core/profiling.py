@@ -0,0 +1,178 @@
+"""
+Nexus 單次請求效能剖析
+
+staff 在任何網址加上 ?_profile=1 (或送出 X-Profile: 1 標頭) 即可剖析該次請求，不需重新部署：
+- 已安裝 pyinstrument 時使用取樣式剖析並產生火焰圖 (HTML)；否則 (或 ?_profile=cprofile) 使用 cProfile
+- 同時記錄 SQL 時間軸 (每筆查詢的開始時間與耗時)
+- 結果存放於 logs/profiles/，只保留最近 PROFILE_KEEP 筆，後台「效能剖析」頁面可檢視
+"""
+import cProfile
+import json
+import pstats
+import re
+import time
+import uuid
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from django.http import Http404
+from django.utils import timezone
+
+from core.nplusone import short_path
+
+# 💡 pyinstrument 為選用套件：未安裝時退回標準函式庫的 cProfile
+try:
+    from pyinstrument import Profiler as SamplingProfiler
+except ImportError:
+    SamplingProfiler = None
+
+PROFILE_PARAM = '_profile'
+PROFILE_HEADER = 'HTTP_X_PROFILE'
+# 只有明確的值才會啟用剖析：1 (預設剖析器) 或 cprofile；其他值 (例如 Proxy 轉送的 X-Profile: 0) 一律忽略
+PROFILE_MODES = ('1', 'cprofile')
+PROFILE_ID = re.compile(r'^\d{8}-\d{6}-[0-9a-f]{8}$')
+SQL_PREVIEW_CHARS = 2000
+
+
+class SqlTimeline:
+    """execute_wrapper：記錄每筆查詢相對於請求開始的時間點與耗時"""
+
+    def __init__(self, started):
+        self.started = started
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append({
+                'start_ms': round((started - self.started) * 1000, 3),
+                'duration_ms': round((time.perf_counter() - started) * 1000, 3),
+                'sql': sql[:SQL_PREVIEW_CHARS],
+            })
+
+
+def profile_dir():
+    path = settings.PROFILE_DIR
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def _prune(directory):
+    metas = sorted(directory.glob('*.json'), reverse=True)
+    for meta in metas[settings.PROFILE_KEEP:]:
+        for path in directory.glob(f'{meta.stem}.*'):
+            path.unlink(missing_ok=True)
+
+
+def list_profiles(limit=100):
+    """最近的剖析紀錄 (新 → 舊)"""
+    profiles = []
+    for path in sorted(profile_dir().glob('*.json'), reverse=True)[:limit]:
+        try:
+            profiles.append(json.loads(path.read_text(encoding='utf-8')))
+        except (OSError, ValueError):
+            continue
+    return profiles
+
+
+def load_profile(profile_id):
+    if not PROFILE_ID.match(profile_id):
+        raise Http404("剖析紀錄不存在")
+    path = profile_dir() / f'{profile_id}.json'
+    try:
+        return json.loads(path.read_text(encoding='utf-8'))
+    except (OSError, ValueError):
+        raise Http404("剖析紀錄不存在")
+
+
+def artifact_path(profile_id, suffix):
+    """剖析結果檔 (.prof / .html)；不存在時回傳 None"""
+    if not PROFILE_ID.match(profile_id):
+        return None
+    path = profile_dir() / f'{profile_id}{suffix}'
+    return path if path.exists() else None
+
+
+def callee_table(profile_id, limit=40):
+    """cProfile 結果依累計時間排序的前 N 個函式"""
+    path = artifact_path(profile_id, '.prof')
+    if path is None:
+        return []
+    rows = []
+    for (filename, line, name), (primitive, calls, own, cumulative, _callers) in pstats.Stats(str(path)).stats.items():
+        rows.append({
+            'function': name if filename == '~' else f'{short_path(filename)[0]}:{line}({name})',
+            'calls': calls if calls == primitive else f'{calls}/{primitive}',
+            'tottime_ms': round(own * 1000, 2),
+            'cumtime_ms': round(cumulative * 1000, 2),
+        })
+    rows.sort(key=lambda row: row['cumtime_ms'], reverse=True)
+    return rows[:limit]
+
+
+def _wants_profile(request):
+    """回傳剖析模式 ('1' / 'cprofile')；標頭與網址參數接受相同的值，其餘視為未要求剖析"""
+    modes = [request.META.get(PROFILE_HEADER)]
+    if PROFILE_PARAM in request.META.get('QUERY_STRING', '') and PROFILE_PARAM in request.GET:
+        # 移除剖析參數 (不論值是否有效)，避免後台列表把它當成篩選條件
+        modes.append(request.GET[PROFILE_PARAM])
+        request.GET = request.GET.copy()
+        del request.GET[PROFILE_PARAM]
+        request.META['QUERY_STRING'] = request.GET.urlencode()
+    return next((mode for mode in modes if mode in PROFILE_MODES), None)
+
+
+class ProfilingMiddleware:
+    """需放在 AuthenticationMiddleware 之後；權限規則與 staff_member_required 相同 (啟用中的 staff)"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        mode = _wants_profile(request)
+        if mode is None or not (request.user.is_active and request.user.is_staff):
+            return self.get_response(request)
+
+        sampling = SamplingProfiler is not None and mode != 'cprofile'
+        profiler = SamplingProfiler(interval=0.0005) if sampling else cProfile.Profile()
+        started = time.perf_counter()
+        timeline = SqlTimeline(started)
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(timeline))
+            start, stop = (profiler.start, profiler.stop) if sampling else (profiler.enable, profiler.disable)
+            start()
+            try:
+                response = self.get_response(request)
+            finally:
+                stop()
+        duration_ms = (time.perf_counter() - started) * 1000
+
+        now = timezone.localtime()
+        profile_id = f'{now:%Y%m%d-%H%M%S}-{uuid.uuid4().hex[:8]}'
+        directory = profile_dir()
+        if sampling:
+            (directory / f'{profile_id}.html').write_text(profiler.output_html(), encoding='utf-8')
+        else:
+            profiler.dump_stats(directory / f'{profile_id}.prof')
+        meta = {
+            'id': profile_id,
+            'created_at': now.isoformat(),
+            'method': request.method,
+            'path': request.get_full_path(),
+            'user': request.user.get_username(),
+            'status': response.status_code,
+            'duration_ms': round(duration_ms, 2),
+            'profiler': 'pyinstrument' if sampling else 'cprofile',
+            'query_count': len(timeline.queries),
+            'sql_ms': round(sum(query['duration_ms'] for query in timeline.queries), 2),
+            'queries': timeline.queries,
+        }
+        (directory / f'{profile_id}.json').write_text(json.dumps(meta, ensure_ascii=False), encoding='utf-8')
+        _prune(directory)
+
+        response['X-Profile-Id'] = profile_id
+        return response
@@ -0,0 +1,228 @@
+"""
+Nexus 全文檢索工具
+
+模型在寫入時把要搜尋的欄位轉成「已斷詞的搜尋文件」(空白分隔的 token) 存進一個欄位，
+再依資料庫建立對應索引：
+- PostgreSQL：to_tsvector('simple', ...) 的 GIN 索引負責比對，pg_trgm 的 GIN 索引補上拼字容錯，
+  以 ts_rank_cd + word_similarity 排序。
+- SQLite：FTS5 external-content 影子表 (由 trigger 同步)，以 bm25 排序，方便在沒有 PostgreSQL 的環境測試。
+
+中文沒有空白斷詞，這裡以「單字 + 相鄰雙字 (bigram)」建立 token：查詢「宏達」直接命中 bigram，
+查詢單一個字也能命中；英數字則轉小寫後以整個單字為 token，查詢時做前綴比對。
+"""
+import functools
+import re
+import unicodedata
+
+from django.contrib.admin.views.main import ORDER_VAR
+from django.db import connections
+from django.db.models import BooleanField, FloatField
+from django.db.models.expressions import RawSQL
+
+_CJK = '㐀-䶿一-鿿豈-﫿'
+TOKEN_RE = re.compile(rf'[{_CJK}]+|[^\W_{_CJK}]+')
+CJK_RE = re.compile(rf'[{_CJK}]+')
+
+
+def _normalize(text):
+    # NFKC：全形英數轉半形；casefold：不分大小寫
+    return unicodedata.normalize('NFKC', str(text)).casefold()
+
+
+def _cjk_tokens(run):
+    return list(run) + [run[i:i + 2] for i in range(len(run) - 1)]
+
+
+def tokenize(*values):
+    """把多個欄位值轉成不重複的 token 列表 (保留首次出現順序)"""
+    tokens = {}
+    for value in values:
+        if not value:
+            continue
+        for match in TOKEN_RE.finditer(_normalize(value)):
+            run = match.group()
+            for token in (_cjk_tokens(run) if CJK_RE.fullmatch(run) else [run]):
+                tokens.setdefault(token, None)
+    return list(tokens)
+
+
+def build_document(*values):
+    """寫入搜尋欄位的內容"""
+    return ' '.join(tokenize(*values))
+
+
+def query_terms(text):
+    """
+    查詢字串轉成 [(token, 是否前綴比對)]，彼此為 AND：
+    中文詞取 bigram (單一個字則取該字)，英數字取整個單字做前綴比對。
+    """
+    terms = {}
+    for match in TOKEN_RE.finditer(_normalize(text)):
+        run = match.group()
+        if CJK_RE.fullmatch(run):
+            for token in ([run] if len(run) == 1 else [run[i:i + 2] for i in range(len(run) - 1)]):
+                terms.setdefault(token, False)
+        else:
+            terms.setdefault(run, True)
+    return list(terms.items())
+
+
+class SearchIndex:
+    """
+    單一資料表的全文檢索索引：負責建立/移除索引 (供 migration 使用) 與產生查詢條件。
+    token 只包含文字與數字，組查詢語法時不需另外跳脫。
+    """
+
+    def __init__(self, table, document_column='search_document', pk_column='id'):
+        self.table = table
+        self.document_column = document_column
+        self.pk_column = pk_column
+        self.fts_table = f'{table}_fts'
+
+    # --- 索引維護 ---
+
+    def _sqlite_triggers(self):
+        table, fts, doc, pk = self.table, self.fts_table, self.document_column, self.pk_column
+        return {
+            f'{fts}_ai': (
+                f'CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table} BEGIN '
+                f'INSERT INTO {fts}(rowid, {doc}) VALUES (new.{pk}, new.{doc}); END'
+            ),
+            f'{fts}_ad': (
+                f'CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table} BEGIN '
+                f"INSERT INTO {fts}({fts}, rowid, {doc}) VALUES ('delete', old.{pk}, old.{doc}); END"
+            ),
+            f'{fts}_au': (
+                f'CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF {doc} ON {table} BEGIN '
+                f"INSERT INTO {fts}({fts}, rowid, {doc}) VALUES ('delete', old.{pk}, old.{doc}); "
+                f'INSERT INTO {fts}(rowid, {doc}) VALUES (new.{pk}, new.{doc}); END'
+            ),
+        }
+
+    def install(self, connection):
+        """建立索引 (可重複執行)"""
+        table, doc = self.table, self.document_column
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+                cursor.execute(
+                    f'CREATE INDEX IF NOT EXISTS {table}_search_tsv ON {table} '
+                    f"USING gin (to_tsvector('simple'::regconfig, {doc}))"
+                )
+                cursor.execute(
+                    f'CREATE INDEX IF NOT EXISTS {table}_search_trgm ON {table} USING gin ({doc} gin_trgm_ops)'
+                )
+            elif connection.vendor == 'sqlite':
+                cursor.execute(
+                    f'CREATE VIRTUAL TABLE IF NOT EXISTS {self.fts_table} USING fts5('
+                    f"{doc}, content='{table}', content_rowid='{self.pk_column}', tokenize='unicode61')"
+                )
+                for sql in self._sqlite_triggers().values():
+                    cursor.execute(sql)
+                self.rebuild(connection)
+
+    def uninstall(self, connection):
+        table = self.table
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute(f'DROP INDEX IF EXISTS {table}_search_tsv')
+                cursor.execute(f'DROP INDEX IF EXISTS {table}_search_trgm')
+            elif connection.vendor == 'sqlite':
+                for name in self._sqlite_triggers():
+                    cursor.execute(f'DROP TRIGGER IF EXISTS {name}')
+                cursor.execute(f'DROP TABLE IF EXISTS {self.fts_table}')
+
+    def rebuild(self, connection):
+        """依主表內容重建 FTS5 影子表 (PostgreSQL 的索引由資料庫自行維護，不需重建)"""
+        if connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                cursor.execute(f"INSERT INTO {self.fts_table}({self.fts_table}) VALUES ('rebuild')")
+
+    def ensure_installed(self, connection):
+        """
+        SQLite 變更資料表結構時會重建整張表，原本的 trigger 會隨舊表一起刪除；
+        migrate 後檢查一次，缺少時重新建立並重建影子表。
+        """
+        if connection.vendor != 'sqlite':
+            return
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT count(*) FROM sqlite_master WHERE type = 'trigger' AND name IN (%s, %s, %s)",
+                list(self._sqlite_triggers()),
+            )
+            missing = cursor.fetchone()[0] < 3
+            if missing and self.table in connection.introspection.table_names(cursor):
+                self.install(connection)
+
+    # --- 查詢 ---
+
+    def search(self, queryset, text):
+        """
+        回傳符合查詢字串的 QuerySet，並附上 search_rank 註記 (越大越相關)；
+        查詢字串沒有任何可用 token 時回傳空結果。
+        """
+        terms = query_terms(text)
+        if not terms:
+            return queryset.none()
+
+        vendor = connections[queryset.db].vendor
+        table, doc, pk = self.table, self.document_column, self.pk_column
+        if vendor == 'postgresql':
+            tsquery = ' & '.join(f"'{token}'{':*' if prefix else ''}" for token, prefix in terms)
+            plain = ' '.join(token for token, _prefix in terms)
+            vector = f"to_tsvector('simple'::regconfig, {table}.{doc})"
+            match = RawSQL(
+                f"({vector} @@ to_tsquery('simple'::regconfig, %s) OR %s <%% {table}.{doc})",
+                (tsquery, plain), output_field=BooleanField(),
+            )
+            rank = RawSQL(
+                f"ts_rank_cd({vector}, to_tsquery('simple'::regconfig, %s)) + word_similarity(%s, {table}.{doc})",
+                (tsquery, plain), output_field=FloatField(),
+            )
+        elif vendor == 'sqlite':
+            fts = self.fts_table
+            expression = ' '.join(f'"{token}"{"*" if prefix else ""}' for token, prefix in terms)
+            match = RawSQL(
+                f'{table}.{pk} IN (SELECT rowid FROM {fts} WHERE {fts} MATCH %s)',
+                (expression,), output_field=BooleanField(),
+            )
+            # bm25 越小越相關，取負值讓排序方向與 PostgreSQL 一致
+            rank = RawSQL(
+                f'(SELECT -bm25({fts}) FROM {fts} WHERE {fts} MATCH %s AND rowid = {table}.{pk})',
+                (expression,), output_field=FloatField(),
+            )
+        else:
+            raise NotImplementedError(f'Full-text search is not supported on {vendor}')
+
+        return queryset.filter(match).annotate(search_rank=rank)
+
+
+class RankedChangeListMixin:
+    """ChangeList 混入類別：結果帶有 search_rank 且使用者未指定排序欄位時，依相關度排序"""
+
+    def get_ordering(self, request, queryset):
+        ordering = super().get_ordering(request, queryset)
+        if 'search_rank' in queryset.query.annotations and ORDER_VAR not in self.params:
+            return ['-search_rank', *ordering]
+        return ordering
+
+
+@functools.cache
+def ranked_changelist(changelist):
+    return type(f'Ranked{changelist.__name__}', (RankedChangeListMixin, changelist), {})
+
+
+class SearchIndexMixin:
+    """
+    ModelAdmin 混入類別：有搜尋字串時改用 search_index 查詢，並依相關度排序
+    (使用者點選欄位排序時仍以欄位排序為主)；可與其他提供 ChangeList 的混入類別併用。
+    """
+    search_index = None
+
+    def get_search_results(self, request, queryset, search_term):
+        if self.search_index is None or not search_term.strip():
+            return super().get_search_results(request, queryset, search_term)
+        return self.search_index.search(queryset, search_term), False
+
+    def get_changelist(self, request, **kwargs):
+        return ranked_changelist(super().get_changelist(request, **kwargs))
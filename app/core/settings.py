@@ -1,6 +1,5 @@
 import os
 import sys
-import logging
 from pathlib import Path
 import environ
 
@@ -17,6 +16,7 @@ sys.path.insert(0, os.path.join(BASE_DIR, 'apps'))
 # 2. 安全設定
 SECRET_KEY = env('SECRET_KEY', default='django-insecure-prod-key-please-change-in-env')
 DEBUG = env('DEBUG')
+TESTING = sys.argv[1:2] == ['test']
 ALLOWED_HOSTS = ['*']
 
 # 3. 模組定義
@@ -34,6 +34,7 @@ INSTALLED_APPS = [
     "django_filters",
     "corsheaders",
     "import_export", # 這裡放後端邏輯元件
+    "core",          # 共用工具 (快取、管理指令)
     "apps.hr",
     "apps.finance",
     "apps.crm",
@@ -49,12 +50,16 @@ LOGOUT_REDIRECT_URL = '/admin/login/'
 
 # 6. 中間件配置
 MIDDLEWARE = [
+    'core.metrics.MetricsMiddleware',  # 💡 放最前面，延遲與 total 才涵蓋所有 middleware
+    'core.telemetry.ServerTimingMiddleware',
+    'core.nplusone.NPlusOneMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'corsheaders.middleware.CorsMiddleware', 
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.profiling.ProfilingMiddleware',  # staff 以 ?_profile=1 剖析單次請求
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -67,7 +72,7 @@ ROOT_URLCONF = 'core.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'core.telemetry.TimedDjangoTemplates',  # 內建引擎 + 渲染耗時量測
         'DIRS': [BASE_DIR / "templates"],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -90,7 +95,7 @@ DATABASES = {
 
 CACHES = {
     "default": {
-        "BACKEND": "django_redis.cache.RedisCache",
+        "BACKEND": "core.telemetry.InstrumentedRedisCache",  # django-redis + 命中率量測
         "LOCATION": env('REDIS_URL', default='redis://redis:6379/0'),
         "OPTIONS": {
             "CLIENT_CLASS": "django_redis.client.DefaultClient",
@@ -98,6 +103,60 @@ CACHES = {
     }
 }
 
+# 後台列表筆數超過此門檻時改用 PostgreSQL 規劃器預估值，避免大表每次翻頁都跑精確 COUNT(*)
+ADMIN_COUNT_ESTIMATE_THRESHOLD = env.int('ADMIN_COUNT_ESTIMATE_THRESHOLD', default=100_000)
+
+# Server-Timing 量測的抽樣比例 (0 = 關閉，1 = 每個請求)；開發環境預設全開
+SERVER_TIMING_SAMPLE_RATE = env.float('SERVER_TIMING_SAMPLE_RATE', default=1.0 if DEBUG else 0.0)
+
+# 每個 view (URL 名稱) 的查詢數預算，抽樣的請求超過時記錄警告；'*' 為未列出 view 的預設值
+QUERY_BUDGETS = {
+    '*': 30,
+    'dashboard': 5,
+    'crm:dashboard': 5,
+    'crm:stats_api': 3,
+    'admin:crm_customer_changelist': 10,
+    'admin:finance_transaction_changelist': 8,
+    'admin:hr_user_changelist': 8,
+    'hr:employee-list': 5,
+}
+
+# DRF：JSON 以 core.json (orjson) 編解碼，Decimal 輸出為字串
+REST_FRAMEWORK = {
+    'DEFAULT_RENDERER_CLASSES': [
+        'core.json.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'core.json.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
+}
+
+# Prometheus 指標 (/metrics)：僅允許內部網段存取；gunicorn 多 worker 需設定 PROMETHEUS_MULTIPROC_DIR
+METRICS_ENABLED = env.bool('METRICS_ENABLED', default=True)
+METRICS_ALLOWED_NETWORKS = env.list('METRICS_ALLOWED_NETWORKS', default=[
+    '127.0.0.0/8', '::1/128', '10.0.0.0/8', '172.16.0.0/12', '192.168.0.0/16',
+])
+
+# N+1 偵測：同一請求中相同形狀的 SELECT 從同一行程式碼重複達門檻即視為 N+1；
+# 測試時直接拋出例外，其他環境依抽樣比例記錄警告
+NPLUSONE_THRESHOLD = env.int('NPLUSONE_THRESHOLD', default=5)
+NPLUSONE_SAMPLE_RATE = env.float('NPLUSONE_SAMPLE_RATE', default=1.0 if DEBUG or TESTING else 0.01)
+NPLUSONE_RAISE = env.bool('NPLUSONE_RAISE', default=TESTING)
+
+# 財務流水帳分割 (PostgreSQL)：依月 (month) 或年 (year) 分割，預先建立未來 N 個區間；
+# 超過保留期限的分割區由 partition_finance detach / archive 卸離並封存為 Parquet
+FINANCE_PARTITION_INTERVAL = env('FINANCE_PARTITION_INTERVAL', default='month')
+FINANCE_PARTITION_AHEAD = env.int('FINANCE_PARTITION_AHEAD', default=3)
+FINANCE_RETENTION_MONTHS = env.int('FINANCE_RETENTION_MONTHS', default=36)
+FINANCE_ARCHIVE_DIR = Path(env('FINANCE_ARCHIVE_DIR', default=str(BASE_DIR / 'archive' / 'finance')))
+
+# 看板即時事件 (SSE)：redis = 跨 worker 以 Redis pub/sub 分送；local = 行程內分送 (測試 / 單一行程)
+EVENTS_BROKER = env('EVENTS_BROKER', default='local' if TESTING else 'redis')
+EVENTS_REDIS_URL = env('REDIS_URL', default='redis://redis:6379/0')
+
 # 9. 國際化設定
 LANGUAGE_CODE = 'zh-hant'
 TIME_ZONE = 'Asia/Taipei'
@@ -146,28 +205,21 @@ UNFOLD = {
 LOG_DIR = BASE_DIR / "logs"
 LOG_DIR.mkdir(parents=True, exist_ok=True)
 
-# 1. 定義過濾器類別 (放在 LOGGING 變數之前)
-class SuppressNoiseFilters(logging.Filter):
-    def filter(self, record):
-        msg = record.getMessage()
-        # 1. 排除瀏覽器與框架產生的雜訊
-        noise_keywords = ['com.chrome.devtools.json', '/admin/jsi18n/', 'favicon.ico']
-        if any(keyword in msg for keyword in noise_keywords):
-            return False
-            
-        # 2. 💡 關鍵：只過濾 INFO 等級且包含 GET 200 的存取紀錄
-        # 這樣就不會誤傷 DEBUG 等級的 SQL 語句
-        if record.levelno == logging.INFO and 'GET' in msg and ' 200 ' in msg:
-            return False
-            
-        return True
+# 單次請求剖析結果 (?_profile=1) 的存放位置與保留筆數
+PROFILE_DIR = LOG_DIR / 'profiles'
+PROFILE_KEEP = env.int('PROFILE_KEEP', default=50)
+
+# SQL 查詢日誌：慢查詢一律記錄，其餘依比例抽樣 (0 = 不抽樣，1 = 全部)
+SQL_SLOW_QUERY_MS = env.float('SQL_SLOW_QUERY_MS', default=200)
+SQL_LOG_SAMPLE_RATE = env.float('SQL_LOG_SAMPLE_RATE', default=0.0)
 
+# 💡 請求執行緒只把紀錄放進佇列 (queue / sql_queue)，格式化與寫檔由背景執行緒處理
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
     'filters': {
         'hide_noise': {
-            '()': SuppressNoiseFilters,
+            '()': 'core.log.SuppressNoiseFilter',
         },
     },
     'formatters': {
@@ -175,9 +227,9 @@ LOGGING = {
             'format': '[%(asctime)s] %(levelname)s: %(message)s',
             'datefmt': '%Y-%m-%d %H:%M:%S',
         },
-        'sql': {
-            'format': '\033[34m[SQL]\033[0m %(message)s',
-        }
+        'json': {
+            '()': 'core.log.JsonLinesFormatter',
+        },
     },
     'handlers': {
         'console': {
@@ -185,33 +237,56 @@ LOGGING = {
             'formatter': 'standard',
             'filters': ['hide_noise'], # 一般日誌過濾雜訊
         },
-        'sql_console': {
-            'class': 'logging.StreamHandler',
-            'formatter': 'sql',
-            'level': 'DEBUG', # 💡 強制確保 SQL Handler 接收 DEBUG
-            # 注意：這裡不掛 filters，確保 SQL 100% 通過
-        },
         'daily_file': {
-            'level': 'DEBUG',
+            'level': 'INFO',
             'class': 'logging.handlers.TimedRotatingFileHandler',
             'filename': LOG_DIR / 'django.log',
             'when': 'midnight',
             'backupCount': 30,
             'formatter': 'standard',
             'encoding': 'utf-8',
-            # 檔案日誌也不掛過濾器，方便事後排查所有細節
+        },
+        'sql_file': {
+            'class': 'logging.handlers.TimedRotatingFileHandler',
+            'filename': LOG_DIR / 'sql.log',
+            'when': 'midnight',
+            'backupCount': 14,
+            'formatter': 'json',
+            'encoding': 'utf-8',
+        },
+        'queue': {
+            '()': 'core.log.BackgroundHandler',
+            'handlers': ['console', 'daily_file'],
+        },
+        'sql_queue': {
+            '()': 'core.log.BackgroundHandler',
+            'handlers': ['sql_file'],
         },
     },
     'loggers': {
         'django': {
-            'handlers': ['console', 'daily_file'],
+            'handlers': ['queue'],
             'level': 'INFO',
             'propagate': True,
         },
+        # 逐筆 SQL 的 DEBUG 日誌改由 core.sql 抽樣取代
         'django.db.backends': {
-            'handlers': ['sql_console', 'daily_file'],
-            'level': 'DEBUG',
-            'propagate': False, # 💡 阻止向上传递给 django logger，避免重複或被攔截
+            'handlers': ['queue'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+        'core': {
+            'handlers': ['queue'],
+            'level': 'INFO',
+        },
+        'apps': {
+            'handlers': ['queue'],
+            'level': 'INFO',
+        },
+        'core.sql': {
+            'handlers': ['sql_queue'],
+            'level': 'INFO',
+            'propagate': False,
         },
     },
-}
\ No newline at end of file
+}
@@ -0,0 +1,254 @@
+"""
+Nexus 壓測資料產生器
+
+- 可重現：每個資料區塊 (chunk) 使用由 (seed, 資料種類, 區塊編號) 推導的獨立亂數產生器，
+  同一個 --seed 與時間基準點 (--anchor) 不論使用幾個 worker、以什麼順序執行，產生的內容都相同。
+- 貼近正式環境的分佈：開發階段集中在前段、金額為長尾 (對數常態)、業務/經手人的筆數高度集中在少數人、
+  日期分散在多年且越近期越密集。
+- 寫入：每個區塊一次 bulk_create；PostgreSQL 可改用 COPY。區塊彼此獨立，可交由多個行程平行寫入；
+  寫入期間不做統計表的增量維護，全部寫完後各重建一次。
+- 使用者密碼只雜湊一次，所有壓測帳號共用，避免每個帳號都跑一次 PBKDF2。
+"""
+import csv
+import datetime
+import io
+import math
+import random
+import zlib
+from contextlib import contextmanager
+from decimal import Decimal
+
+from django.apps import apps
+from django.contrib.auth.hashers import make_password
+from django.db import connection, connections, models, transaction
+from django.utils import timezone
+
+from core.search import build_document
+
+DEFAULT_PASSWORD = 'loadtest'
+
+# 開發階段分佈：大多數客戶停留在前期階段
+STAGE_WEIGHTS = {
+    'LEAD': 45, 'DISCOVERY': 20, 'PROPOSAL': 12, 'NEGOTIATION': 8, 'WON': 10, 'LOST': 5,
+}
+
+# 交易分類分佈與金額 (對數常態參數 mu, sigma；收入為正，其餘為支出)
+CATEGORY_PROFILES = {
+    'OFFICE': (50, 7.5, 1.0),
+    'SALARY': (25, 10.8, 0.25),
+    'REVENUE': (15, 11.2, 1.1),
+    'EQUIPMENT': (10, 9.8, 1.3),
+}
+
+ROLE_WEIGHTS = {'CRM': 50, 'FINANCE': 25, 'HR': 15, 'ADMIN': 10}
+
+COMPANY_PREFIXES = ["宏達", "國泰", "富邦", "台塑", "遠東", "統一", "中華", "長榮", "華碩", "光寶", "聯發", "和碩"]
+COMPANY_SUFFIXES = ["科技", "實業", "顧問", "媒體", "物流", "資訊", "電子", "生技", "建設", "金融"]
+SURNAMES = ["王", "陳", "李", "張", "林", "黃", "吳", "劉", "蔡", "楊", "許", "鄭", "謝", "郭", "洪"]
+GIVEN_NAMES = ["大明", "志豪", "雅婷", "春嬌", "家豪", "怡君", "俊傑", "淑芬", "冠宇", "佳穎", "建宏", "美玲"]
+EXPENSE_TITLES = {
+    'OFFICE': ["文具採購", "辦公室清潔", "郵寄費用", "茶水間補給", "會議室租借"],
+    'SALARY': ["薪資發放", "獎金發放", "加班費"],
+    'EQUIPMENT': ["筆電採購", "伺服器維護", "網路設備", "軟體授權"],
+    'REVENUE': ["專案入帳", "顧問費收入", "授權金收入", "維護合約"],
+}
+
+MAX_DECIMAL = 9_999_999_999  # DecimalField(max_digits=12, decimal_places=2) 的上限
+
+
+def chunk_rng(seed, kind, index):
+    """每個區塊獨立的亂數產生器 (不依賴 Python 的 hash 隨機化)"""
+    return random.Random(zlib.crc32(f'{seed}:{kind}:{index}'.encode()))
+
+
+def cumulative(weights):
+    total, result = 0, []
+    for weight in weights:
+        total += weight
+        result.append(total)
+    return result
+
+
+def skewed_weights(count, exponent=1.1):
+    """Zipf 分佈權重：排名越前面的人分到越多筆"""
+    return cumulative(1 / (rank ** exponent) for rank in range(1, count + 1))
+
+
+def heavy_tail(rng, mu, sigma):
+    return Decimal(min(round(rng.lognormvariate(mu, sigma), 2), MAX_DECIMAL)).quantize(Decimal('0.01'))
+
+
+def spread_datetime(rng, now, years):
+    """分散在過去 N 年，越接近現在越密集 (模擬業務成長)"""
+    age = years * 365 * 86400 * (1 - math.sqrt(rng.random()))
+    return now - datetime.timedelta(seconds=age)
+
+
+@contextmanager
+def explicit_timestamps(model):
+    """暫時停用 auto_now / auto_now_add，讓產生的時間戳記 (分散於多年) 能原樣寫入"""
+    fields = [
+        field for field in model._meta.concrete_fields
+        if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)
+    ]
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+# --- 各資料表的列產生器：回傳 {欄位 attname: 值} ---
+
+def generate_users(seed, index, start, count, now, prefix, password):
+    rng = chunk_rng(seed, 'users', index)
+    roles, role_weights = list(ROLE_WEIGHTS), cumulative(ROLE_WEIGHTS.values())
+    for number in range(start, start + count):
+        yield {
+            'username': f'{prefix}{number:07d}',
+            'employee_id': f'{prefix.upper()[:4]}{number:08d}',
+            'email': f'{prefix}{number:07d}@loadtest.local',
+            'first_name': rng.choice(GIVEN_NAMES),
+            'last_name': rng.choice(SURNAMES),
+            'password': password,
+            'role': rng.choices(roles, cum_weights=role_weights)[0],
+            'is_staff': False,
+            'is_superuser': False,
+            'is_active': rng.random() > 0.05,
+            'date_joined': spread_datetime(rng, now, 5),
+        }
+
+
+def generate_customers(seed, index, start, count, now, assignees, years):
+    rng = chunk_rng(seed, 'customers', index)
+    stages, stage_weights = list(STAGE_WEIGHTS), cumulative(STAGE_WEIGHTS.values())
+    assignee_weights = skewed_weights(len(assignees)) if assignees else None
+    for number in range(start, start + count):
+        company = f"{rng.choice(COMPANY_PREFIXES)}{rng.choice(COMPANY_SUFFIXES)} ({number:07d})"
+        name = rng.choice(SURNAMES) + rng.choice(GIVEN_NAMES)
+        email = f'contact{number}@example.com' if rng.random() > 0.2 else None
+        created_at = spread_datetime(rng, now, years)
+        yield {
+            'name': name,
+            'company': company,
+            'email': email,
+            'phone': f'09{rng.randint(10, 99)}-{rng.randint(100, 999)}-{rng.randint(100, 999)}',
+            'stage': rng.choices(stages, cum_weights=stage_weights)[0],
+            'estimated_value': heavy_tail(rng, 12.5, 1.4),
+            # 約 10% 未指派，其餘集中在少數業務
+            'assigned_to_id': (
+                rng.choices(assignees, cum_weights=assignee_weights)[0]
+                if assignees and rng.random() > 0.1 else None
+            ),
+            'created_at': created_at,
+            'updated_at': created_at,
+            'search_document': build_document(company, name, email),
+        }
+
+
+def generate_transactions(seed, index, start, count, now, creators, years):
+    rng = chunk_rng(seed, 'transactions', index)
+    categories = list(CATEGORY_PROFILES)
+    category_weights = cumulative(weight for weight, _mu, _sigma in CATEGORY_PROFILES.values())
+    creator_weights = skewed_weights(len(creators), exponent=0.8) if creators else None
+    for number in range(start, start + count):
+        category = rng.choices(categories, cum_weights=category_weights)[0]
+        _weight, mu, sigma = CATEGORY_PROFILES[category]
+        amount = heavy_tail(rng, mu, sigma)
+        created_at = spread_datetime(rng, now, years)
+        yield {
+            'title': f"{rng.choice(EXPENSE_TITLES[category])} #{number}",
+            'amount': amount if category == 'REVENUE' else -amount,
+            'category': category,
+            'date': timezone.localdate(created_at),
+            'created_by_id': rng.choices(creators, cum_weights=creator_weights)[0] if creators else None,
+            'created_at': created_at,
+            'updated_at': created_at,
+        }
+
+
+GENERATORS = {
+    'users': ('hr.User', generate_users),
+    'customers': ('crm.Customer', generate_customers),
+    'transactions': ('finance.Transaction', generate_transactions),
+}
+
+
+# --- 寫入 ---
+
+def copy_rows(model, rows):
+    """PostgreSQL COPY：比 INSERT 快一個數量級 (不經過 ORM，呼叫端需自行維護統計表)"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    columns, count = None, 0
+    for row in rows:
+        if columns is None:
+            columns = list(row)
+        writer.writerow(['' if row[column] is None else row[column] for column in columns])
+        count += 1
+    if not count:
+        return 0
+
+    buffer.seek(0)
+    sql = f"COPY {model._meta.db_table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)"
+    with connection.cursor() as cursor:
+        raw = cursor.cursor
+        if hasattr(raw, 'copy_expert'):  # psycopg2
+            raw.copy_expert(sql, buffer)
+        else:  # psycopg 3
+            with raw.copy(sql) as copy:
+                copy.write(buffer.getvalue())
+    return count
+
+
+def write_chunk(kind, index, start, count, options):
+    """
+    產生並寫入一個區塊 (可在子行程中執行)，回傳寫入筆數。
+    options: seed、anchor (時間基準點)、use_copy、batch_size，
+    以及各產生器需要的參數 (prefix / password / assignees / creators / years)
+    兩種寫入方式都不維護統計表 (管線統計、現金流、餘額檢查點)，由呼叫端全部寫完後各重建一次。
+    """
+    label, generator = GENERATORS[kind]
+    model = apps.get_model(label)
+    args = (options['seed'], index, start, count, options['anchor'])
+    if kind == 'users':
+        rows = generator(*args, options['prefix'], options['password'])
+    elif kind == 'customers':
+        rows = generator(*args, options['assignees'], options['years'])
+    else:
+        rows = generator(*args, options['creators'], options['years'])
+
+    with transaction.atomic():
+        if options['use_copy']:
+            return copy_rows(model, rows)
+        # 💡 以一般 QuerySet 寫入，略過 CustomerQuerySet / TransactionQuerySet 的增量維護
+        # (每批逐一更新統計分組、savepoint 與 on_commit 通知)，與 COPY 路徑相同由呼叫端最後重建
+        with explicit_timestamps(model):
+            objs = models.QuerySet(model).bulk_create(
+                [model(**row) for row in rows], batch_size=options['batch_size'],
+            )
+        return len(objs)
+
+
+def plan_chunks(total, chunk_size, offset=0):
+    """
+    [(區塊編號, 起始序號, 筆數)]；offset 為已存在的筆數 (需為 chunk_size 的倍數)，
+    分批補到 total 時區塊編號與一次產生 total 筆相同，資料內容也相同
+    """
+    return [
+        (start // chunk_size, start, min(chunk_size, total - start))
+        for start in range(offset, total, chunk_size)
+    ]
+
+
+def hashed_password(raw=DEFAULT_PASSWORD):
+    """所有壓測帳號共用的密碼雜湊，只計算一次"""
+    return make_password(raw)
+
+
+def close_connections():
+    """建立子行程前關閉連線，避免 fork 後多個行程共用同一條資料庫連線"""
+    connections.close_all()
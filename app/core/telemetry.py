@@ -0,0 +1,194 @@
+"""
+Nexus 請求層級效能量測 (Server-Timing)
+
+抽樣命中的請求會記錄：
+- db：查詢數與 SQL 總耗時 (connection.execute_wrapper)
+- cache：快取命中 / 未命中次數與耗時 (InstrumentedRedisCache)
+- tpl：模板渲染耗時 (TimedDjangoTemplates)
+並以 Server-Timing 標頭回傳 (瀏覽器開發者工具 → Network → Timing 可直接檢視)，
+查詢數超過 QUERY_BUDGETS 設定的預算時記錄警告。
+
+未抽樣的請求只多一次亂數判斷；快取與模板的量測點也只多讀一次 ContextVar，
+因此可以在正式環境 (gunicorn) 常駐啟用，以 SERVER_TIMING_SAMPLE_RATE 控制比例。
+"""
+import logging
+import random
+import time
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+from django.template import TemplateDoesNotExist
+from django.template.backends.django import DjangoTemplates, Template, reraise
+
+# 💡 django-redis 為正式環境的快取後端；未安裝時不提供快取量測
+try:
+    from django_redis.cache import RedisCache
+except ImportError:
+    RedisCache = None
+
+logger = logging.getLogger('core.telemetry')
+
+_current = ContextVar('request_stats', default=None)
+_MISSING = object()
+
+
+class RequestStats:
+    __slots__ = ('started', 'queries', 'db_ms', 'cache_hits', 'cache_misses', 'cache_ms', 'template_ms', 'rendering')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_ms = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.cache_ms = 0.0
+        self.template_ms = 0.0
+        self.rendering = False
+
+    def time_query(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.db_ms += (time.perf_counter() - started) * 1000
+
+    def server_timing(self):
+        total_ms = (time.perf_counter() - self.started) * 1000
+        return ', '.join([
+            f'db;dur={self.db_ms:.2f};desc="{self.queries} queries"',
+            f'cache;dur={self.cache_ms:.2f};desc="{self.cache_hits} hits / {self.cache_misses} misses"',
+            f'tpl;dur={self.template_ms:.2f}',
+            f'total;dur={total_ms:.2f}',
+        ])
+
+
+def current_stats():
+    """目前請求的量測結果；未抽樣或不在請求中時為 None"""
+    return _current.get()
+
+
+@contextmanager
+def measure():
+    """
+    在區塊內量測查詢、快取與模板渲染；已在量測中 (外層 middleware 已啟用) 時沿用同一份結果，
+    讓 /metrics 與 Server-Timing 共用一次量測
+    """
+    stats = _current.get()
+    if stats is not None:
+        yield stats
+        return
+    stats = RequestStats()
+    token = _current.set(stats)
+    try:
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(stats.time_query))
+            yield stats
+    finally:
+        _current.reset(token)
+
+
+def view_name(request):
+    """指標與日誌使用的 view 名稱；未匹配任何路由 (404) 時統一為 <unresolved>，避免標籤數量失控"""
+    match = getattr(request, 'resolver_match', None)
+    return match.view_name if match else '<unresolved>'
+
+
+def query_budget(view_name):
+    budgets = settings.QUERY_BUDGETS
+    return budgets.get(view_name, budgets.get('*'))
+
+
+class ServerTimingMiddleware:
+    """放在 MIDDLEWARE 最前面，total 才涵蓋其他 middleware 的耗時"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if random.random() >= settings.SERVER_TIMING_SAMPLE_RATE:
+            return self.get_response(request)
+
+        with measure() as stats:
+            response = self.get_response(request)
+
+        response['Server-Timing'] = stats.server_timing()
+
+        name = view_name(request)
+        budget = query_budget(name)
+        if budget is not None and stats.queries > budget:
+            logger.warning(
+                "Query budget exceeded: %s (%s) ran %d queries, budget %d",
+                name, request.path, stats.queries, budget,
+                extra={'view_name': name, 'queries': stats.queries, 'budget': budget, 'db_ms': round(stats.db_ms, 2)},
+            )
+        return response
+
+
+class InstrumentedCacheMixin:
+    """計算 get / get_many 的命中與耗時 (只在量測中的請求)"""
+
+    def get(self, key, default=None, version=None, **kwargs):
+        stats = _current.get()
+        if stats is None:
+            return super().get(key, default, version, **kwargs)
+        started = time.perf_counter()
+        value = super().get(key, _MISSING, version, **kwargs)
+        stats.cache_ms += (time.perf_counter() - started) * 1000
+        if value is _MISSING:
+            stats.cache_misses += 1
+            return default
+        stats.cache_hits += 1
+        return value
+
+    def get_many(self, keys, *args, **kwargs):
+        stats = _current.get()
+        if stats is None:
+            return super().get_many(keys, *args, **kwargs)
+        keys = list(keys)
+        started = time.perf_counter()
+        token = _current.set(None)  # 後端以逐一 get() 實作 get_many 時不重複計數
+        try:
+            values = super().get_many(keys, *args, **kwargs)
+        finally:
+            _current.reset(token)
+        stats.cache_ms += (time.perf_counter() - started) * 1000
+        stats.cache_hits += len(values)
+        stats.cache_misses += len(keys) - len(values)
+        return values
+
+
+if RedisCache is not None:
+    class InstrumentedRedisCache(InstrumentedCacheMixin, RedisCache):
+        pass
+
+
+class TimedTemplate(Template):
+    def render(self, context=None, request=None):
+        stats = _current.get()
+        if stats is None or stats.rendering:
+            # 巢狀渲染 (render_to_string 於模板標籤內) 只計最外層
+            return super().render(context, request)
+        stats.rendering = True
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            stats.template_ms += (time.perf_counter() - started) * 1000
+            stats.rendering = False
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """與 Django 內建模板引擎相同，只是回傳可量測渲染時間的 Template"""
+
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return TimedTemplate(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            reraise(exc, self)
@@ -0,0 +1,448 @@
+import asyncio
+import io
+import json
+import logging
+import tempfile
+import time
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from pathlib import Path
+from unittest import skipUnless
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from apps.crm.models import Customer, PipelineRollup
+from apps.crm.signals import PIPELINE_CACHE_NAMESPACE
+from apps.finance.models import CashFlowDaily, Transaction
+from core import benchmark, events, metrics, synthetic, warmup
+from core.cache import bump_version, get_stats, get_version, stale_while_revalidate
+from core.log import BackgroundHandler, SuppressNoiseFilter, sql_logger
+from core.nplusone import NPlusOneError, detect, fingerprint
+from core.telemetry import InstrumentedCacheMixin, RequestStats, _current
+
+User = get_user_model()
+
+
+class HomeDashboardTests(TransactionTestCase):
+    """首頁看板：三個 widget 同時載入 (各自執行緒與連線)，各自以 stale-while-revalidate 快取"""
+
+    def setUp(self):
+        cache.clear()
+        self.admin = User.objects.create_superuser(username='boss', password='x', email='boss@example.com', role='CRM')
+        self.client.force_login(self.admin)
+        Customer.objects.create(name='王小明', company='台積電', stage='LEAD', estimated_value=1000)
+        Transaction.objects.create(title='顧問收入', amount=Decimal('5000'), category='REVENUE', date=timezone.localdate())
+
+    def wait_until_fresh(self, namespace, name):
+        key = f'nexus:swr:{namespace}:{name}'
+        deadline = time.monotonic() + 5
+        while time.monotonic() < deadline:
+            entry = cache.get(key)
+            if entry and entry['version'] == get_version(namespace) and not cache.get(f'{key}:refreshing'):
+                return entry['value']
+            time.sleep(0.02)
+        self.fail(f"{key} 未在時限內重新計算")
+
+    def test_stale_while_revalidate(self):
+        calls = []
+
+        def build():
+            calls.append(1)
+            return len(calls)
+
+        self.assertEqual(stale_while_revalidate('test.swr', 'n', build), (1, False))
+        self.assertEqual(stale_while_revalidate('test.swr', 'n', build), (1, False))
+        bump_version('test.swr')
+        # 版本已變：先回傳舊值，背景重新計算
+        self.assertEqual(stale_while_revalidate('test.swr', 'n', build), (1, True))
+        self.assertEqual(self.wait_until_fresh('test.swr', 'n'), 2)
+        self.assertEqual(stale_while_revalidate('test.swr', 'n', build), (2, False))
+        self.assertEqual(get_stats(['test.swr'])['test.swr']['stale'], 1)
+
+    def test_widgets_load_and_revalidate(self):
+        response = self.client.get(reverse('dashboard'))
+        self.assertEqual(response.status_code, 200)
+        widgets = {widget['name']: widget for widget in response.context['widgets']}
+        self.assertEqual(list(widgets), ['crm', 'finance', 'hr'])
+        self.assertEqual(widgets['crm']['cards'][0]['value'], '1')
+        self.assertEqual(widgets['finance']['cards'][0]['value'], '$5,000')
+        self.assertEqual(widgets['hr']['cards'][2]['value'], '1')
+        self.assertFalse(any(widget['stale'] for widget in widgets.values()))
+
+        Customer.objects.create(name='李小龍', company='富邦媒體', stage='WON', estimated_value=10)
+        widgets = {widget['name']: widget for widget in self.client.get(reverse('dashboard')).context['widgets']}
+        self.assertTrue(widgets['crm']['stale'])
+        self.assertEqual(widgets['crm']['cards'][0]['value'], '1')
+        self.assertFalse(widgets['hr']['stale'])
+
+        self.assertEqual(self.wait_until_fresh(PIPELINE_CACHE_NAMESPACE, 'dashboard:crm')['cards'][0]['value'], '2')
+
+
+class LiveEventsTests(TestCase):
+    """看板即時事件 (SSE)：客戶異動提交後推送各階段增量，連線關閉即取消訂閱"""
+
+    def setUp(self):
+        self.staff = User.objects.create_user(username='staff', password='x', is_staff=True)
+        self.url = reverse('events')
+
+    def create_customer(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Customer.objects.create(name='王小明', company='台積電', stage='WON', estimated_value=Decimal('1200.50'))
+
+    async def test_stream_pushes_pipeline_deltas(self):
+        await self.async_client.aforce_login(self.staff)
+        self.assertEqual((await self.async_client.get(self.url, {'channels': 'hr.secret'})).status_code, 400)
+
+        broker = events.get_broker()
+        response = await self.async_client.get(self.url, {'channels': 'crm.pipeline'})
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        stream = aiter(response.streaming_content)
+        self.assertEqual(await anext(stream), b'retry: 5000\n\n')
+        self.assertEqual(broker.subscriber_count(), 1)
+
+        await sync_to_async(self.create_customer)()
+        chunk = await asyncio.wait_for(anext(stream), 2)
+        self.assertTrue(chunk.startswith(b'event: crm.pipeline\n'))
+        self.assertEqual(
+            json.loads(chunk.split(b'data: ', 1)[1]),
+            {'type': 'delta', 'stages': {'WON': {'count': 1, 'value': '1200.50'}}},
+        )
+        # 瀏覽器斷線時 ASGI handler 取消送出回應的 task，串流的 finally 隨之取消訂閱
+        pending = asyncio.ensure_future(anext(stream))
+        await asyncio.sleep(0.01)
+        pending.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await pending
+        self.assertEqual(broker.subscriber_count(), 0)
+
+    async def test_slow_subscriber_gets_reset(self):
+        broker = events.LocalBroker()
+        subscription = await broker.subscribe(['crm.pipeline'])
+        for count in range(events.QUEUE_SIZE + 5):
+            broker.publish('crm.pipeline', {'type': 'delta', 'n': count})
+        await asyncio.sleep(0)
+        # 佇列滿時丟棄累積的增量改送 reset，之後的事件照常送出
+        self.assertEqual(await subscription.get(timeout=1), ('crm.pipeline', events.RESET))
+        self.assertEqual(await subscription.get(timeout=1), ('crm.pipeline', {'type': 'delta', 'n': events.QUEUE_SIZE + 1}))
+
+    def test_wsgi_falls_back_to_reconnect(self):
+        self.client.force_login(self.staff)
+        response = self.client.get(self.url, {'channels': 'crm.pipeline,finance.cashflow'})
+        self.assertEqual(response.content, b'retry: 30000\n\n')
+
+
+class WarmupTests(TestCase):
+    """worker 暖機：各步驟皆執行，模板沿著 extends / include 一併編譯"""
+
+    def test_warm_up_steps(self):
+        self.assertGreater(warmup.compile_templates(), len(warmup.TEMPLATES))
+        self.assertGreaterEqual(warmup.resolve_urls(), 3)
+
+        cache.clear()
+        with self.assertLogs('core.warmup', 'INFO'):
+            timings = warmup.warm_up()
+        self.assertEqual(list(timings), ['urls', 'models', 'templates', 'caches', 'total'])
+        self.assertIsNotNone(cache.get(f'nexus:swr:{PIPELINE_CACHE_NAMESPACE}:dashboard:crm'))
+
+    def test_prime_caches_skips_background_revalidation(self):
+        # preload 時在 fork 之前執行：過期的快取應直接同步重建，不設定 :refreshing 鎖
+        key = f'nexus:swr:{PIPELINE_CACHE_NAMESPACE}:dashboard:crm'
+        warmup.prime_caches()
+        bump_version(PIPELINE_CACHE_NAMESPACE)
+        warmup.prime_caches()
+        self.assertIsNone(cache.get(f'{key}:refreshing'))
+        self.assertEqual(cache.get(key)['version'], get_version(PIPELINE_CACHE_NAMESPACE))
+
+
+class ServerTimingTests(TestCase):
+    """抽樣的請求帶 Server-Timing 標頭，查詢數超出預算時記錄警告；未抽樣時不做任何量測"""
+
+    def setUp(self):
+        self.admin = User.objects.create_superuser(username='boss', password='x', email='boss@example.com')
+        self.client.force_login(self.admin)
+        self.url = reverse('admin:crm_customer_changelist')
+
+    @override_settings(SERVER_TIMING_SAMPLE_RATE=0)
+    def test_unsampled_request_has_no_header(self):
+        self.assertNotIn('Server-Timing', self.client.get(self.url))
+
+    @override_settings(SERVER_TIMING_SAMPLE_RATE=1, QUERY_BUDGETS={'admin:crm_customer_changelist': 1})
+    def test_header_and_query_budget(self):
+        with self.assertLogs('core.telemetry', 'WARNING') as logs:
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.get(self.url)
+        timing = dict(
+            (metric.split(';')[0], metric) for metric in response['Server-Timing'].split(', ')
+        )
+        self.assertEqual(set(timing), {'db', 'cache', 'tpl', 'total'})
+        self.assertIn(f'desc="{len(ctx.captured_queries)} queries"', timing['db'])
+        self.assertNotIn('tpl;dur=0.00', timing['tpl'])
+        self.assertIn('Query budget exceeded: admin:crm_customer_changelist', logs.output[0])
+
+    def test_cache_hits_and_misses(self):
+        backend = type('TimedLocMem', (InstrumentedCacheMixin, LocMemCache), {})('timing-test', {})
+        backend.set('present', 1)
+        stats = RequestStats()
+        token = _current.set(stats)
+        try:
+            self.assertEqual(backend.get('present'), 1)
+            self.assertEqual(backend.get('absent', 'default'), 'default')
+            self.assertEqual(backend.get_many(['present', 'absent']), {'present': 1})
+        finally:
+            _current.reset(token)
+        self.assertEqual((stats.cache_hits, stats.cache_misses), (2, 2))
+
+
+class RequestProfilingTests(TestCase):
+    """staff 以 ?_profile 剖析單次請求：參數不影響列表篩選，結果可在後台檢視；非 staff 不會觸發"""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        override = override_settings(PROFILE_DIR=Path(directory.name))
+        override.enable()
+        self.addCleanup(override.disable)
+        self.admin = User.objects.create_superuser(username='boss', password='x', email='boss@example.com')
+        Customer.objects.create(name='王大明', company='宏達科技', stage='LEAD', estimated_value=1000)
+
+    def test_profile_changelist_and_view_result(self):
+        self.client.force_login(self.admin)
+        response = self.client.get(reverse('admin:crm_customer_changelist'), {'_profile': 'cprofile', 'stage__exact': 'LEAD'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['cl'].result_count, 1)
+        profile_id = response['X-Profile-Id']
+
+        listing = self.client.get(reverse('profile_list'))
+        self.assertContains(listing, profile_id)
+        detail = self.client.get(reverse('profile_detail', args=[profile_id]))
+        self.assertContains(detail, 'changelist_view')
+        self.assertContains(detail, 'crm_customer')
+        self.assertEqual(self.client.get(reverse('profile_detail', args=['..secret'])).status_code, 404)
+
+    def test_non_staff_cannot_profile(self):
+        clerk = User.objects.create_user(username='clerk', password='x', employee_id='EMP777')
+        self.client.force_login(clerk)
+        response = self.client.get(reverse('hr:employee-list'), HTTP_X_PROFILE='1')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('X-Profile-Id', response)
+
+    def test_only_explicit_modes_enable_profiling(self):
+        """標頭與網址參數只接受 1 / cprofile；X-Profile: 0 之類的值不會觸發剖析，無效參數仍會被移除"""
+        self.client.force_login(self.admin)
+        changelist = reverse('admin:crm_customer_changelist')
+        for value in ('0', 'false', ''):
+            response = self.client.get(changelist, HTTP_X_PROFILE=value)
+            self.assertNotIn('X-Profile-Id', response)
+        response = self.client.get(changelist, {'_profile': 'off', 'stage__exact': 'LEAD'})
+        self.assertNotIn('X-Profile-Id', response)
+        self.assertEqual(response.context['cl'].result_count, 1)
+        self.assertIn('X-Profile-Id', self.client.get(changelist, HTTP_X_PROFILE='cprofile'))
+
+
+class FastJsonTests(TestCase):
+    """core.json：Decimal 以字串精確輸出、延遲翻譯字串與日期可直接序列化，DRF 與 JsonResponse 皆改用之"""
+
+    def test_encodes_django_types(self):
+        from django.utils.translation import gettext_lazy
+        from core import json as fast_json
+
+        data = {
+            'amount': Decimal('12345678901234.57'),
+            'label': gettext_lazy("營收"),
+            'day': date(2026, 1, 31),
+            'at': datetime(2026, 1, 31, 8, 30, tzinfo=dt_timezone.utc),
+            'span': timedelta(hours=1),
+        }
+        self.assertEqual(fast_json.loads(fast_json.dumps(data)), {
+            'amount': '12345678901234.57',
+            'label': '營收',
+            'day': '2026-01-31',
+            'at': '2026-01-31T08:30:00Z',
+            'span': 'P0DT01H00M00S',
+        })
+        with self.assertRaises(TypeError):
+            fast_json.dumps({'value': object()})
+        with self.assertRaises(TypeError):
+            fast_json.FastJsonResponse([1, 2])
+
+    def test_parser_and_endpoints(self):
+        from rest_framework.exceptions import ParseError
+        from core.json import FastJSONParser
+
+        self.assertEqual(FastJSONParser().parse(io.BytesIO('{"title": "交易"}'.encode())), {'title': '交易'})
+        with self.assertRaises(ParseError):
+            FastJSONParser().parse(io.BytesIO(b'{broken'))
+
+        user = User.objects.create_user(username='bi', password='x', role='FINANCE', is_staff=True)
+        Transaction.objects.create(title='大額', amount=Decimal('98765432.10'), category='REVENUE', date=date(2026, 1, 5))
+        self.client.force_login(user)
+        response = self.client.get(reverse('finance:transaction-list'))
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertEqual(response.json()['results'][0]['amount'], '98765432.10')
+        self.assertEqual(self.client.get(reverse('finance:balance_api'), {'date': '2026-01-31'}).json()['balance'], '98765432.10')
+
+        rows = benchmark.json_codecs(50, repeat=1)
+        self.assertEqual(rows['rows'], 50)
+        self.assertGreater(rows['fast']['dumps_ms'], 0)
+
+
+class SeedScaleTests(TestCase):
+    """壓測資料：同一 seed 與基準日產生相同內容，且寫入後統計表保持一致"""
+
+    def test_seed_scale_is_reproducible(self):
+        call_command('seed_scale', users=30, customers=120, transactions=300, chunk_size=64,
+                     seed=7, anchor=date(2026, 1, 31), stdout=io.StringIO())
+        self.assertEqual(User.objects.filter(username__startswith='load').count(), 30)
+        self.assertEqual(Customer.objects.count(), 120)
+        self.assertEqual(Transaction.objects.count(), 300)
+        self.assertEqual(PipelineRollup.objects.drift(), [])
+        self.assertEqual(CashFlowDaily.objects.drift(), [])
+        self.assertLessEqual(Transaction.objects.order_by('-date').first().date, date(2026, 1, 31))
+
+        # 區塊內容只由 (seed, 區塊編號) 決定，與執行順序無關
+        anchor = Transaction.objects.order_by('-created_at').first().created_at
+        first = list(synthetic.generate_transactions(7, 3, 192, 64, anchor, [1, 2], 5))
+        again = list(synthetic.generate_transactions(7, 3, 192, 64, anchor, [1, 2], 5))
+        self.assertEqual(first, again)
+        self.assertNotEqual(first, list(synthetic.generate_transactions(8, 3, 192, 64, anchor, [1, 2], 5)))
+
+
+class BenchmarkTests(TestCase):
+    """效能基準：逐級擴充的資料與一次產生相同，報告比對能抓出查詢數與延遲退化"""
+
+    def test_plan_chunks_resume_from_offset(self):
+        self.assertEqual(synthetic.plan_chunks(300, 100, offset=100), synthetic.plan_chunks(300, 100)[1:])
+
+    def test_dataset_and_endpoints(self):
+        dataset = benchmark.Dataset(3, timezone.now(), chunk_size=200, use_copy=False)
+        dataset.grow(200)
+        dataset.grow(400)
+        self.assertEqual(Customer.objects.count(), 400)
+        self.assertEqual(Transaction.objects.count(), 400)
+        self.assertEqual(User.objects.filter(username__startswith=benchmark.USER_PREFIX).count(), 4)
+        self.assertEqual(PipelineRollup.objects.drift(), [])
+
+        self.client.force_login(User.objects.create_superuser(username='boss', password='x'))
+        results = benchmark.run_endpoints(self.client, repeat=2, only={'crm_stats_api', 'employee_api'})
+        self.assertEqual(set(results), {'crm_stats_api', 'employee_api'})
+        for row in results.values():
+            self.assertEqual(row['status'], 200)
+            self.assertLessEqual(row['p50_ms'], row['p95_ms'])
+
+    def test_compare_flags_regressions(self):
+        def report(queries, p95):
+            return {'results': {'10000': {'crm_stats_api': {'queries': queries, 'p95_ms': p95}}}}
+
+        self.assertFalse(any(row[-1] for row in benchmark.compare(report(1, 10.5), report(1, 10))))
+        flagged = [row[2] for row in benchmark.compare(report(3, 30), report(1, 10)) if row[-1]]
+        self.assertEqual(flagged, ['queries', 'p95_ms'])
+        self.assertEqual(benchmark.percentile([5, 1, 4, 2, 3], 50), 3)
+
+
+class NPlusOneDetectionTests(TestCase):
+    """N+1 偵測：同一位置重複相同形狀的查詢時拋出例外 (測試環境)，預先 JOIN 的列表頁與 API 不受影響"""
+
+    def setUp(self):
+        self.admin = User.objects.create_superuser(username='boss', password='x', email='boss@example.com')
+        clerks = User.objects.bulk_create([
+            User(username=f'clerk{i}', employee_id=f'FIN{i:03d}', role='FINANCE') for i in range(8)
+        ])
+        Transaction.objects.bulk_create([
+            Transaction(title=f'文具採購 {i}', amount=-100, category='OFFICE', date=date(2025, 1, 1), created_by=clerk)
+            for i, clerk in enumerate(clerks)
+        ])
+
+    def test_fingerprint_normalizes_literals(self):
+        self.assertEqual(
+            fingerprint("SELECT * FROM t WHERE id IN (%s, %s, %s) AND name = 'x' LIMIT 21"),
+            fingerprint("SELECT *  FROM t WHERE id IN (%s) AND name = 'y''s' LIMIT 1"),
+        )
+
+    def test_lazy_relation_access_is_flagged(self):
+        with self.assertRaisesMessage(NPlusOneError, 'core/tests.py'):
+            with detect(raise_errors=True):
+                [transaction.created_by.username for transaction in Transaction.objects.all()]
+
+        with detect(raise_errors=True) as tracker:
+            [transaction.created_by.username for transaction in Transaction.objects.select_related('created_by')]
+        self.assertEqual(tracker.violations(), [])
+
+    def test_changelists_and_employee_api_pass(self):
+        self.client.force_login(self.admin)
+        for url in (reverse('admin:finance_transaction_changelist'), reverse('admin:hr_user_changelist'),
+                    reverse('hr:employee-list')):
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url).status_code, 200)
+
+
+class QueryLoggingTests(TestCase):
+    """SQL 日誌：只有慢查詢或抽樣命中的查詢經由背景佇列寫出"""
+
+    def setUp(self):
+        self.records = []
+        target = logging.Handler()
+        target.emit = self.records.append
+        target.name = 'test_sql_target'
+        self.addCleanup(target.close)
+        self.handler = BackgroundHandler(handlers=['test_sql_target'])
+        sql_logger.addHandler(self.handler)
+        self.addCleanup(self.handler.close)
+        self.addCleanup(sql_logger.removeHandler, self.handler)
+
+    def run_query(self):
+        User.objects.count()
+        self.handler.stop()  # 送出佇列中的紀錄
+
+    @override_settings(SQL_SLOW_QUERY_MS=10_000, SQL_LOG_SAMPLE_RATE=0)
+    def test_fast_queries_are_not_logged(self):
+        self.run_query()
+        self.assertEqual(self.records, [])
+
+    @override_settings(SQL_SLOW_QUERY_MS=0, SQL_LOG_SAMPLE_RATE=0)
+    def test_slow_queries_are_logged_with_duration(self):
+        self.run_query()
+        self.assertEqual(len(self.records), 1)
+        record = self.records[0]
+        self.assertEqual(record.levelno, logging.WARNING)
+        self.assertIn('COUNT(*)', record.sql)
+        self.assertGreaterEqual(record.duration_ms, 0)
+
+    def test_noise_filter_uses_record_args(self):
+        def record(level, *args):
+            return logging.makeLogRecord({'levelno': level, 'msg': '"%s" %s %s', 'args': args})
+
+        noise = SuppressNoiseFilter()
+        self.assertFalse(noise.filter(record(logging.INFO, 'GET /admin/ HTTP/1.1', '200', '512')))
+        self.assertFalse(noise.filter(record(logging.INFO, 'GET /favicon.ico HTTP/1.1', '302', '0')))
+        self.assertTrue(noise.filter(record(logging.INFO, 'POST /admin/ HTTP/1.1', '200', '512')))
+        self.assertTrue(noise.filter(record(logging.WARNING, 'GET /missing/ HTTP/1.1', '404', '0')))
+
+
+@skipUnless(metrics.Histogram is not None, "需要 prometheus_client")
+class MetricsEndpointTests(TestCase):
+    """/metrics：依 view 名稱記錄延遲與查詢數，只允許內部網段讀取"""
+
+    def setUp(self):
+        self.staff = User.objects.create_user(username='staff', password='x', is_staff=True, employee_id='EMP901')
+
+    def test_request_metrics_by_view(self):
+        self.client.force_login(self.staff)
+        self.client.get(reverse('hr:employee-list'))
+        body = self.client.get(reverse('metrics')).content.decode()
+        self.assertIn('nexus_http_request_duration_seconds_count{method="GET",view="hr:employee-list"}', body)
+        self.assertIn('nexus_db_queries_per_request_count{view="hr:employee-list"}', body)
+        self.assertIn('nexus_http_requests_total{method="GET",status="2xx",view="hr:employee-list"}', body)
+
+    def test_external_addresses_are_rejected(self):
+        self.assertEqual(self.client.get(reverse('metrics'), REMOTE_ADDR='8.8.8.8').status_code, 403)
+        forwarded = self.client.get(reverse('metrics'), HTTP_X_FORWARDED_FOR='8.8.8.8')
+        self.assertEqual(forwarded.status_code, 403)
@@ -4,12 +4,16 @@ from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
 from django.views.generic.base import RedirectView
-from .views import dashboard_home
+from .metrics import metrics_view
+from .views import dashboard_home, events_stream, profile_detail, profile_flamegraph, profile_list
 
 urlpatterns = [
     # 1. 優先處理 Favicon
     path('favicon.ico', RedirectView.as_view(url=settings.STATIC_URL + 'favicon.ico')),
 
+    # Prometheus 指標 (僅限內部網段)
+    path('metrics', metrics_view, name='metrics'),
+
     # 2. 網站根目錄
     path('', dashboard_home, name='dashboard'),
 
@@ -17,6 +21,15 @@ urlpatterns = [
     # 這樣當網址是 /admin/crm/dashboard/ 時，會優先進入你的 App 邏輯
     path('admin/crm/', include('apps.crm.urls')), 
 
+    # 單次請求效能剖析 (?_profile=1) 的結果頁面，僅限 staff
+    path('admin/profiles/', admin.site.admin_view(profile_list), name='profile_list'),
+    path('admin/profiles/<str:profile_id>/', admin.site.admin_view(profile_detail), name='profile_detail'),
+    path(
+        'admin/profiles/<str:profile_id>/flamegraph/',
+        admin.site.admin_view(profile_flamegraph),
+        name='profile_flamegraph'
+    ),
+
     # 4. 原生 Django Admin 核心
     path('admin/', admin.site.urls), 
     
@@ -24,6 +37,8 @@ urlpatterns = [
     path('api-auth/', include('rest_framework.urls')),
     path('api/hr/', include('apps.hr.urls', namespace='hr')),
     path('api/finance/', include('apps.finance.urls', namespace='finance')),
+    # 看板即時事件 (SSE)，正式環境由 ASGI 服務 (events) 處理
+    path('api/events/', events_stream, name='events'),
 ]
 
 # 6. 開發環境靜態檔案處理
@@ -1,42 +1,81 @@
+from asgiref.sync import sync_to_async
+from django.contrib import admin
 from django.shortcuts import render
 from django.contrib.admin.views.decorators import staff_member_required
-from django.db.models import Sum, Count
-# 💡 修正關鍵：從正確的 App (apps.crm) 匯入模型
-from apps.crm.models import Customer 
+from django.core.handlers.asgi import ASGIRequest
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseBadRequest, StreamingHttpResponse
+from apps.crm.signals import PIPELINE_CACHE_NAMESPACE
+from apps.finance.signals import CASHFLOW_CACHE_NAMESPACE
+from core import dashboard, events, profiling
+
+# 可訂閱的即時事件頻道 (與快取命名空間同名)
+EVENT_CHANNELS = (PIPELINE_CACHE_NAMESPACE, CASHFLOW_CACHE_NAMESPACE)
 
 @staff_member_required
-def dashboard_home(request):
+async def dashboard_home(request):
     """
-    Nexus Admin 首頁數據導覽
+    Nexus Admin 首頁數據導覽：CRM 管線、財務現金流、HR 人力三個 widget
+    各 widget 同時載入並各自快取 (stale-while-revalidate)，見 core.dashboard
     """
-    # 獲取統計數據
-    queryset = Customer.objects.all()
-    stats = queryset.aggregate(
-        total_val=Sum('estimated_value'),
-        count=Count('id')
-    )
-    
-    # 準備渲染給 crm_dashboard.html 的內容
+    widgets = await dashboard.load_widgets()
+
     context = {
-        'username': request.user.username,
-        'cards': [
-            {
-                "title": "總客戶數",
-                "value": f"{stats['count'] or 0:,}",
-                "icon": "groups",
-            },
-            {
-                "title": "預估總案量",
-                "value": f"${(stats['total_val'] or 0):,.0f}",
-                "icon": "payments",
-            },
-            {
-                "title": "活躍商機",
-                "value": queryset.exclude(stage__in=['WON', 'LOST']).count(),
-                "icon": "trending_up",
-            },
-        ],
+        'title': "Nexus 營運總覽",
+        'widgets': widgets,
     }
-    
-    # 💡 指向正確的模板路徑
-    return render(request, 'admin/crm/customer/crm_dashboard.html', context)
\ No newline at end of file
+
+    # 💡 模板與 context processor 會讀取 request.user (同步 ORM)，交回同步執行緒渲染
+    return await sync_to_async(render)(request, 'admin/crm/customer/crm_dashboard.html', context)
+
+
+@staff_member_required
+async def events_stream(request):
+    """
+    看板即時更新 (Server-Sent Events)：GET /api/events/?channels=crm.pipeline,finance.cashflow
+    統計異動時推送增量，取代前端定期輪詢 crm_stats_api
+    """
+    channels = [name for name in request.GET.get('channels', '').split(',') if name]
+    if not channels or set(channels) - set(EVENT_CHANNELS):
+        return HttpResponseBadRequest(f"channels 須為 {' / '.join(EVENT_CHANNELS)}")
+
+    headers = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}  # 關閉 nginx 緩衝
+    if not isinstance(request, ASGIRequest):
+        # 💡 WSGI (runserver / gunicorn sync worker) 無法長時間保持連線而不佔用執行緒，
+        # 只回覆重連間隔，瀏覽器每 30 秒重連一次並重新讀取數據
+        return HttpResponse(b'retry: 30000\n\n', content_type='text/event-stream', headers=headers)
+    return StreamingHttpResponse(events.stream(channels), content_type='text/event-stream', headers=headers)
+
+
+def profile_list(request):
+    """最近的單次請求剖析紀錄 (由 admin.site.admin_view 限制 staff 存取)"""
+    context = {
+        **admin.site.each_context(request),
+        'title': "效能剖析",
+        'profiles': profiling.list_profiles(),
+    }
+    return render(request, 'admin/profiles/list.html', context)
+
+
+def profile_detail(request, profile_id):
+    """剖析結果：SQL 時間軸 + cProfile 函式耗時表 / pyinstrument 火焰圖"""
+    profile = profiling.load_profile(profile_id)
+    total = profile['duration_ms'] or 1
+    for query in profile['queries']:
+        # 時間軸長條的位置與寬度 (佔整個請求的百分比)
+        query['offset_pct'] = round(query['start_ms'] / total * 100, 2)
+        query['width_pct'] = max(round(query['duration_ms'] / total * 100, 2), 0.3)
+    context = {
+        **admin.site.each_context(request),
+        'title': f"效能剖析：{profile['method']} {profile['path']}",
+        'profile': profile,
+        'callees': profiling.callee_table(profile_id),
+        'has_flamegraph': profiling.artifact_path(profile_id, '.html') is not None,
+    }
+    return render(request, 'admin/profiles/detail.html', context)
+
+
+def profile_flamegraph(request, profile_id):
+    path = profiling.artifact_path(profile_id, '.html')
+    if path is None:
+        raise Http404("火焰圖不存在")
+    return FileResponse(path.open('rb'), content_type='text/html; charset=utf-8')
@@ -0,0 +1,124 @@
+"""
+Nexus worker 暖機
+
+gunicorn 啟動時 (gunicorn.conf.py 的 when_ready / post_worker_init) 在接收流量前執行，
+把原本由前幾個請求承擔的初始化成本提前：
+- urls：建立 URL resolver 的反查表 (含 admin 每個 ModelAdmin 的路由)
+- models：各 model 的 _meta 關聯快取與 ContentType 快取 (admin 歷史紀錄、權限檢查會用到)
+- templates：以 cached loader 編譯 admin / 看板模板，並沿著 {% extends %} / {% include %} 編譯父模板
+- caches：計算首頁看板 widget 並直接寫入共用快取 (不觸發背景重新計算；資料庫無法連線時略過，不阻擋啟動)
+
+preload_app 時在 master 執行一次，fork 出的 worker 直接繼承結果；結束前關閉資料庫連線，避免 worker 共用 socket。
+"""
+import logging
+import time
+from contextlib import contextmanager
+
+from django.apps import apps
+from django.contrib import admin
+from django.contrib.contenttypes.models import ContentType
+from django.db import connections
+from django.template import TemplateDoesNotExist, engines
+from django.template.loader_tags import ExtendsNode, IncludeNode
+from django.urls import NoReverseMatch, resolve, reverse
+
+logger = logging.getLogger('core.warmup')
+
+TEMPLATES = [
+    'admin/index.html',
+    'admin/login.html',
+    'admin/change_list.html',
+    'admin/change_form.html',
+    'admin/delete_confirmation.html',
+    'admin/crm/customer/crm_dashboard.html',
+]
+
+
+@contextmanager
+def _step(timings, name):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[name] = round((time.perf_counter() - started) * 1000, 1)
+
+
+def resolve_urls():
+    """反查並解析首頁、admin 首頁與每個 ModelAdmin 的列表，回傳路徑數"""
+    paths = ['/', reverse('admin:index')]
+    for model in admin.site._registry:
+        try:
+            paths.append(reverse(f'admin:{model._meta.app_label}_{model._meta.model_name}_changelist'))
+        except NoReverseMatch:
+            continue
+    for path in paths:
+        resolve(path)
+    return len(paths)
+
+
+def load_models():
+    for model in apps.get_models():
+        model._meta.get_fields()
+    ContentType.objects.get_for_models(*admin.site._registry)
+
+
+def _constant_names(template):
+    """模板中以字串常數指定的 extends / include 目標"""
+    for node in template.nodelist.get_nodes_by_type((ExtendsNode, IncludeNode)):
+        expression = node.parent_name if isinstance(node, ExtendsNode) else node.template
+        if isinstance(getattr(expression, 'var', None), str):
+            yield str(expression.var)
+
+
+def compile_templates(names=None):
+    """編譯模板 (含父模板與 include)，回傳編譯的模板數"""
+    names = list(names or TEMPLATES)
+    names += [
+        template_name
+        for model_admin in admin.site._registry.values()
+        for template_name in (model_admin.change_list_template, model_admin.change_form_template)
+        if isinstance(template_name, str)
+    ]
+    compiled = set()
+    for backend in engines.all():
+        engine = getattr(backend, 'engine', None)
+        if engine is None:
+            continue
+        pending = list(names)
+        while pending:
+            name = pending.pop()
+            if (backend.name, name) in compiled:
+                continue
+            compiled.add((backend.name, name))
+            try:
+                template = engine.get_template(name)
+            except TemplateDoesNotExist:
+                continue
+            pending.extend(_constant_names(template))
+    return len(compiled)
+
+
+def prime_caches():
+    from core import dashboard
+
+    dashboard.prime_widgets()
+
+
+def warm_up(caches=True):
+    """依序執行各項暖機，回傳各步驟耗時 (毫秒)；單一步驟失敗只記錄警告"""
+    timings = {}
+    steps = [('urls', resolve_urls), ('models', load_models), ('templates', compile_templates)]
+    if caches:
+        steps.append(('caches', prime_caches))
+    try:
+        for name, func in steps:
+            with _step(timings, name):
+                try:
+                    func()
+                except Exception:
+                    logger.warning("Warm-up step failed: %s", name, exc_info=True)
+    finally:
+        connections.close_all()
+    timings['total'] = round(sum(timings.values()), 1)
+    logger.info("Warm-up finished: %s", ', '.join(f'{name}={ms}ms' for name, ms in timings.items()))
+    return timings
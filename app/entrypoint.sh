@@ -67,6 +67,10 @@ if [[ "$DEBUG" == "True" || "$DEBUG" == "true" || "$DEBUG" == "1" ]]; then
     echo -e "${YELLOW}開發模式啟動: Django Runserver${NC}"
     exec python manage.py runserver 0.0.0.0:8000
 else
-    echo -e "${GREEN}生產模式啟動: Gunicorn${NC}"
-    exec gunicorn core.wsgi:application --bind 0.0.0.0:8000 --workers 3
+    echo -e "${GREEN}生產模式啟動: Gunicorn (${GUNICORN_MODE:-wsgi})${NC}"
+    # 多個 worker 的 Prometheus 指標寫入共用目錄，每次啟動前清空舊行程留下的檔案
+    export PROMETHEUS_MULTIPROC_DIR=${PROMETHEUS_MULTIPROC_DIR:-/tmp/nexus-metrics}
+    rm -rf "$PROMETHEUS_MULTIPROC_DIR" && mkdir -p "$PROMETHEUS_MULTIPROC_DIR"
+    # worker 數、執行緒、preload、ASGI 模式與暖機皆由 gunicorn.conf.py 依環境變數決定
+    exec gunicorn -c gunicorn.conf.py
 fi
\ No newline at end of file
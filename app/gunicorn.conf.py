@@ -0,0 +1,78 @@
+# Gunicorn 設定 (生產模式由 entrypoint.sh 以 -c gunicorn.conf.py 載入)
+#
+# 環境變數：
+#   GUNICORN_MODE      wsgi (預設，gthread worker) / asgi (uvicorn worker，載入 core.asgi)
+#   GUNICORN_WORKERS   worker 數，預設 2 x CPU + 1 (上限 GUNICORN_MAX_WORKERS，預設 8)
+#   GUNICORN_THREADS   wsgi 模式每個 worker 的執行緒數，預設 4 (ORM / Redis 多為 I/O 等待)
+#   GUNICORN_PRELOAD   1 (預設) = master 先載入 Django 並暖機，worker fork 後直接繼承
+#   NEXUS_WARMUP       1 (預設) = 接收流量前執行 core.warmup (URL、模板、快取)
+import multiprocessing
+import os
+
+
+def _env_int(name, default):
+    value = os.environ.get(name)
+    return int(value) if value else default
+
+
+def _env_bool(name, default):
+    value = os.environ.get(name)
+    return default if value is None else value.lower() in ('1', 'true', 'yes')
+
+
+mode = os.environ.get('GUNICORN_MODE', 'wsgi')
+if mode not in ('wsgi', 'asgi'):
+    raise RuntimeError(f"GUNICORN_MODE 須為 wsgi 或 asgi，目前為 {mode!r}")
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+wsgi_app = 'core.asgi:application' if mode == 'asgi' else 'core.wsgi:application'
+
+workers = _env_int('GUNICORN_WORKERS', min(multiprocessing.cpu_count() * 2 + 1, _env_int('GUNICORN_MAX_WORKERS', 8)))
+if mode == 'asgi':
+    # 💡 單一事件迴圈即可保持大量閒置連線 (SSE)；同步 view 由 Django 排入執行緒池
+    worker_class = 'uvicorn.workers.UvicornWorker'
+else:
+    threads = _env_int('GUNICORN_THREADS', 4)
+    worker_class = 'gthread' if threads > 1 else 'sync'
+
+preload_app = _env_bool('GUNICORN_PRELOAD', True)
+warmup = _env_bool('NEXUS_WARMUP', True)
+
+timeout = _env_int('GUNICORN_TIMEOUT', 30)
+graceful_timeout = 30
+keepalive = 5
+# 定期汰換 worker，避免長時間執行的記憶體累積 (jitter 讓各 worker 錯開重啟)
+max_requests = _env_int('GUNICORN_MAX_REQUESTS', 2000)
+max_requests_jitter = max_requests // 10
+
+
+def _warm_up(log):
+    from core.warmup import warm_up
+
+    timings = warm_up()
+    log.info("Nexus warm-up (pid %s): %s", os.getpid(), timings)
+
+
+def when_ready(server):
+    # 💡 preload 時 master 已載入 Django：在 fork 之前暖機一次，所有 worker 共用結果 (copy-on-write)
+    if preload_app and warmup:
+        _warm_up(server.log)
+
+
+def post_worker_init(worker):
+    # 未 preload 時每個 worker 各自載入，於開始接收請求前暖機
+    if not preload_app and warmup:
+        _warm_up(worker.log)
+
+
+def child_exit(server, worker):
+    # 💡 worker 結束時標記其 Prometheus 指標檔，避免已結束行程的 gauge 繼續出現在 /metrics；
+    # 未設定 PROMETHEUS_MULTIPROC_DIR (單行程模式，例如 events 服務) 時沒有檔案可標記，
+    # 且 mark_process_dead 會拋出例外讓 arbiter 結束
+    if not os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        return
+    try:
+        from prometheus_client import multiprocess
+    except ImportError:
+        return
+    multiprocess.mark_process_dead(worker.pid)